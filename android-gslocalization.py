@@ -1,58 +1,309 @@
 import argparse
 
 from sys import exit
-from models.android_xml_file import import_from_res_folder
-from utils.utils import pwt, get_input
-from cloud_managers.google_sheets_manager import GoogleSheetsManager
+from contextlib import closing
+from os import path
+from models.android_xml_file import prefetch_google_sheets_snapshots, prefetch_google_sheets_columns, \
+    find_strings_files, group_strings_files, load_android_xml_files, \
+    iter_language_files, load_language_files, select_changed_files, fan_out_development_sources
+from utils.utils import get_input, get_language_name
+from utils.logger import logger, LogLevel
+from utils.file_watcher import FileWatcher, run_watch_loop
+from cloud_managers.sharding import ShardBy
+from cloud_managers.google_sheets_manager import GoogleSheetsManager, SpreadsheetLayout, \
+    DEFAULT_UPLOAD_CHUNK_SIZE, DEFAULT_UPLOADS_IN_FLIGHT
+from cloud_managers.row_index import RowIndexCache
+from utils.parse_cache import ParsedFileCache
+from utils.journal import OperationJournal, run_step
+from utils.leases import LanguageLeases, open_lease_store, DEFAULT_LEASE_TTL
+from utils.pipeline import load_ahead
+from utils.git_changes import GitChanges
+from utils.placeholders import PlaceholderCheck
 
 
 def parse_args():
 
     ap = argparse.ArgumentParser()
     ap.add_argument('-p', '--project_name', required=True, help='name of the android project (used in the spreadsheet name', metavar='\b')
-    ap.add_argument('-r', '--res_folder_path', required=True, help='path to the \'res\' directory', metavar='\b')
+    ap.add_argument('-r', '--res_folder_path', required=True, nargs='+', help='path to the \'res\' directory (multiple paths for multi-module projects)', metavar='\b')
     ap.add_argument('-a', '--auth_file_path', required=True, help='path to the Google Sheets authorization JSON file', metavar='\b')
     ap.add_argument('-e', '--email', required=True, help='email used for sharing newly created worksheets', metavar='\b')
     ap.add_argument('-l', '--dev_language', required=False, default='en', help='development language code (default=en)', metavar='\b')
+    ap.add_argument('-n', '--dry_run', required=False, action='store_true', help='print the planned changes without applying them')
+    ap.add_argument('-j', '--jobs', required=False, type=int, default=None, help='number of processes used for parsing the XML files (default=number of cores)', metavar='\b')
+    ap.add_argument('--no_cache', required=False, action='store_true', help='parse all the XML files and read the worksheet rows, without using the parsed files and row index caches')
+    ap.add_argument('--layout', required=False, default=SpreadsheetLayout.PER_LANGUAGE,
+                    choices=[SpreadsheetLayout.PER_LANGUAGE, SpreadsheetLayout.PER_PROJECT],
+                    help='one spreadsheet per language (default) or one spreadsheet per project')
+    ap.add_argument('-w', '--watch', required=False, action='store_true', help='keep running, upload the local changes as they happen and import the remote changes periodically')
+    ap.add_argument('--pull_interval', required=False, type=float, default=300, help='seconds between two imports in watch mode (default=300)', metavar='\b')
+    ap.add_argument('--chunk_size', required=False, type=int, default=DEFAULT_UPLOAD_CHUNK_SIZE, help='number of rows per request when uploading a large number of new rows (default={})'.format(DEFAULT_UPLOAD_CHUNK_SIZE), metavar='\b')
+    ap.add_argument('--uploads_in_flight', required=False, type=int, default=DEFAULT_UPLOADS_IN_FLIGHT, help='number of row chunks uploaded at the same time (default={})'.format(DEFAULT_UPLOADS_IN_FLIGHT), metavar='\b')
+    ap.add_argument('--shared_sources', required=False, action='store_true', help='store the source texts used by both the Android and the iOS apps once, in the shared worksheet of every language')
+    ap.add_argument('--shards', required=False, type=int, default=1, help='split every worksheet between this number of spreadsheets, for the projects that do not fit in one spreadsheet (default=1)', metavar='\b')
+    ap.add_argument('--shard_by', required=False, default=ShardBy.KEY, choices=[ShardBy.KEY, ShardBy.PATH], help='put the new strings in the shard of their string ID (key) or of their Gradle module (path) (default=key)')
+    ap.add_argument('-q', '--quiet', required=False, action='store_true', help='print only the totals of every file, not every added or translated string')
+    ap.add_argument('--log_json', required=False, default=None, help='path of a JSON lines file that receives every log message (all levels, with structured fields)', metavar='\b')
+    ap.add_argument('--resume', required=False, action='store_true', help='skip the steps completed by the previous (failed) run, for the files that have not changed since')
+    ap.add_argument('--lease_store', required=False, default=None, help='split the languages between the workers that share this lock store (a directory, or a .db / .sqlite file)', metavar='\b')
+    ap.add_argument('--lease_run_id', required=False, default=None, help='identifies the run in the lock store (ex. the CI pipeline id), required with --lease_store', metavar='\b')
+    ap.add_argument('--lease_ttl', required=False, type=float, default=DEFAULT_LEASE_TTL, help='seconds after which the languages of a stalled worker are claimed by the others (default={})'.format(DEFAULT_LEASE_TTL), metavar='\b')
+    ap.add_argument('--worker_id', required=False, default=None, help='name of this worker in the lock store (default=host name and process id)', metavar='\b')
+    ap.add_argument('--placeholder_check', required=False, default=PlaceholderCheck.BLOCK, choices=[PlaceholderCheck.BLOCK, PlaceholderCheck.WARN, PlaceholderCheck.OFF], help='when importing, skip (block) or only report (warn) the translations whose placeholders differ from the source text (default=block)')
+    ap.add_argument('--since', required=False, default=None, help='upload only the strings added or changed since this git commit, branch or tag of the project repository (ignored in watch mode)', metavar='\b')
+    ap.add_argument('--api_endpoint', required=False, default=None, help='send the Google Sheets and Drive requests to this URL instead of the Google hosts (ex. http://localhost:8080, a local stand-in)', metavar='\b')
 
-    return vars(ap.parse_args())
+    args = vars(ap.parse_args())
+    if args['lease_store'] is not None and args['lease_run_id'] is None:
+        ap.error('--lease_run_id is required with --lease_store')
+    return args
 
 
-if __name__ == "__main__":
-    args = parse_args()
+def load_development_language_files(file_paths_by_language, development_language, max_workers, parse_cache):
+    """
+    :return: the development language file of every module, keyed by the 'res' folder path
+    """
+    development_language_files = load_android_xml_files(file_paths_by_language.get(development_language, []),
+                                                        development_language, max_workers=max_workers,
+                                                        parse_cache=parse_cache)
+    if len(development_language_files) == 0:
+        logger.error('NO {} STRINGS.XML FILES FOUND'.format(development_language))
+        exit(1)
+    return {f.res_folder_path: f for f in development_language_files}
 
-    op_values = ['1', '2', '3']
-    op_type = get_input('Enter operation type [1=export, 2=import, 3=export&import]: ')
 
-    if op_type not in op_values:
-        pwt('INVALID OPERATION')
+def sync_files(google_sheets_manager, android_files, development_language_files, op_type, journal, git_changes=None,
+               placeholder_check=PlaceholderCheck.BLOCK):
+    """
+    Runs the operation (1=export, 2=import, 3=export&import) for the provided files, then releases the cached
+    worksheets of their languages
+    :param GitChanges git_changes: in --since mode, only the strings changed since the reference are uploaded
+    :param str placeholder_check: what the import does with the translations with mismatched placeholders
+    """
+    upload_identifiers = {}
+    if git_changes is not None and op_type in ['1', '3']:
+        # the strings added to the development language file are missing from the files of every language
+        for l_file in android_files:
+            dev_language_file = development_language_files[l_file.res_folder_path]
+            upload_identifiers[l_file.original_file_path] = l_file.changed_identifiers(git_changes) | \
+                dev_language_file.changed_identifiers(git_changes)
+        # the import needs every file, the export only the files with changed strings
+        if op_type == '1':
+            android_files = [f for f in android_files if len(upload_identifiers[f.original_file_path]) > 0]
+            if len(android_files) == 0:
+                return
+
+    # the import operation only reads the columns it needs, all the other operations need the full worksheets
+    if op_type == '2':
+        prefetch_google_sheets_columns(gsheets_manager=google_sheets_manager, xml_files=android_files)
+    else:
+        prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xml_files=android_files)
+
+    with google_sheets_manager.batched_writes():
+        for l_file in android_files:
+            dev_language_file = development_language_files[l_file.res_folder_path]
+            input_paths = [l_file.original_file_path, dev_language_file.original_file_path]
+
+            identifiers = upload_identifiers.get(l_file.original_file_path)
+            if op_type in ['1', '3'] and (identifiers is None or len(identifiers) > 0):
+                run_step(journal, 'upload', input_paths,
+                         lambda: l_file.upload_to_google_sheets(gsheets_manager=google_sheets_manager,
+                                                                identifiers=identifiers),
+                         gsheets_manager=google_sheets_manager)
+            if op_type in ['2', '3']:
+                # the import writes the file, its upload stays completed
+                run_step(journal, 'import', input_paths,
+                         lambda: l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
+                                                                  dev_language_file=dev_language_file,
+                                                                  placeholder_check=placeholder_check),
+                         rewrites_inputs=True)
+
+    google_sheets_manager.apply_highlighting()
+    for language in set(f.target_language for f in android_files):
+        google_sheets_manager.release_language(language)
+
+
+def fan_out_sources(google_sheets_manager, development_language_files, language_codes, git_changes=None):
+    """
+    Updates the changed source texts in the worksheets of the languages at once (export operations only), then
+    releases the columns read for it. Not recorded in the journal: a repeated fan-out finds nothing to update.
+    """
+    fan_out_development_sources(gsheets_manager=google_sheets_manager,
+                                development_language_files=development_language_files,
+                                language_codes=language_codes, git_changes=git_changes)
+    for language_code in language_codes:
+        google_sheets_manager.release_language(get_language_name(language_code))
+
+
+def run_watch_mode(google_sheets_manager, res_folder_paths, development_language, max_workers, parse_cache,
+                   pull_interval, placeholder_check=PlaceholderCheck.BLOCK):
+    """
+    Keeps the authorized manager and its worksheet snapshots warm: the changed files are parsed again and uploaded in
+    debounced batches (a changed development language file is fanned out to the worksheets of every language first,
+    and the files of its module are uploaded) and the translations are imported every pull_interval seconds
+    """
+    # the loaded files by path, and the development language file of every 'res' folder
+    state = {'files': {}, 'dev_files': {}}
+
+    def reload(changed_paths):
+        """
+        Parses only the changed files (the removed files are dropped) and updates the source texts of the files of
+        the modules whose development language file changed
+        :return: the files to upload and the changed development language files, by 'res' folder
+        """
+        existing_paths = [p for p in changed_paths if path.isfile(p)]
+        for removed_path in set(changed_paths) - set(existing_paths):
+            state['files'].pop(removed_path, None)
+        changed_files = load_android_xml_files(existing_paths, development_language, max_workers=max_workers,
+                                               parse_cache=parse_cache)
+        state['files'].update((f.original_file_path, f) for f in changed_files)
+
+        state['dev_files'] = {f.res_folder_path: f for f in state['files'].values()
+                              if f.target_language_code == development_language}
+        changed_dev_files = {f.res_folder_path: f for f in changed_files
+                             if f.target_language_code == development_language}
+
+        upload_files = [f for _, f in sorted(state['files'].items()) if f.res_folder_path in state['dev_files'] and
+                        (f.original_file_path in changed_paths or f.res_folder_path in changed_dev_files)]
+        for l_file in upload_files:
+            if l_file.target_language_code != development_language:
+                l_file.update_source_language(source_xml_file=state['dev_files'][l_file.res_folder_path])
+        return upload_files, changed_dev_files
+
+    def synced_files():
+        return [f for _, f in sorted(state['files'].items()) if f.res_folder_path in state['dev_files']]
+
+    def upload(upload_files, changed_dev_files):
+        if len(changed_dev_files) > 0:
+            language_codes = sorted(set(f.target_language_code for f in synced_files()))
+            fan_out_development_sources(gsheets_manager=google_sheets_manager,
+                                        development_language_files=changed_dev_files, language_codes=language_codes)
+        with google_sheets_manager.batched_writes():
+            for l_file in upload_files:
+                l_file.upload_to_google_sheets(gsheets_manager=google_sheets_manager)
+        google_sheets_manager.apply_highlighting()
+
+    def push_changes(changed_paths):
+        upload(*reload(changed_paths))
+
+    def pull_changes():
+        # fresh snapshots, the import reads its columns from them and the next push plans against them
+        google_sheets_manager.invalidate_snapshots()
+        prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xml_files=synced_files())
+        written_paths = []
+        for l_file in synced_files():
+            change_set = l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
+                                                          dev_language_file=state['dev_files'][l_file.res_folder_path],
+                                                          placeholder_check=placeholder_check)
+            written_paths += [w.file_path for w in change_set.file_writes]
+        # the files written by the import are parsed again, but not reported as local changes by the watcher (the
+        # files changed by the developer during the pull are pushed with the next batch)
+        reload(written_paths)
+        return written_paths
+
+    logger.info("LOADING XML FILES FROM {}".format(', '.join(res_folder_paths)), color='y')
+    upload_files, changed_dev_files = reload(find_strings_files(res_folder_paths))
+    if len(state['dev_files']) == 0:
+        logger.error('NO STRINGS.XML FILES FOUND IN {}'.format(', '.join(res_folder_paths)))
         exit(1)
+    prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xml_files=synced_files())
+    upload(upload_files, changed_dev_files)
+
+    watcher = FileWatcher(list_files=lambda: find_strings_files(res_folder_paths))
+    run_watch_loop(watcher, push_changes=push_changes, pull_changes=pull_changes, pull_interval=pull_interval)
 
-    res_folder_path = args['res_folder_path']
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    logger.configure(level=LogLevel.INFO if args['quiet'] else LogLevel.DEBUG, json_lines_path=args['log_json'])
+
+    res_folder_paths = args['res_folder_path']
     service_account_file = args['auth_file_path']
     user_email = args['email']
     development_language = args['dev_language']
     project_name = args['project_name']
 
-    google_sheets_manager = GoogleSheetsManager(service_account_file, user_email, project_name)
-    android_files = import_from_res_folder(res_folder_path, development_language)
+    google_sheets_manager = GoogleSheetsManager(service_account_file, user_email, project_name,
+                                                dry_run=args['dry_run'], layout=args['layout'],
+                                                upload_chunk_size=args['chunk_size'],
+                                                uploads_in_flight=args['uploads_in_flight'],
+                                                shared_sources=args['shared_sources'],
+                                                shards=args['shards'], shard_by=args['shard_by'],
+                                                row_index_cache=None if args['no_cache'] else RowIndexCache(),
+                                                api_endpoint=args['api_endpoint'])
+    parse_cache = None if args['no_cache'] else ParsedFileCache()
+
+    if args['watch']:
+        run_watch_mode(google_sheets_manager, res_folder_paths, development_language, max_workers=args['jobs'],
+                       parse_cache=parse_cache, pull_interval=args['pull_interval'],
+                       placeholder_check=args['placeholder_check'])
+        exit(0)
+
+    op_values = ['1', '2', '3']
+    op_type = get_input('Enter operation type [1=export, 2=import, 3=export&import]: ')
 
-    development_language_file = next((f for f in android_files if f.target_language_code == development_language), None)
-    if development_language_file is None:
-        pwt('NO STRINGS.XML FILES FOUND IN {}'.format(res_folder_path), color='r')
+    if op_type not in op_values:
+        logger.error('INVALID OPERATION')
         exit(1)
 
-    if op_type == '1':
-        for l_file in android_files:
-            l_file.upload_to_google_sheets(gsheets_manager=google_sheets_manager)
-    elif op_type == '2':
-        for l_file in android_files:
-            l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
-                                             dev_language_file=development_language_file)
-            l_file.update_source_xml()
-    elif op_type == '3':
-        for l_file in android_files:
-            l_file.upload_to_google_sheets(gsheets_manager=google_sheets_manager)
-            l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
-                                             dev_language_file=development_language_file)
-            l_file.update_source_xml()
+    # only the development language files are loaded up front, the other languages are loaded one at a time
+    logger.info("LOADING XML FILES FROM {}".format(', '.join(res_folder_paths)), color='y')
+    file_paths_by_language = group_strings_files(res_folder_paths, development_language)
+    development_language_files = load_development_language_files(file_paths_by_language, development_language,
+                                                                 max_workers=args['jobs'], parse_cache=parse_cache)
+
+    # the source texts are updated in the worksheets of every language, even of the languages without changed files
+    language_codes = sorted(file_paths_by_language.keys())
+
+    # in --since mode, the export operation parses only the files that can have changed strings
+    git_changes = None
+    if args['since'] is not None:
+        git_changes = GitChanges(args['since'], res_folder_paths)
+        if op_type == '1':
+            file_paths_by_language = select_changed_files(file_paths_by_language, development_language_files,
+                                                          git_changes)
+
+    # the completed steps are recorded, so a failed run can be resumed (nothing is recorded in dry run mode)
+    journal = None
+    if not args['dry_run']:
+        res_folders_id = '|'.join(sorted(path.abspath(res_folder_path) for res_folder_path in res_folder_paths))
+        journal = OperationJournal(name=u'android|{}|{}'.format(project_name, res_folders_id),
+                                   context={'operation': op_type, 'layout': args['layout'],
+                                            'dev_language': development_language,
+                                            'shared_sources': args['shared_sources'],
+                                            'shards': args['shards'], 'shard_by': args['shard_by'],
+                                            'since': args['since'], 'placeholder_check': args['placeholder_check']},
+                                   resume=args['resume'])
+
+    if args['lease_store'] is None:
+        if op_type in ['1', '3']:
+            fan_out_sources(google_sheets_manager, development_language_files, language_codes, git_changes=git_changes)
+        # every language is synced and released in turn, while the files of the next language are parsed
+        language_files = iter_language_files(file_paths_by_language, development_language_files,
+                                             development_language, max_workers=args['jobs'], parse_cache=parse_cache)
+        for language, android_files in load_ahead(language_files):
+            sync_files(google_sheets_manager, android_files, development_language_files, op_type, journal,
+                       git_changes=git_changes, placeholder_check=args['placeholder_check'])
+    else:
+        # this worker processes only the languages it claims, the other workers of the run process the others
+        language_leases = LanguageLeases(store=open_lease_store(args['lease_store']), run_id=args['lease_run_id'],
+                                         platform='android', worker_id=args['worker_id'], ttl=args['lease_ttl'])
+
+        with closing(language_leases.claim(language_codes)) as claimed_languages:
+            for language in claimed_languages:
+                if op_type in ['1', '3']:
+                    fan_out_sources(google_sheets_manager, development_language_files, [language],
+                                    git_changes=git_changes)
+                if language == development_language:
+                    android_files = list(development_language_files.values())
+                else:
+                    android_files = load_language_files(file_paths_by_language.get(language, []),
+                                                        development_language_files,
+                                                        development_language, max_workers=args['jobs'],
+                                                        parse_cache=parse_cache)
+                sync_files(google_sheets_manager, android_files, development_language_files, op_type, journal,
+                           git_changes=git_changes, placeholder_check=args['placeholder_check'])
+
+    if journal is not None:
+        journal.clear()
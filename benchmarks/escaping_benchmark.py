@@ -0,0 +1,298 @@
+"""
+Microbenchmark and equivalence checks for the XML escaping and normalization functions, which run on every string
+of the read and write paths. The corpus is generated (same seed, same corpus), so the results of two versions of the
+functions can be compared: the reference file stores the outputs of every function and the strings that fail the
+checks, and a checked run fails only on different outputs or new failures.
+
+Usage (from the repository root):
+    python -m benchmarks.escaping_benchmark --save_reference reference.json
+    ... change the functions ...
+    python -m benchmarks.escaping_benchmark --check_reference reference.json
+"""
+import argparse
+import io
+import json
+import random
+import shutil
+import tempfile
+import time
+from os import path, makedirs
+from sys import exit
+
+from typing import List, Dict, Callable, Any, Tuple
+
+from models.android_xml_file import AndroidXmlFile, normalize_xml_file_content
+from utils.utils import escape_xml_characters, unescape_xml_characters
+from utils.logger import logger
+
+# the fragments the strings of the corpus are made of (real world strings.xml content)
+WORDS = [u'Save', u'changes', u'to', u'your', u'profile', u'Settings', u'Download', u'failed', u'Try again', u'later',
+         u'Message', u'deleted', u'Welcome back', u'Unlimited', u'storage', u'free', u'trial', u'Cancel']
+PLACEHOLDERS = [u'%s', u'%d', u'%1$s', u'%2$d', u'%1$.2f', u'%%', u'%3$s', u'%x', u'{name}']
+HTML_TAGS = [(u'<b>', u'</b>'), (u'<i>', u'</i>'), (u'<u>', u'</u>'), (u'<a href="https://example.com">', u'</a>'),
+             (u'<font color="#FF0000">', u'</font>'), (u'<br/>', u'')]
+SPECIAL = [u"'", u"\\'", u'"', u'\\"', u'&', u'&amp;', u'&lt;', u'&gt;', u'?', u'\\?', u'@', u'\\@', u'\\n', u'>',
+           u'...', u'…', u' ']
+UNICODE = [u'café', u'über', u'спасибо', u'שלום',
+           u'مرحبا', u'你好', u'こんにちは', u'\U0001F600',
+           u'\U0001F44D\U0001F3FD', u'é', u'‏']
+
+
+def generate_string(rng):
+    # type: (random.Random) -> str
+    parts = []
+    for _ in range(rng.randint(1, 8)):
+        kind = rng.random()
+        if kind < 0.45:
+            parts.append(rng.choice(WORDS))
+        elif kind < 0.6:
+            parts.append(rng.choice(PLACEHOLDERS))
+        elif kind < 0.7:
+            open_tag, close_tag = rng.choice(HTML_TAGS)
+            parts.append(u'{}{}{}'.format(open_tag, rng.choice(WORDS), close_tag))
+        elif kind < 0.85:
+            parts.append(rng.choice(SPECIAL))
+        else:
+            parts.append(rng.choice(UNICODE))
+
+    text = u' '.join(parts) if rng.random() < 0.7 else u''.join(parts)
+    if rng.random() < 0.03:
+        text = u'<![CDATA[{}]]>'.format(text)
+    if rng.random() < 0.05:
+        text = u'@string/{}'.format(rng.choice(WORDS).lower().replace(' ', '_'))
+    return text
+
+
+def generate_corpus(count, seed):
+    # type: (int, int) -> List[str]
+    """
+    :return: `count` strings, the same ones for the same seed
+    """
+    rng = random.Random(seed)
+    return [generate_string(rng) for _ in range(count)]
+
+
+def strings_file_content(strings, first_idx=0):
+    # type: (List[str], int) -> str
+    """
+    :return: the content of a strings.xml file with the (escaped) strings, one <string> per line
+    """
+    lines = [u"<?xml version='1.0' encoding='utf-8'?>", u'<resources>']
+    for idx, text in enumerate(strings):
+        lines.append(u'    <string name="string_{}">{}</string>'.format(first_idx + idx, escape_xml_characters(text)))
+    lines.append(u'</resources>')
+    return u'\n'.join(lines) + u'\n'
+
+
+def generate_files(corpus, strings_per_file=50):
+    # type: (List[str], int) -> List[str]
+    return [strings_file_content(corpus[idx:idx + strings_per_file], first_idx=idx)
+            for idx in range(0, len(corpus), strings_per_file)]
+
+
+# the benchmarked functions, and the kind of input they get ('string' or 'file')
+FUNCTIONS = [
+    ('escape_xml_characters', escape_xml_characters, 'string'),
+    ('unescape_xml_characters', unescape_xml_characters, 'string'),
+    ('normalize_xml_file_content', normalize_xml_file_content, 'file'),
+    ('AndroidXmlFile.unescape_xml_string_content', AndroidXmlFile.unescape_xml_string_content, 'file'),
+]  # type: List[Tuple[str, Callable[[str], Any], str]]
+
+
+def benchmark(function, inputs, repeat):
+    # type: (Callable[[str], Any], List[str], int) -> float
+    """
+    :return: the best time (in seconds) of `repeat` runs of the function over all the inputs
+    """
+    best_time = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for value in inputs:
+            function(value)
+        run_time = time.perf_counter() - start_time
+        best_time = run_time if best_time is None else min(best_time, run_time)
+    return best_time
+
+
+def compute_outputs(inputs_by_kind):
+    # type: (Dict[str, List[str]]) -> Dict[str, List[str]]
+    outputs = {}
+    for name, function, kind in FUNCTIONS:
+        results = [function(value) for value in inputs_by_kind[kind]]
+        outputs[name] = [r.decode('utf-8') if isinstance(r, bytes) else r for r in results]
+    return outputs
+
+
+def check_idempotence(corpus, files):
+    # type: (List[str], List[str]) -> List[str]
+    """
+    Escaping or normalizing an already escaped / normalized value must not change it
+    :return: the failed inputs (ex. 'escape:12' for the 13th string of the corpus)
+    """
+    failures = []  # type: List[str]
+    for idx, text in enumerate(corpus):
+        escaped_text = escape_xml_characters(text)
+        if escape_xml_characters(escaped_text) != escaped_text:
+            failures.append(u'escape:{}'.format(idx))
+            logger.debug(u'ESCAPE IS NOT IDEMPOTENT FOR {!r}'.format(text), color='r')
+
+    for idx, file_content in enumerate(files):
+        normalized_content = normalize_xml_file_content(file_content).decode('utf-8')
+        if normalize_xml_file_content(normalized_content).decode('utf-8') != normalized_content:
+            failures.append(u'normalize:{}'.format(idx))
+            logger.debug(u'NORMALIZE IS NOT IDEMPOTENT FOR FILE {}'.format(idx), color='r')
+    return failures
+
+
+def check_round_trip(corpus, strings_per_file=50):
+    # type: (List[str], int) -> List[int]
+    """
+    Writes the strings into a strings.xml file with AndroidXmlFile.update_source_xml, reads them back, writes the
+    read values and reads them again. Once written, a string must be read back the same after every write.
+    :return: the indexes of the strings that change between the two reads, or that can not be written / read
+    """
+    temp_dir = tempfile.mkdtemp(prefix='gslocalization_bench_')
+    file_path = path.join(temp_dir, 'res', 'values-es', 'strings.xml')
+    makedirs(path.dirname(file_path))
+    failures = []  # type: List[int]
+
+    def write_and_read(texts, first_idx):
+        # type: (List[str], int) -> Dict[str, str]
+        xml_file = AndroidXmlFile(file_path=file_path, source_language='en')
+        texts_by_id = {u'string_{}'.format(first_idx + idx): text for idx, text in enumerate(texts)}
+        for t_unit in xml_file.translation_units:
+            t_unit.target_text = texts_by_id[t_unit.identifier]
+        xml_file.update_source_xml()
+        return {t.identifier: t.target_text for t in AndroidXmlFile(file_path=file_path,
+                                                                    source_language='en').translation_units}
+
+    def check_batch(texts, first_idx):
+        # type: (List[str], int) -> List[int]
+        with io.open(file_path, 'w', encoding='utf-8') as strings_file:
+            strings_file.write(strings_file_content([u'placeholder'] * len(texts), first_idx=first_idx))
+        try:
+            first_read = write_and_read(texts, first_idx)
+            second_read = write_and_read([first_read[u'string_{}'.format(first_idx + idx)]
+                                          for idx in range(len(texts))], first_idx)
+        except Exception as round_trip_exception:
+            if len(texts) == 1:
+                logger.debug(u'COULD NOT WRITE / READ {!r}: {}'.format(texts[0], round_trip_exception), color='r')
+                return [first_idx]
+            # find the strings that break the file
+            return [f for idx, text in enumerate(texts) for f in check_batch([text], first_idx + idx)]
+
+        batch_failures = []  # type: List[int]
+        for string_id, text in first_read.items():
+            if second_read.get(string_id) != text:
+                string_idx = int(string_id.split('_')[-1])
+                batch_failures.append(string_idx)
+                logger.debug(u'{!r} IS READ AS {!r}, THEN AS {!r}'.format(
+                    texts[string_idx - first_idx], text, second_read.get(string_id)), color='r')
+        return sorted(batch_failures)
+
+    try:
+        for batch_idx in range(0, len(corpus), strings_per_file):
+            failures += check_batch(corpus[batch_idx:batch_idx + strings_per_file], batch_idx)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return failures
+
+
+def check_reference(outputs, failures, reference_path, count, seed):
+    # type: (Dict[str, List[str]], Dict[str, List[Any]], str, int, int) -> int
+    """
+    Compares the outputs of the functions with the outputs saved by a previous run (ex. before an optimization), and
+    the failures of the checks with the failures of that run. The reference is refused if it was saved for another
+    corpus (another count or seed), its outputs are not comparable.
+    :return: the number of different outputs and new failures (1 if the reference was refused)
+    """
+    with io.open(reference_path, 'r', encoding='utf-8') as reference_file:
+        reference = json.load(reference_file)
+
+    if reference.get('count') != count or reference.get('seed') != seed:
+        logger.error(u'THE REFERENCE WAS SAVED FOR {} STRINGS WITH SEED {}, RUN WITH --count {} --seed {} TO COMPARE '
+                     u'THE OUTPUTS'.format(reference.get('count'), reference.get('seed'), reference.get('count'),
+                                           reference.get('seed')),
+                     event='reference_refused', reference_count=reference.get('count'),
+                     reference_seed=reference.get('seed'), count=count, seed=seed)
+        return 1
+
+    differences = 0
+    for check_name, check_failures in failures.items():
+        new_failures = sorted(set(check_failures) - set(reference.get('failures', {}).get(check_name, [])))
+        if len(new_failures) > 0:
+            logger.error(u'{}: {} NEW FAILURES ({})'.format(check_name.upper(), len(new_failures),
+                                                           u', '.join(u'{}'.format(f) for f in new_failures[:10])),
+                         event='new_failures', check=check_name, count=len(new_failures))
+        differences += len(new_failures)
+
+    for name, reference_outputs in reference['outputs'].items():
+        current_outputs = outputs.get(name, [])
+        function_differences = [idx for idx, value in enumerate(reference_outputs)
+                                if idx >= len(current_outputs) or current_outputs[idx] != value]
+        for idx in function_differences[:10]:
+            logger.debug(u'{} #{}: {!r} != {!r}'.format(name, idx, reference_outputs[idx],
+                                                        current_outputs[idx] if idx < len(current_outputs) else None),
+                         color='r')
+        if len(function_differences) > 0:
+            logger.error(u'{}: {} OUTPUTS DIFFER FROM THE REFERENCE'.format(name, len(function_differences)),
+                         event='reference_mismatch', function=name, count=len(function_differences))
+        differences += len(function_differences)
+    return differences
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-c', '--count', required=False, type=int, default=5000, help='number of generated strings (default=5000)', metavar='\b')
+    ap.add_argument('-s', '--seed', required=False, type=int, default=0, help='seed of the generated corpus (default=0)', metavar='\b')
+    ap.add_argument('-r', '--repeat', required=False, type=int, default=5, help='number of timed runs of every function, the best one is reported (default=5)', metavar='\b')
+    ap.add_argument('--save_reference', required=False, default=None, help='save the outputs of the functions to this JSON file', metavar='\b')
+    ap.add_argument('--check_reference', required=False, default=None, help='compare the outputs and the failed checks with the ones saved in this JSON file (the exit code is 1 if they differ)', metavar='\b')
+    ap.add_argument('--skip_round_trip', required=False, action='store_true', help='skip the (slower) strings.xml round trip check')
+    return vars(ap.parse_args())
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    corpus = generate_corpus(count=args['count'], seed=args['seed'])
+    inputs_by_kind = {'string': corpus, 'file': generate_files(corpus)}
+
+    logger.info(u'CORPUS: {} STRINGS, {} FILES (SEED {})'.format(len(corpus), len(inputs_by_kind['file']),
+                                                                 args['seed']), color='y')
+
+    for name, function, kind in FUNCTIONS:
+        inputs = inputs_by_kind[kind]
+        input_bytes = sum(len(value.encode('utf-8')) for value in inputs)
+        best_time = max(benchmark(function, inputs, repeat=args['repeat']), 1e-9)
+        logger.info(u'{:<45} {:>12.0f} {}/S {:>8.2f} MB/S'.format(name, len(inputs) / best_time, kind.upper() + 'S',
+                                                                 input_bytes / best_time / 1e6), color='g',
+                    event='benchmark', function=name, inputs_per_second=len(inputs) / best_time,
+                    bytes_per_second=input_bytes / best_time)
+
+    outputs = compute_outputs(inputs_by_kind)
+    failures = {'idempotence': check_idempotence(corpus, inputs_by_kind['file'])}  # type: Dict[str, List[Any]]
+    logger.info(u'IDEMPOTENCE: {} FAILURES'.format(len(failures['idempotence'])),
+                color='g' if len(failures['idempotence']) == 0 else 'y')
+
+    if not args['skip_round_trip']:
+        failures['round_trip'] = check_round_trip(corpus)
+        logger.info(u'ROUND TRIP: {} OF {} STRINGS CHANGE AFTER BEING WRITTEN'.format(len(failures['round_trip']),
+                                                                                    len(corpus)),
+                    color='g' if len(failures['round_trip']) == 0 else 'y')
+
+    differences = 0
+    if args['check_reference'] is not None:
+        differences = check_reference(outputs, failures, args['check_reference'], count=args['count'],
+                                      seed=args['seed'])
+        logger.info(u'REFERENCE: {} DIFFERENT OUTPUTS OR NEW FAILURES'.format(differences),
+                    color='g' if differences == 0 else 'r')
+
+    if args['save_reference'] is not None:
+        with io.open(args['save_reference'], 'w', encoding='utf-8') as reference_file:
+            reference_file.write(u'{}'.format(json.dumps({'count': args['count'], 'seed': args['seed'],
+                                                         'outputs': outputs, 'failures': failures},
+                                                        ensure_ascii=False)))
+        logger.info(u'SAVED THE OUTPUTS TO {}'.format(args['save_reference']), color='g')
+
+    exit(1 if differences > 0 else 0)
@@ -0,0 +1,185 @@
+"""
+End-to-end benchmark of android-gslocalization.py against the local Sheets stand-in (see sheets_stand_in.py): a
+generated project is exported, its source texts are edited and it is exported & imported, then imported again. The
+requests of every step are counted by the stand-in, so the effect of a change on the number of requests, on the
+throughput and on the behavior under throttling (--write_quota), failures (--failure_rate) or dropped connections
+(--drop_rate) can be measured without a Google account. The project is generated from a seed, the same seed gives the
+same project and the same requests.
+
+Usage (from the repository root):
+    python -m benchmarks.sheets_benchmark --strings 5000 --languages 10 --latency 0.3
+    python -m benchmarks.sheets_benchmark --write_quota 60 --quota_window 10 --save_results results.json
+    python -m benchmarks.sheets_benchmark --record session.jsonl
+    python -m benchmarks.sheets_benchmark --replay session.jsonl
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+from sys import exit
+
+from typing import Any, Dict, List
+
+from benchmarks.escaping_benchmark import generate_corpus
+from benchmarks.sheets_stand_in import SheetsStandIn, DEFAULT_QUOTA_WINDOW, write_service_account_file, print_stats
+from utils.utils import escape_xml_characters
+from utils.logger import logger, LogLevel
+
+REPOSITORY_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+LANGUAGE_CODES = ['es', 'fr', 'de', 'it', 'pt', 'nl', 'sv', 'pl', 'ru', 'ja', 'ko', 'tr', 'da', 'fi', 'cs']
+
+# the steps of the benchmark: name, operation type of the script (1=export, 2=import, 3=export&import)
+STEPS = [('export', '1'), ('edit & export & import', '3'), ('import', '2')]
+
+
+def write_strings_file(file_path, texts_by_id):
+    # type: (str, Dict[str, str]) -> None
+    if not path.isdir(path.dirname(file_path)):
+        os.makedirs(path.dirname(file_path))
+    lines = [u"<?xml version='1.0' encoding='utf-8'?>", u'<resources>']
+    for string_id in sorted(texts_by_id.keys()):
+        lines.append(u'    <string name="{}">{}</string>'.format(string_id,
+                                                                 escape_xml_characters(texts_by_id[string_id])))
+    lines.append(u'</resources>')
+    with io.open(file_path, 'w', encoding='utf-8') as strings_file:
+        strings_file.write(u'\n'.join(lines) + u'\n')
+
+
+def generate_project(res_folder_path, strings_count, language_codes, seed):
+    # type: (str, int, List[str], int) -> Dict[str, str]
+    """
+    Writes the development language 'strings.xml' file and a file for every language, with a translation for about
+    half of the strings
+    :return: the texts of the development language, by string ID
+    """
+    rng = random.Random(seed)
+    source_texts = {u'string_{}'.format(idx): text for idx, text in enumerate(generate_corpus(strings_count, seed))}
+    write_strings_file(path.join(res_folder_path, 'values', 'strings.xml'), source_texts)
+
+    for language_code in language_codes:
+        translations = {}
+        for string_id, text in source_texts.items():
+            if rng.random() < 0.5:
+                continue
+            # the CDATA sections and the references are kept as they are
+            translations[string_id] = text if text.startswith((u'<![CDATA[', u'@')) else \
+                u'{} ({})'.format(text, language_code)
+        write_strings_file(path.join(res_folder_path, 'values-{}'.format(language_code), 'strings.xml'), translations)
+    return source_texts
+
+
+def edit_project(res_folder_path, source_texts, changed_ratio, seed):
+    # type: (str, Dict[str, str], float, int) -> None
+    """
+    Changes a part of the source texts and adds as many new strings to the development language file
+    """
+    rng = random.Random(seed + 1)
+    changed_count = int(len(source_texts) * changed_ratio)
+    for string_id in rng.sample(sorted(source_texts.keys()), changed_count):
+        if not source_texts[string_id].startswith((u'<![CDATA[', u'@')):
+            source_texts[string_id] = u'{} v2'.format(source_texts[string_id])
+    for idx, text in enumerate(generate_corpus(changed_count, seed + 1)):
+        source_texts[u'new_string_{}'.format(idx)] = text
+    write_strings_file(path.join(res_folder_path, 'values', 'strings.xml'), source_texts)
+
+
+def run_script(operation, res_folder_path, auth_file_path, api_endpoint, home_path, script_args, seed):
+    # type: (str, str, str, str, str, List[str], int) -> None
+    """
+    Runs android-gslocalization.py against the stand-in, with its own home directory (for the journal) and a fixed
+    hash seed (the order of the requests built from sets does not change between two runs)
+    """
+    command = [sys.executable, path.join(REPOSITORY_PATH, 'android-gslocalization.py'), '-p', 'Benchmark',
+               '-r', res_folder_path, '-a', auth_file_path, '-e', 'benchmark@example.com',
+               '--api_endpoint', api_endpoint, '--no_cache', '-q'] + script_args
+    environment = dict(os.environ, HOME=home_path, PYTHONHASHSEED=str(seed))
+    process = subprocess.Popen(command, cwd=REPOSITORY_PATH, env=environment, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output, _ = process.communicate(input=u'{}\n'.format(operation).encode('utf-8'))
+    if process.returncode != 0:
+        logger.error(output.decode('utf-8', 'replace'))
+        raise RuntimeError(u'android-gslocalization.py exited with code {}'.format(process.returncode))
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-c', '--strings', required=False, type=int, default=2000, help='number of strings of the generated project (default=2000)', metavar='\b')
+    ap.add_argument('-l', '--languages', required=False, type=int, default=5, help='number of languages of the generated project, up to {} (default=5)'.format(len(LANGUAGE_CODES)), metavar='\b')
+    ap.add_argument('--changed', required=False, type=float, default=0.05, help='fraction of the source texts changed (and of strings added) before the second step (default=0.05)', metavar='\b')
+    ap.add_argument('-s', '--seed', required=False, type=int, default=0, help='seed of the generated project and of the stand-in (default=0)', metavar='\b')
+    ap.add_argument('--latency', required=False, type=float, default=0.1, help='seconds added to every response (default=0.1)', metavar='\b')
+    ap.add_argument('--jitter', required=False, type=float, default=0.0, help='up to this many seconds are added to the latency (default=0)', metavar='\b')
+    ap.add_argument('--read_quota', required=False, type=int, default=None, help='Sheets read requests accepted per quota window (default=unlimited)', metavar='\b')
+    ap.add_argument('--write_quota', required=False, type=int, default=None, help='Sheets write requests accepted per quota window (default=unlimited)', metavar='\b')
+    ap.add_argument('--quota_window', required=False, type=float, default=DEFAULT_QUOTA_WINDOW, help='seconds after which the quotas are reset (default={:.0f})'.format(DEFAULT_QUOTA_WINDOW), metavar='\b')
+    ap.add_argument('--failure_rate', required=False, type=float, default=0.0, help='fraction of the requests that get a 503 response (default=0)', metavar='\b')
+    ap.add_argument('--drop_rate', required=False, type=float, default=0.0, help='fraction of the requests whose connection is closed without a response (default=0)', metavar='\b')
+    ap.add_argument('--record', required=False, default=None, help='append the served responses to this JSON lines file', metavar='\b')
+    ap.add_argument('--replay', required=False, default=None, help='serve the responses recorded in this JSON lines file (recorded with the same options)', metavar='\b')
+    ap.add_argument('-v', '--verbose', required=False, action='store_true', help='print every request served by the stand-in')
+    ap.add_argument('--save_results', required=False, default=None, help='save the requests and the duration of every step to this JSON file', metavar='\b')
+    ap.add_argument('script_args', nargs=argparse.REMAINDER, help='other arguments of android-gslocalization.py, after -- (ex. -- --uploads_in_flight 8 --layout project)')
+    return vars(ap.parse_args())
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logger.configure(level=LogLevel.DEBUG if args['verbose'] else LogLevel.INFO)
+    script_args = [a for a in args['script_args'] if a != '--']
+    language_codes = LANGUAGE_CODES[:args['languages']]
+
+    temp_dir = tempfile.mkdtemp(prefix='gslocalization_benchmark_')
+    res_folder_path = path.join(temp_dir, 'res')
+    auth_file_path = path.join(temp_dir, 'stand_in_key.json')
+    write_service_account_file(auth_file_path)
+    source_texts = generate_project(res_folder_path, args['strings'], language_codes, args['seed'])
+    logger.info(u'PROJECT: {} STRINGS, {} LANGUAGES (SEED {})'.format(args['strings'], len(language_codes),
+                                                                     args['seed']), color='y')
+
+    results = []  # type: List[Dict[str, Any]]
+    failed = False
+    try:
+        with SheetsStandIn(latency=args['latency'], jitter=args['jitter'], read_quota=args['read_quota'],
+                           write_quota=args['write_quota'], quota_window=args['quota_window'],
+                           failure_rate=args['failure_rate'], seed=args['seed'], record_path=args['record'],
+                           replay_path=args['replay'], drop_rate=args['drop_rate']) as stand_in:
+            for step_name, operation in STEPS:
+                if operation == '3':
+                    edit_project(res_folder_path, source_texts, args['changed'], args['seed'])
+
+                stand_in.reset_stats()
+                start_time = time.time()
+                run_script(operation, res_folder_path, auth_file_path, stand_in.url, temp_dir, script_args,
+                           args['seed'])
+                step_time = time.time() - start_time
+                stats = stand_in.stats()
+
+                rows_per_second = len(source_texts) * (len(language_codes) + 1) / step_time
+                logger.info(u'{}: {:.2f} S, {:.0f} ROWS/S'.format(step_name.upper(), step_time, rows_per_second),
+                            color='g', event='benchmark_step', step=step_name, seconds=step_time,
+                            rows_per_second=rows_per_second)
+                print_stats(stats)
+                results.append({'step': step_name, 'seconds': step_time, 'rows_per_second': rows_per_second,
+                                'requests': stats})
+    except RuntimeError as script_exception:
+        logger.error(u'{}'.format(script_exception))
+        failed = True
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args['save_results'] is not None:
+        with io.open(args['save_results'], 'w', encoding='utf-8') as results_file:
+            results_file.write(u'{}'.format(json.dumps({'options': {k: v for k, v in args.items()
+                                                                    if k not in ('save_results', 'record', 'replay', 'verbose')},
+                                                        'steps': results}, indent=2)))
+        logger.info(u'SAVED THE RESULTS TO {}'.format(args['save_results']), color='g')
+
+    logger.flush()
+    exit(1 if failed else 0)
@@ -0,0 +1,1119 @@
+"""
+Local HTTP stand-in for the subset of the Google Sheets v4 and Drive v3 APIs used by gslocalization, so the real
+pygsheets client (and the GoogleSheetsManager) can be run on a laptop, without a Google account and without quotas.
+The spreadsheets are kept in memory. The stand-in can inject latency, 429 throttling (per-minute read and write
+quotas, like the Sheets API), server failures and dropped connections, record the served responses to a JSON lines
+file, and replay a recorded session instead of emulating the API (a real session can be recorded with --upstream, the
+requests are then forwarded to the Google hosts). The injected latency, failures and drops use a seeded random
+generator.
+
+Known differences with the Sheets API: the formulas are not evaluated (every value render option returns the
+formula text), only the userEnteredValue of the cells is kept (the formats are accepted and dropped), and the field
+masks of the get requests are ignored (the responses contain more fields than requested).
+
+Usage (from the repository root):
+    python -m benchmarks.sheets_stand_in --port 8080 --service_account_file stand_in_key.json --latency 0.2
+    python android-gslocalization.py ... -a stand_in_key.json --api_endpoint http://localhost:8080
+"""
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    from urllib.parse import urlsplit, parse_qsl, unquote
+except ImportError:
+    from urlparse import urlsplit, parse_qsl
+    from urllib import unquote
+
+DEFAULT_QUOTA_WINDOW = 60.0
+DEFAULT_ROW_COUNT = 1000
+DEFAULT_COLUMN_COUNT = 26
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+# the Google hosts of the paths, for the --upstream mode (the same paths PooledHttp sends to its endpoint)
+UPSTREAM_HOSTS = [('/v4/', 'https://sheets.googleapis.com'),
+                  ('/drive/', 'https://www.googleapis.com'),
+                  ('/token', 'https://oauth2.googleapis.com')]
+
+# the endpoints: method, path pattern, name and quota kind ('read' and 'write' count against the Sheets quotas)
+ENDPOINTS = [
+    ('POST', re.compile(r'^/token$'), 'token', 'token'),
+    ('POST', re.compile(r'^/v4/spreadsheets$'), 'spreadsheets.create', 'write'),
+    ('GET', re.compile(r'^/v4/spreadsheets/([^/:]+)$'), 'spreadsheets.get', 'read'),
+    ('POST', re.compile(r'^/v4/spreadsheets/([^/:]+):batchUpdate$'), 'spreadsheets.batchUpdate', 'write'),
+    ('GET', re.compile(r'^/v4/spreadsheets/([^/:]+)/values:batchGet$'), 'spreadsheets.values.batchGet', 'read'),
+    ('GET', re.compile(r'^/v4/spreadsheets/([^/:]+)/values/([^/]+)$'), 'spreadsheets.values.get', 'read'),
+    ('PUT', re.compile(r'^/v4/spreadsheets/([^/:]+)/values/([^/]+)$'), 'spreadsheets.values.update', 'write'),
+    ('GET', re.compile(r'^/drive/v3/files$'), 'drive.files.list', 'drive'),
+    ('GET', re.compile(r'^/drive/v3/files/([^/]+)$'), 'drive.files.get', 'drive'),
+    ('DELETE', re.compile(r'^/drive/v3/files/([^/]+)$'), 'drive.files.delete', 'drive'),
+    ('GET', re.compile(r'^/drive/v3/files/([^/]+)/permissions$'), 'drive.permissions.list', 'drive'),
+    ('POST', re.compile(r'^/drive/v3/files/([^/]+)/permissions$'), 'drive.permissions.create', 'drive'),
+]  # type: List[Tuple[str, Any, str, str]]
+
+_CELLS_REGEX = re.compile(r'^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$')
+_DRIVE_QUERY_REGEX = re.compile(r"^\s*(\w+)\s*=\s*'((?:[^'\\]|\\.)*)'\s*$")
+
+
+class ApiError(Exception):
+    """
+    An error response of the API (the same JSON error body as the Google APIs)
+    """
+
+    def __init__(self, code, message, status):
+        # type: (int, str, str) -> None
+        super(ApiError, self).__init__(message)
+        self.code = code  # type: int
+        self.message = message  # type: str
+        self.status = status  # type: str
+
+    def body(self):
+        # type: () -> Dict[str, Any]
+        return {'error': {'code': self.code, 'message': self.message, 'status': self.status}}
+
+
+class Exchange(object):
+    """
+    A request received by the stand-in, and the response sent for it
+    """
+
+    def __init__(self, method, path, query, body, headers):
+        # type: (str, str, List[Tuple[str, str]], Any, Dict[str, str]) -> None
+        self.method = method  # type: str
+        self.path = path  # type: str
+        self.query = query  # type: List[Tuple[str, str]]
+        self.body = body  # the parsed JSON body, or the raw text
+        self.headers = headers  # type: Dict[str, str]
+        self.status = 200  # type: int
+        self.response = None  # the JSON response (None for the empty responses)
+        self.response_headers = {}  # type: Dict[str, str]
+
+    @property
+    def params(self):
+        # type: () -> Dict[str, List[str]]
+        params = {}  # type: Dict[str, List[str]]
+        for name, value in self.query:
+            params.setdefault(name, []).append(value)
+        return params
+
+    def param(self, name, default=None):
+        # type: (str, str) -> str
+        return self.params.get(name, [default])[0]
+
+    def replay_key(self):
+        # type: () -> str
+        """
+        :return: the key of the request in a recorded session: the method, the path, the sorted query parameters and
+        the canonical JSON body. The requests of a batchUpdate are compared in any order (the order of some of them
+        depends on the iteration order of sets, which changes between two runs).
+        """
+        body = self.body
+        if isinstance(body, dict) and isinstance(body.get('requests'), list):
+            body = dict(body, requests=sorted(json.dumps(r, sort_keys=True) for r in body['requests']))
+        return json.dumps([self.method, self.path, sorted(self.query), body], sort_keys=True)
+
+    def to_json(self):
+        # type: () -> Dict[str, Any]
+        return {'method': self.method, 'path': self.path, 'query': self.query, 'body': self.body,
+                'status': self.status, 'response': self.response}
+
+
+def column_index(letters):
+    # type: (str) -> int
+    """
+    :return: the 0 based index of the column letters (A -> 0, AA -> 26)
+    """
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def column_letters(index):
+    # type: (int) -> str
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def quote_sheet_title(title):
+    # type: (str) -> str
+    if re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', title) and _CELLS_REGEX.match(title) is None:
+        return title
+    return u"'{}'".format(title.replace("'", "''"))
+
+
+def split_a1_range(a1_range):
+    # type: (str) -> Tuple[Optional[str], str]
+    """
+    :return: the sheet title (None if the range has none) and the cells of an A1 range ('' for the whole sheet)
+    """
+    if a1_range.startswith("'"):
+        idx = 1
+        while idx < len(a1_range):
+            if a1_range[idx] == "'":
+                if a1_range[idx + 1:idx + 2] == "'":
+                    idx += 2
+                    continue
+                break
+            idx += 1
+        title = a1_range[1:idx].replace("''", "'")
+        return title, a1_range[idx + 2:]
+    if '!' in a1_range:
+        title, cells = a1_range.rsplit('!', 1)
+        return title, cells
+    return None, a1_range
+
+
+class Sheet(object):
+    """
+    A worksheet of a stand-in spreadsheet: its properties, its conditional formatting rules and its values (one list
+    of strings per row, without the empty rows and cells at the end)
+    """
+
+    def __init__(self, properties):
+        # type: (Dict[str, Any]) -> None
+        self.properties = properties  # type: Dict[str, Any]
+        self.rows = []  # type: List[List[str]]
+        self.conditional_formats = []  # type: List[Dict[str, Any]]
+
+    @property
+    def sheet_id(self):
+        # type: () -> int
+        return self.properties['sheetId']
+
+    @property
+    def title(self):
+        # type: () -> str
+        return self.properties['title']
+
+    @property
+    def row_count(self):
+        # type: () -> int
+        return self.properties['gridProperties']['rowCount']
+
+    @property
+    def column_count(self):
+        # type: () -> int
+        return self.properties['gridProperties']['columnCount']
+
+    def resize(self, row_count=None, column_count=None):
+        # type: (int, int) -> None
+        if row_count is not None:
+            self.properties['gridProperties']['rowCount'] = row_count
+        if column_count is not None:
+            self.properties['gridProperties']['columnCount'] = column_count
+
+    def copy(self):
+        # type: () -> Sheet
+        sheet_copy = Sheet(json.loads(json.dumps(self.properties)))
+        sheet_copy.rows = [list(row) for row in self.rows]
+        sheet_copy.conditional_formats = list(self.conditional_formats)
+        return sheet_copy
+
+    def set_value(self, row_idx, col_idx, value):
+        # type: (int, int, str) -> None
+        while len(self.rows) <= row_idx:
+            self.rows.append([])
+        row = self.rows[row_idx]
+        while len(row) <= col_idx:
+            row.append(u'')
+        row[col_idx] = value
+
+    def last_data_row(self):
+        # type: () -> int
+        """
+        :return: the 0 based index of the last row with a value (-1 if the sheet is empty)
+        """
+        for row_idx in range(len(self.rows) - 1, -1, -1):
+            if any(value != u'' for value in self.rows[row_idx]):
+                return row_idx
+        return -1
+
+    def grid_range(self, cells):
+        # type: (str) -> Tuple[int, int, int, int]
+        """
+        :param str cells: the cells of an A1 range (ex. A1:F1, A2:A, 1:1), '' for the whole sheet
+        :return: the 0 based start row, start column, end row and end column (exclusive) of the cells, limited to
+        the grid
+        """
+        if cells == '':
+            return 0, 0, self.row_count, self.column_count
+
+        match = _CELLS_REGEX.match(cells.upper())
+        if match is None:
+            raise ApiError(400, u'Unable to parse range: {}'.format(cells), 'INVALID_ARGUMENT')
+        start_col, start_row, end_col, end_row = match.groups()
+        if end_col is None and end_row is None:
+            # a single cell
+            end_col, end_row = start_col, start_row
+
+        start_row_idx = int(start_row) - 1 if start_row else 0
+        start_col_idx = column_index(start_col) if start_col else 0
+        end_row_idx = int(end_row) if end_row else self.row_count
+        end_col_idx = column_index(end_col) + 1 if end_col else self.column_count
+        return start_row_idx, start_col_idx, min(end_row_idx, self.row_count), min(end_col_idx, self.column_count)
+
+    def values(self, cells, major_dimension='ROWS'):
+        # type: (str, str) -> Tuple[str, List[List[str]]]
+        """
+        :return: the A1 range and the values of the cells, without the empty rows and cells at the end (same as
+        values.get)
+        """
+        start_row_idx, start_col_idx, end_row_idx, end_col_idx = self.grid_range(cells)
+        rows = []
+        for row in self.rows[start_row_idx:end_row_idx]:
+            rows.append([row[col_idx] if col_idx < len(row) else u''
+                         for col_idx in range(start_col_idx, max(end_col_idx, start_col_idx))])
+
+        if major_dimension == 'COLUMNS':
+            columns = end_col_idx - start_col_idx
+            rows = [[row[col_idx] for row in rows] for col_idx in range(max(columns, 0))]
+
+        values = []
+        for row in rows:
+            while len(row) > 0 and row[-1] == u'':
+                row.pop()
+            values.append(row)
+        while len(values) > 0 and len(values[-1]) == 0:
+            values.pop()
+
+        a1_range = u'{}!{}{}:{}{}'.format(quote_sheet_title(self.title), column_letters(start_col_idx),
+                                          start_row_idx + 1, column_letters(max(end_col_idx - 1, start_col_idx)),
+                                          max(end_row_idx, start_row_idx + 1))
+        return a1_range, values
+
+
+class Spreadsheet(object):
+    def __init__(self, spreadsheet_id, title):
+        # type: (str, str) -> None
+        self.spreadsheet_id = spreadsheet_id  # type: str
+        self.properties = {'title': title, 'locale': 'en_US', 'autoRecalc': 'ON_CHANGE', 'timeZone': 'Etc/GMT',
+                           'defaultFormat': {'verticalAlignment': 'BOTTOM', 'wrapStrategy': 'OVERFLOW_CELL',
+                                             'textFormat': {'fontFamily': 'arial', 'fontSize': 10}}}
+        self.sheets = []  # type: List[Sheet]
+        self.permissions = []  # type: List[Dict[str, Any]]
+        self.modified_time = 0.0  # type: float
+
+    def sheet_by_id(self, sheet_id):
+        # type: (int) -> Sheet
+        for sheet in self.sheets:
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise ApiError(400, u'No grid with id: {}'.format(sheet_id), 'INVALID_ARGUMENT')
+
+    def sheet_by_range(self, a1_range):
+        # type: (str) -> Tuple[Sheet, str]
+        """
+        :return: the sheet and the cells of an A1 range (a range without a sheet title is in the first sheet)
+        """
+        title, cells = split_a1_range(a1_range)
+        if title is None:
+            matching_sheets = [s for s in self.sheets if s.title == a1_range]
+            if len(matching_sheets) > 0:
+                return matching_sheets[0], ''
+            return self.sheets[0], cells
+        matching_sheets = [s for s in self.sheets if s.title == title]
+        if len(matching_sheets) == 0:
+            raise ApiError(400, u'Unable to parse range: {}'.format(a1_range), 'INVALID_ARGUMENT')
+        return matching_sheets[0], cells
+
+    def to_json(self):
+        # type: () -> Dict[str, Any]
+        sheets = []
+        for sheet in self.sheets:
+            sheet_json = {'properties': sheet.properties}  # type: Dict[str, Any]
+            if len(sheet.conditional_formats) > 0:
+                sheet_json['conditionalFormats'] = sheet.conditional_formats
+            sheets.append(sheet_json)
+        return {'spreadsheetId': self.spreadsheet_id, 'properties': self.properties, 'sheets': sheets,
+                'spreadsheetUrl': 'https://docs.google.com/spreadsheets/d/{}/edit'.format(self.spreadsheet_id)}
+
+    def file_json(self):
+        # type: () -> Dict[str, Any]
+        return {'kind': 'drive#file', 'id': self.spreadsheet_id, 'name': self.properties['title'],
+                'mimeType': SPREADSHEET_MIME_TYPE, 'parents': ['root'],
+                'modifiedTime': rfc3339_time(self.modified_time)}
+
+
+def rfc3339_time(timestamp):
+    # type: (float) -> str
+    return '{}.{:03d}Z'.format(time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp)),
+                               int(timestamp * 1000) % 1000)
+
+
+def cell_value(cell):
+    # type: (Dict[str, Any]) -> str
+    """
+    :return: the user entered value of a CellData object, as a string (the formulas are kept as formulas)
+    """
+    entered_value = cell.get('userEnteredValue', {})
+    for value_type in ('formulaValue', 'stringValue', 'numberValue', 'boolValue'):
+        if value_type in entered_value:
+            value = entered_value[value_type]
+            if isinstance(value, bool):
+                return u'TRUE' if value else u'FALSE'
+            return u'{}'.format(value)
+    return u''
+
+
+class SheetsEmulator(object):
+    """
+    The in-memory spreadsheets and the handlers of the emulated endpoints
+    """
+
+    def __init__(self, seed=0):
+        # type: (int) -> None
+        self.spreadsheets = {}  # type: Dict[str, Spreadsheet]
+        self.lock = threading.Lock()
+        # the ids are generated from the seed, so the same requests create the same ids
+        self.rng = random.Random(seed)
+        self._last_modified_time = 0.0
+
+    def handle(self, endpoint, groups, exchange):
+        # type: (str, Tuple[str, ...], Exchange) -> Any
+        handler = getattr(self, '_' + endpoint.replace('.', '_'))  # type: Callable[..., Any]
+        with self.lock:
+            return handler(exchange, *[unquote(group) for group in groups])
+
+    def spreadsheet(self, spreadsheet_id):
+        # type: (str) -> Spreadsheet
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise ApiError(404, 'Requested entity was not found.', 'NOT_FOUND')
+        return spreadsheet
+
+    def touch(self, spreadsheet):
+        # type: (Spreadsheet) -> None
+        # every write gets a later modification time, even within the same millisecond
+        self._last_modified_time = max(time.time(), self._last_modified_time + 0.001)
+        spreadsheet.modified_time = self._last_modified_time
+
+    def new_sheet_id(self, spreadsheet):
+        # type: (Spreadsheet) -> int
+        existing_ids = set(s.sheet_id for s in spreadsheet.sheets)
+        while True:
+            sheet_id = self.rng.randint(1, 2 ** 31 - 1)
+            if sheet_id not in existing_ids:
+                return sheet_id
+
+    # Sheets
+
+    def _token(self, exchange):
+        return {'access_token': 'stand-in-token-{}'.format(self.rng.randint(0, 2 ** 31)), 'expires_in': 3600,
+                'token_type': 'Bearer'}
+
+    def _spreadsheets_create(self, exchange):
+        body = exchange.body or {}
+        title = body.get('properties', {}).get('title', 'Untitled spreadsheet')
+        spreadsheet_id = '1{:043x}'.format(self.rng.getrandbits(172))
+        spreadsheet = Spreadsheet(spreadsheet_id, title)
+        spreadsheet.sheets.append(Sheet({'sheetId': 0, 'title': 'Sheet1', 'index': 0, 'sheetType': 'GRID',
+                                         'gridProperties': {'rowCount': DEFAULT_ROW_COUNT,
+                                                            'columnCount': DEFAULT_COLUMN_COUNT}}))
+        self.touch(spreadsheet)
+        self.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet.to_json()
+
+    def _spreadsheets_get(self, exchange, spreadsheet_id):
+        return self.spreadsheet(spreadsheet_id).to_json()
+
+    def _spreadsheets_values_get(self, exchange, spreadsheet_id, a1_range):
+        sheet, cells = self.spreadsheet(spreadsheet_id).sheet_by_range(a1_range)
+        major_dimension = exchange.param('majorDimension', 'ROWS')
+        response_range, values = sheet.values(cells, major_dimension=major_dimension)
+        value_range = {'range': response_range, 'majorDimension': major_dimension}
+        if len(values) > 0:
+            value_range['values'] = values
+        return value_range
+
+    def _spreadsheets_values_batchGet(self, exchange, spreadsheet_id):
+        spreadsheet = self.spreadsheet(spreadsheet_id)
+        major_dimension = exchange.param('majorDimension', 'ROWS')
+        value_ranges = []
+        for a1_range in exchange.params.get('ranges', []):
+            sheet, cells = spreadsheet.sheet_by_range(a1_range)
+            response_range, values = sheet.values(cells, major_dimension=major_dimension)
+            value_range = {'range': response_range, 'majorDimension': major_dimension}
+            if len(values) > 0:
+                value_range['values'] = values
+            value_ranges.append(value_range)
+        return {'spreadsheetId': spreadsheet_id, 'valueRanges': value_ranges}
+
+    def _spreadsheets_values_update(self, exchange, spreadsheet_id, a1_range):
+        spreadsheet = self.spreadsheet(spreadsheet_id)
+        sheet, cells = spreadsheet.sheet_by_range(a1_range)
+        body = exchange.body or {}
+        values = body.get('values', [])
+        if body.get('majorDimension', 'ROWS') == 'COLUMNS':
+            width = max([len(column) for column in values] + [0])
+            values = [[column[idx] if idx < len(column) else None for column in values] for idx in range(width)]
+
+        start_row_idx, start_col_idx, _, _ = sheet.grid_range(cells)
+        # the grid is extended to fit the values
+        sheet.resize(row_count=max(sheet.row_count, start_row_idx + len(values)),
+                     column_count=max([sheet.column_count] + [start_col_idx + len(row) for row in values]))
+        for row_offset, row in enumerate(values):
+            for col_offset, value in enumerate(row):
+                if value is not None:
+                    sheet.set_value(start_row_idx + row_offset, start_col_idx + col_offset, u'{}'.format(value))
+
+        self.touch(spreadsheet)
+        updated_columns = max([len(row) for row in values] + [0])
+        return {'spreadsheetId': spreadsheet_id,
+                'updatedRange': u'{}!{}{}:{}{}'.format(quote_sheet_title(sheet.title), column_letters(start_col_idx),
+                                                       start_row_idx + 1,
+                                                       column_letters(start_col_idx + max(updated_columns - 1, 0)),
+                                                       start_row_idx + max(len(values), 1)),
+                'updatedRows': len(values), 'updatedColumns': updated_columns,
+                'updatedCells': sum(len(row) for row in values)}
+
+    def _spreadsheets_batchUpdate(self, exchange, spreadsheet_id):
+        spreadsheet = self.spreadsheet(spreadsheet_id)
+        requests = (exchange.body or {}).get('requests', [])
+
+        # the requests are applied on copies of the sheets, so a failed request does not change anything (the
+        # batchUpdate requests are atomic)
+        working_sheets = list(spreadsheet.sheets)
+        copied_sheet_ids = set()
+
+        def sheet_for_update(sheet_id):
+            for idx, sheet in enumerate(working_sheets):
+                if sheet.sheet_id == sheet_id:
+                    if sheet_id not in copied_sheet_ids:
+                        working_sheets[idx] = sheet.copy()
+                        copied_sheet_ids.add(sheet_id)
+                    return working_sheets[idx]
+            raise ApiError(400, u'No grid with id: {}'.format(sheet_id), 'INVALID_ARGUMENT')
+
+        replies = []
+        for request_idx, request in enumerate(requests):
+            if len(request) != 1:
+                raise ApiError(400, u'Invalid requests[{}]: exactly one kind of request must be set'.format(
+                    request_idx), 'INVALID_ARGUMENT')
+            kind, params = list(request.items())[0]
+            handler = getattr(self, '_request_' + kind, None)
+            if handler is None:
+                raise ApiError(400, u'Invalid requests[{}]: {} is not supported by the stand-in'.format(
+                    request_idx, kind), 'INVALID_ARGUMENT')
+            try:
+                replies.append(handler(spreadsheet, working_sheets, sheet_for_update, params))
+            except ApiError as api_error:
+                raise ApiError(api_error.code, u'Invalid requests[{}].{}: {}'.format(request_idx, kind,
+                                                                                    api_error.message),
+                               api_error.status)
+
+        spreadsheet.sheets = working_sheets
+        for idx, sheet in enumerate(spreadsheet.sheets):
+            sheet.properties['index'] = idx
+        self.touch(spreadsheet)
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    # batchUpdate requests
+
+    def _request_addSheet(self, spreadsheet, sheets, sheet_for_update, params):
+        properties = json.loads(json.dumps(params.get('properties', {})))
+        if any(s.title == properties.get('title') for s in sheets):
+            raise ApiError(400, u'A sheet with the name "{}" already exists. Please enter another name.'.format(
+                properties.get('title')), 'INVALID_ARGUMENT')
+        properties.setdefault('sheetId', self.new_sheet_id(spreadsheet))
+        properties.setdefault('title', u'Sheet{}'.format(len(sheets) + 1))
+        properties.setdefault('sheetType', 'GRID')
+        grid_properties = properties.setdefault('gridProperties', {})
+        grid_properties.setdefault('rowCount', DEFAULT_ROW_COUNT)
+        grid_properties.setdefault('columnCount', DEFAULT_COLUMN_COUNT)
+        index = min(properties.get('index', len(sheets)), len(sheets))
+        sheets.insert(index, Sheet(properties))
+        for idx, sheet in enumerate(sheets):
+            sheet.properties['index'] = idx
+        return {'addSheet': {'properties': properties}}
+
+    def _request_deleteSheet(self, spreadsheet, sheets, sheet_for_update, params):
+        sheet = sheet_for_update(params.get('sheetId'))
+        if len(sheets) == 1:
+            raise ApiError(400, 'You can\'t remove all the sheets in a document.', 'INVALID_ARGUMENT')
+        sheets.remove(sheet)
+        return {}
+
+    def _request_updateSheetProperties(self, spreadsheet, sheets, sheet_for_update, params):
+        properties = params.get('properties', {})
+        sheet = sheet_for_update(properties.get('sheetId'))
+        fields = params.get('fields', '*')
+        field_paths = properties.keys() if fields == '*' else [f.strip() for f in fields.split(',')]
+        for field_path in field_paths:
+            source, target = properties, sheet.properties
+            names = field_path.split('.')
+            for name in names[:-1]:
+                source = source.get(name, {})
+                target = target.setdefault(name, {})
+            if names[-1] in source:
+                target[names[-1]] = source[names[-1]]
+            else:
+                target.pop(names[-1], None)
+        if 'index' in properties and ('index' in field_paths or fields == '*'):
+            sheets.remove(sheet)
+            sheets.insert(min(properties['index'], len(sheets)), sheet)
+        return {}
+
+    def _request_updateSpreadsheetProperties(self, spreadsheet, sheets, sheet_for_update, params):
+        spreadsheet.properties.update(params.get('properties', {}))
+        return {}
+
+    def _request_updateCells(self, spreadsheet, sheets, sheet_for_update, params):
+        start = params.get('start')
+        if start is None:
+            raise ApiError(400, 'only the updateCells requests with a start are supported by the stand-in',
+                           'INVALID_ARGUMENT')
+        sheet = sheet_for_update(start.get('sheetId', 0))
+        fields = params.get('fields', '')
+        rows = params.get('rows', [])
+        start_row_idx = start.get('rowIndex', 0)
+        start_col_idx = start.get('columnIndex', 0)
+
+        last_row_idx = start_row_idx + len(rows) - 1
+        if len(rows) > 0 and last_row_idx >= sheet.row_count:
+            raise ApiError(400, u'GridCoordinate.rowIndex[{}] is after last row in grid[{}]'.format(
+                last_row_idx, sheet.row_count - 1), 'INVALID_ARGUMENT')
+        last_col_idx = start_col_idx + max([len(row.get('values', [])) for row in rows] + [0]) - 1
+        if last_col_idx >= sheet.column_count:
+            raise ApiError(400, u'GridCoordinate.columnIndex[{}] is after last column in grid[{}]'.format(
+                last_col_idx, sheet.column_count - 1), 'INVALID_ARGUMENT')
+
+        # only the values are kept, the format updates are accepted and dropped
+        if fields == '*' or 'userEnteredValue' in fields:
+            for row_offset, row in enumerate(rows):
+                for col_offset, cell in enumerate(row.get('values', [])):
+                    sheet.set_value(start_row_idx + row_offset, start_col_idx + col_offset, cell_value(cell))
+        return {}
+
+    def _request_appendCells(self, spreadsheet, sheets, sheet_for_update, params):
+        sheet = sheet_for_update(params.get('sheetId'))
+        rows = params.get('rows', [])
+        # after the last row with data, the grid is extended to fit the new rows
+        start_row_idx = sheet.last_data_row() + 1
+        width = max([len(row.get('values', [])) for row in rows] + [0])
+        sheet.resize(row_count=max(sheet.row_count, start_row_idx + len(rows)),
+                     column_count=max(sheet.column_count, width))
+        for row_offset, row in enumerate(rows):
+            for col_idx, cell in enumerate(row.get('values', [])):
+                sheet.set_value(start_row_idx + row_offset, col_idx, cell_value(cell))
+        return {}
+
+    def _request_appendDimension(self, spreadsheet, sheets, sheet_for_update, params):
+        sheet = sheet_for_update(params.get('sheetId'))
+        length = params.get('length', 0)
+        if params.get('dimension') == 'COLUMNS':
+            sheet.resize(column_count=sheet.column_count + length)
+        else:
+            sheet.resize(row_count=sheet.row_count + length)
+        return {}
+
+    def _request_insertDimension(self, spreadsheet, sheets, sheet_for_update, params):
+        dimension_range = params.get('range', {})
+        sheet = sheet_for_update(dimension_range.get('sheetId'))
+        start_idx = dimension_range.get('startIndex', 0)
+        length = dimension_range.get('endIndex', start_idx) - start_idx
+
+        if dimension_range.get('dimension') == 'COLUMNS':
+            if start_idx > sheet.column_count:
+                raise ApiError(400, u'range.startIndex[{}] is after the last column'.format(start_idx),
+                               'INVALID_ARGUMENT')
+            for row in sheet.rows:
+                if start_idx < len(row):
+                    row[start_idx:start_idx] = [u''] * length
+            sheet.resize(column_count=sheet.column_count + length)
+        else:
+            if start_idx > sheet.row_count:
+                raise ApiError(400, u'range.startIndex[{}] is after the last row'.format(start_idx),
+                               'INVALID_ARGUMENT')
+            if start_idx < len(sheet.rows):
+                sheet.rows[start_idx:start_idx] = [[] for _ in range(length)]
+            sheet.resize(row_count=sheet.row_count + length)
+        return {}
+
+    def _request_deleteDimension(self, spreadsheet, sheets, sheet_for_update, params):
+        dimension_range = params.get('range', {})
+        sheet = sheet_for_update(dimension_range.get('sheetId'))
+        start_idx = dimension_range.get('startIndex', 0)
+        end_idx = dimension_range.get('endIndex', start_idx)
+
+        if dimension_range.get('dimension') == 'COLUMNS':
+            if end_idx > sheet.column_count:
+                raise ApiError(400, u'range.endIndex[{}] is after the last column'.format(end_idx),
+                               'INVALID_ARGUMENT')
+            for row in sheet.rows:
+                del row[start_idx:end_idx]
+            sheet.resize(column_count=sheet.column_count - (end_idx - start_idx))
+        else:
+            if end_idx > sheet.row_count:
+                raise ApiError(400, u'range.endIndex[{}] is after the last row'.format(end_idx), 'INVALID_ARGUMENT')
+            del sheet.rows[start_idx:end_idx]
+            sheet.resize(row_count=sheet.row_count - (end_idx - start_idx))
+        return {}
+
+    def _request_repeatCell(self, spreadsheet, sheets, sheet_for_update, params):
+        sheet_for_update(params.get('range', {}).get('sheetId', 0))
+        return {}
+
+    def _request_addConditionalFormatRule(self, spreadsheet, sheets, sheet_for_update, params):
+        rule = params.get('rule', {})
+        sheet_ids = set(grid_range.get('sheetId', 0) for grid_range in rule.get('ranges', []))
+        for sheet_id in sheet_ids:
+            sheet = sheet_for_update(sheet_id)
+            sheet.conditional_formats.insert(min(params.get('index', 0), len(sheet.conditional_formats)), rule)
+        return {}
+
+    # Drive
+
+    def _drive_files_list(self, exchange):
+        filters = []
+        query = exchange.param('q', '')
+        for clause in re.split(r'\s+and\s+', query) if query.strip() else []:
+            match = _DRIVE_QUERY_REGEX.match(clause)
+            if match is None or match.group(1) not in ('name', 'mimeType'):
+                raise ApiError(400, u'the stand-in supports only name and mimeType filters: {}'.format(clause),
+                               'INVALID_ARGUMENT')
+            filters.append((match.group(1), re.sub(r'\\(.)', r'\1', match.group(2))))
+
+        files = [s.file_json() for s in self.spreadsheets.values()]
+        files = [f for f in files if all(f[name] == value for name, value in filters)]
+        # most recently modified first (orderBy=recency)
+        files.sort(key=lambda f: f['modifiedTime'], reverse=True)
+        return {'kind': 'drive#fileList', 'incompleteSearch': False, 'files': files}
+
+    def _drive_files_get(self, exchange, file_id):
+        return self.spreadsheet(file_id).file_json()
+
+    def _drive_files_delete(self, exchange, file_id):
+        self.spreadsheet(file_id)
+        del self.spreadsheets[file_id]
+        return None
+
+    def _drive_permissions_list(self, exchange, file_id):
+        return {'kind': 'drive#permissionList', 'permissions': self.spreadsheet(file_id).permissions}
+
+    def _drive_permissions_create(self, exchange, file_id):
+        permission = dict(exchange.body or {})
+        permission.update({'kind': 'drive#permission', 'id': '{:020d}'.format(self.rng.getrandbits(64))})
+        self.spreadsheet(file_id).permissions.append(permission)
+        return permission
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the Google hosts (PooledHttp reuses its connections)
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.stand_in.handle_request(self)
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+    def log_message(self, log_format, *args):
+        # the requests are logged by the stand-in
+        pass
+
+
+class SheetsStandIn(object):
+    """
+    Serves the emulated (or replayed, or forwarded) Sheets and Drive endpoints on a local port, on a background
+    thread. Point a PooledHttp at its url (GoogleSheetsManager(..., api_endpoint=stand_in.url)) to use it.
+
+    Usage:
+        with SheetsStandIn(latency=0.2, write_quota=60) as stand_in:
+            ... run the GoogleSheetsManager against stand_in.url ...
+            print(stand_in.stats())
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, read_quota=None, write_quota=None,
+                 quota_window=DEFAULT_QUOTA_WINDOW, failure_rate=0.0, seed=0, record_path=None, replay_path=None,
+                 upstream=False, drop_rate=0.0):
+        # type: (str, int, float, float, int, int, float, float, int, str, str, bool, float) -> None
+        """
+        :param int port: the local port (0 picks a free one)
+        :param float latency: seconds added to every response
+        :param float jitter: up to this many seconds are added to the latency (uniformly distributed)
+        :param int read_quota: Sheets read requests accepted per `quota_window` (the others get a 429 response)
+        :param int write_quota: Sheets write requests accepted per `quota_window`
+        :param float quota_window: seconds after which the quotas are reset (60 for the Sheets API)
+        :param float failure_rate: fraction of the requests that get a 503 response (0 to 1)
+        :param int seed: the seed of the latency jitter, of the injected failures and of the generated ids
+        :param str record_path: if set, every served response is appended to this JSON lines file
+        :param str replay_path: if set, the responses are read from this recorded session instead of being emulated
+                                (requests are matched by method, path, query and body, in the recorded order)
+        :param bool upstream: forward the requests to the Google hosts instead of emulating them (to record a real
+                              session, with a real service account key)
+        :param float drop_rate: fraction of the requests whose connection is closed without any response (0 to 1),
+                                the request is not applied
+        """
+        self.latency = latency  # type: float
+        self.jitter = jitter  # type: float
+        self.read_quota = read_quota  # type: int
+        self.write_quota = write_quota  # type: int
+        self.quota_window = quota_window  # type: float
+        self.failure_rate = failure_rate  # type: float
+        self.drop_rate = drop_rate  # type: float
+        self.upstream = upstream  # type: bool
+        self.emulator = SheetsEmulator(seed=seed)  # type: SheetsEmulator
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._quota_usage = {}  # type: Dict[str, Tuple[int, int]]
+        self._stats = {}  # type: Dict[str, int]
+
+        self._record_file = io.open(record_path, 'a', encoding='utf-8') if record_path is not None else None
+        self._replay_responses = None  # type: Dict[str, List[Dict[str, Any]]]
+        if replay_path is not None:
+            self._replay_responses = {}
+            with io.open(replay_path, 'r', encoding='utf-8') as replay_file:
+                for line in replay_file:
+                    if line.strip() == '':
+                        continue
+                    recorded = json.loads(line)
+                    exchange = Exchange(recorded['method'], recorded['path'],
+                                        [tuple(p) for p in recorded['query']], recorded['body'], {})
+                    self._replay_responses.setdefault(exchange.replay_key(), []).append(recorded)
+
+        self._upstream_session = None
+        if upstream:
+            import requests
+            self._upstream_session = requests.Session()
+
+        self._server = _ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.stand_in = self
+        self._thread = None  # type: threading.Thread
+
+    @property
+    def url(self):
+        # type: () -> str
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        # type: () -> SheetsStandIn
+        self._thread = threading.Thread(target=self._server.serve_forever, name='sheets-stand-in')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(u'SHEETS STAND-IN LISTENING ON {}'.format(self.url), color='g', event='stand_in_started',
+                    url=self.url)
+        return self
+
+    def stop(self):
+        # type: () -> None
+        self._server.shutdown()
+        self._server.server_close()
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """
+        :return: the number of requests by endpoint and quota kind, and the number of throttled, failed, dropped and
+        unmatched (replay) requests
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        # type: () -> None
+        with self._lock:
+            self._stats = {}
+
+    def __count(self, *names):
+        with self._lock:
+            for name in names:
+                self._stats[name] = self._stats.get(name, 0) + 1
+
+    def __delay(self):
+        # type: () -> float
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+
+    def __fails(self):
+        # type: () -> bool
+        if self.failure_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.failure_rate
+
+    def __drops(self):
+        # type: () -> bool
+        if self.drop_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.drop_rate
+
+    def __consume_quota(self, kind):
+        # type: (str) -> float
+        """
+        :return: None if the request is within the quota of its kind, else the seconds until the quota is reset
+        """
+        limit = {'read': self.read_quota, 'write': self.write_quota}.get(kind)
+        if limit is None:
+            return None
+
+        now = time.time()
+        window = int((now - self._start_time) // self.quota_window)
+        with self._lock:
+            used_window, used_count = self._quota_usage.get(kind, (window, 0))
+            if used_window != window:
+                used_count = 0
+            if used_count >= limit:
+                return self._start_time + (window + 1) * self.quota_window - now
+            self._quota_usage[kind] = (window, used_count + 1)
+        return None
+
+    def handle_request(self, handler):
+        # type: (BaseHTTPRequestHandler) -> None
+        content_length = int(handler.headers.get('Content-Length') or 0)
+        request_body = handler.rfile.read(content_length) if content_length > 0 else b''
+        raw_body = request_body
+        method = handler.command
+        url = urlsplit(handler.path)
+        query = url.query
+
+        # the API client sends the long GET requests (ex. a values.batchGet of many ranges) as form encoded POSTs
+        if method == 'POST' and (handler.headers.get('X-HTTP-Method-Override') or '').upper() == 'GET':
+            method = 'GET'
+            query = raw_body.decode('utf-8')
+            raw_body = b''
+
+        body = None
+        if len(raw_body) > 0:
+            text_body = raw_body.decode('utf-8')
+            try:
+                body = json.loads(text_body)
+            except ValueError:
+                body = text_body
+
+        exchange = Exchange(method, url.path, parse_qsl(query, keep_blank_values=True), body,
+                            {k.lower(): v for k, v in handler.headers.items()})
+        endpoint, kind, groups = 'unknown', 'unknown', ()
+        for endpoint_method, path_regex, endpoint_name, endpoint_kind in ENDPOINTS:
+            match = path_regex.match(url.path)
+            if endpoint_method == method and match is not None:
+                endpoint, kind, groups = endpoint_name, endpoint_kind, match.groups()
+                break
+
+        self.__count('requests', endpoint, kind)
+        delay = self.__delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        if kind != 'token' and self.__drops():
+            # the connection is closed once the handler returns, the client reads no status line
+            self.__count('dropped')
+            logger.debug(u'STAND-IN {} {} -> DROPPED'.format(method, url.path), event='stand_in_request',
+                         endpoint=endpoint, status=None)
+            handler.close_connection = True
+            return
+
+        retry_after = self.__consume_quota(kind)
+        if retry_after is not None:
+            self.__count('throttled')
+            quota_name = 'Read requests' if kind == 'read' else 'Write requests'
+            exchange.status = 429
+            exchange.response = ApiError(429, u"Quota exceeded for quota metric '{0}' and limit '{0} per minute per "
+                                              u"user' of service 'sheets.googleapis.com'".format(quota_name),
+                                         'RESOURCE_EXHAUSTED').body()
+            exchange.response_headers['Retry-After'] = str(max(int(retry_after + 0.999), 1))
+        elif kind != 'token' and self.__fails():
+            self.__count('failed')
+            exchange.status = 503
+            exchange.response = ApiError(503, 'The service is currently unavailable.', 'UNAVAILABLE').body()
+        else:
+            self.__respond(exchange, endpoint, groups, request_body, handler)
+
+        logger.debug(u'STAND-IN {} {} -> {} ({:.0f} MS)'.format(method, url.path, exchange.status, delay * 1000),
+                     event='stand_in_request', endpoint=endpoint, status=exchange.status)
+        self.__send(handler, exchange)
+
+    def __respond(self, exchange, endpoint, groups, request_body, handler):
+        # type: (Exchange, str, Tuple[str, ...], bytes, BaseHTTPRequestHandler) -> None
+        # the access tokens are never recorded nor replayed
+        record = endpoint != 'token'
+
+        if self.upstream:
+            self.__forward(exchange, request_body, handler)
+        elif self._replay_responses is not None and record:
+            recorded_responses = self._replay_responses.get(exchange.replay_key())
+            if not recorded_responses:
+                self.__count('replay_misses')
+                logger.warning(u'STAND-IN HAS NO RECORDED RESPONSE FOR {} {}'.format(exchange.method, exchange.path),
+                               event='stand_in_replay_miss', endpoint=endpoint)
+                exchange.status = 400
+                exchange.response = ApiError(400, u'the stand-in has no recorded response for this request',
+                                             'FAILED_PRECONDITION').body()
+                return
+            recorded = recorded_responses.pop(0) if len(recorded_responses) > 1 else recorded_responses[0]
+            exchange.status = recorded['status']
+            exchange.response = recorded['response']
+            return
+        elif endpoint == 'unknown':
+            exchange.status = 404
+            exchange.response = ApiError(404, u'the stand-in does not implement {} {}'.format(exchange.method,
+                                                                                               exchange.path),
+                                         'NOT_FOUND').body()
+        else:
+            try:
+                exchange.response = self.emulator.handle(endpoint, groups, exchange)
+                exchange.status = 200 if exchange.response is not None else 204
+            except ApiError as api_error:
+                exchange.status = api_error.code
+                exchange.response = api_error.body()
+
+        if record and self._record_file is not None:
+            with self._lock:
+                self._record_file.write(u'{}\n'.format(json.dumps(exchange.to_json(), ensure_ascii=False)))
+                self._record_file.flush()
+
+    def __forward(self, exchange, request_body, handler):
+        # type: (Exchange, bytes, BaseHTTPRequestHandler) -> None
+        # the request is sent as received (same method, query and body)
+        hosts = [host for path_prefix, host in UPSTREAM_HOSTS if exchange.path.startswith(path_prefix)]
+        if len(hosts) == 0:
+            exchange.status = 404
+            exchange.response = ApiError(404, u'no upstream host for {}'.format(exchange.path), 'NOT_FOUND').body()
+            return
+
+        headers = {name: value for name, value in handler.headers.items()
+                   if name.lower() in ('authorization', 'content-type', 'x-http-method-override')}
+        response = self._upstream_session.request(handler.command, hosts[0] + handler.path, data=request_body,
+                                                  headers=headers, timeout=120)
+        exchange.status = response.status_code
+        try:
+            exchange.response = response.json() if len(response.content) > 0 else None
+        except ValueError:
+            exchange.response = response.text
+        if 'Retry-After' in response.headers:
+            exchange.response_headers['Retry-After'] = response.headers['Retry-After']
+
+    @staticmethod
+    def __send(handler, exchange):
+        # type: (BaseHTTPRequestHandler, Exchange) -> None
+        if exchange.response is None:
+            content = b''
+        elif isinstance(exchange.response, (dict, list)):
+            content = json.dumps(exchange.response, ensure_ascii=False).encode('utf-8')
+        else:
+            content = u'{}'.format(exchange.response).encode('utf-8')
+
+        handler.send_response(exchange.status)
+        handler.send_header('Content-Type', 'application/json; charset=UTF-8')
+        handler.send_header('Content-Length', str(len(content)))
+        for name, value in exchange.response_headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if len(content) > 0:
+            handler.wfile.write(content)
+
+
+def write_service_account_file(file_path, client_email='gslocalization@stand-in.iam.gserviceaccount.com'):
+    # type: (str, str) -> None
+    """
+    Writes a service account key file with a newly generated RSA key, to authorize pygsheets against the stand-in
+    (the stand-in accepts any signed token request). Needs the cryptography package.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.backends import default_backend
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    private_key_pem = private_key.private_bytes(encoding=serialization.Encoding.PEM,
+                                                format=serialization.PrivateFormat.PKCS8,
+                                                encryption_algorithm=serialization.NoEncryption())
+    service_account = {
+        'type': 'service_account',
+        'project_id': 'stand-in',
+        'private_key_id': 'stand-in',
+        'private_key': private_key_pem.decode('utf-8'),
+        'client_email': client_email,
+        'client_id': '0',
+        'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
+        'token_uri': 'https://oauth2.googleapis.com/token',
+    }
+    with io.open(file_path, 'w', encoding='utf-8') as service_account_file:
+        service_account_file.write(u'{}'.format(json.dumps(service_account, indent=2)))
+
+
+def print_stats(stats):
+    # type: (Dict[str, int]) -> None
+    counts = [stats.get(name, 0) for name in ('requests', 'read', 'write', 'drive', 'throttled', 'failed', 'dropped',
+                                              'replay_misses')]
+    logger.info(u'{} REQUESTS: {} READS, {} WRITES, {} DRIVE, {} THROTTLED, {} FAILED, {} DROPPED, '
+                u'{} NOT REPLAYED'.format(*counts), color='g', event='stand_in_stats', **stats)
+    for endpoint in sorted(name for name in stats.keys() if '.' in name):
+        logger.info(u'  {:<32} {:>8}'.format(endpoint, stats[endpoint]))
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', required=False, default='127.0.0.1', help='interface the stand-in listens on (default=127.0.0.1)', metavar='\b')
+    ap.add_argument('--port', required=False, type=int, default=8080, help='port the stand-in listens on (default=8080)', metavar='\b')
+    ap.add_argument('--latency', required=False, type=float, default=0.0, help='seconds added to every response (default=0)', metavar='\b')
+    ap.add_argument('--jitter', required=False, type=float, default=0.0, help='up to this many seconds are added to the latency (default=0)', metavar='\b')
+    ap.add_argument('--read_quota', required=False, type=int, default=None, help='Sheets read requests accepted per quota window, the others get a 429 response (default=unlimited)', metavar='\b')
+    ap.add_argument('--write_quota', required=False, type=int, default=None, help='Sheets write requests accepted per quota window (default=unlimited)', metavar='\b')
+    ap.add_argument('--quota_window', required=False, type=float, default=DEFAULT_QUOTA_WINDOW, help='seconds after which the quotas are reset (default={:.0f})'.format(DEFAULT_QUOTA_WINDOW), metavar='\b')
+    ap.add_argument('--failure_rate', required=False, type=float, default=0.0, help='fraction of the requests that get a 503 response (default=0)', metavar='\b')
+    ap.add_argument('--drop_rate', required=False, type=float, default=0.0, help='fraction of the requests whose connection is closed without a response (default=0)', metavar='\b')
+    ap.add_argument('-s', '--seed', required=False, type=int, default=0, help='seed of the latency jitter, of the injected failures and of the generated ids (default=0)', metavar='\b')
+    ap.add_argument('--record', required=False, default=None, help='append the served responses to this JSON lines file', metavar='\b')
+    ap.add_argument('--replay', required=False, default=None, help='serve the responses recorded in this JSON lines file instead of emulating the API', metavar='\b')
+    ap.add_argument('--upstream', required=False, action='store_true', help='forward the requests to the Google hosts (use with --record and a real service account key to record a session)')
+    ap.add_argument('--service_account_file', required=False, default=None, help='write a service account key file accepted by the stand-in to this path', metavar='\b')
+    return vars(ap.parse_args())
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args['service_account_file'] is not None:
+        write_service_account_file(args['service_account_file'])
+        logger.info(u'WROTE THE SERVICE ACCOUNT KEY FILE {}'.format(args['service_account_file']), color='g')
+
+    sheets_stand_in = SheetsStandIn(host=args['host'], port=args['port'], latency=args['latency'],
+                                    jitter=args['jitter'], read_quota=args['read_quota'],
+                                    write_quota=args['write_quota'], quota_window=args['quota_window'],
+                                    failure_rate=args['failure_rate'], seed=args['seed'], record_path=args['record'],
+                                    replay_path=args['replay'], upstream=args['upstream'], drop_rate=args['drop_rate'])
+    sheets_stand_in.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sheets_stand_in.stop()
+        print_stats(sheets_stand_in.stats())
+        logger.flush()
@@ -0,0 +1,292 @@
+from bisect import bisect_right
+from typing import List, Dict, Any, Callable, Tuple
+
+from utils.logger import logger
+
+
+class WorksheetSnapshot(object):
+    """
+    A local copy of a worksheet's values, taken with a single read. All the planning (diffing) is done against this
+    copy, so no API calls are issued while a ChangeSet is being computed.
+    """
+
+    def __init__(self, worksheet, values):
+        # type: (Any, List[List[Any]]) -> WorksheetSnapshot
+        self.worksheet = worksheet
+        self.header = list(values[0]) if len(values) > 0 else []  # type: List[str]
+        self.rows = [self.__pad_row(row) for row in values[1:]]  # type: List[List[Any]]
+
+    def __pad_row(self, row):
+        # the Sheets API trims the trailing empty cells of every row
+        row = list(row)
+        if len(row) < len(self.header):
+            row += [''] * (len(self.header) - len(row))
+        return row
+
+    def column_index(self, header_value):
+        # type: (str) -> int
+        """
+        :return: the 0 based index of the column with the given header value
+        """
+        return self.header.index(header_value)
+
+    def column(self, header_value):
+        # type: (str) -> List[Any]
+        col_idx = self.column_index(header_value)
+        return [row[col_idx] for row in self.rows]
+
+    def records(self):
+        # type: () -> List[Dict[str, Any]]
+        """
+        :return: the rows of the snapshot as dicts keyed by the header values (same format as get_all_records)
+        """
+        return [dict(zip(self.header, row)) for row in self.rows]
+
+    def row_numbers_by_key(self, key_header):
+        # type: (str) -> Dict[Any, int]
+        """
+        :return: a dict that maps every key from the `key_header` column to its 1 based row number in the worksheet
+        """
+        key_idx = self.column_index(key_header)
+        return {row[key_idx]: idx + 2 for idx, row in enumerate(self.rows)}
+
+    def mirror(self, change_set, row_placement):
+        # type: (ChangeSet, Tuple[List[Tuple[int, List[List[Any]]]], List[List[Any]]]) -> None
+        """
+        Applies the operations of an already executed ChangeSet on the local copy, in the same order as the server
+        does, so the snapshot stays valid without reading the worksheet again.
+        :param change_set: the executed change set
+        :param row_placement: the result of change_set.row_placement(), computed before any snapshot was changed
+        """
+        for cell_update in change_set.cell_updates:
+            self.rows[cell_update.row - 2][cell_update.col - 1] = cell_update.value
+
+        for row_number in sorted(set(change_set.deletions), reverse=True):
+            del self.rows[row_number - 2]
+
+        inserted_groups, appended_rows = row_placement
+        for row_index, rows in inserted_groups:
+            self.rows[row_index:row_index] = [self.__pad_row(row) for row in rows]
+
+        self.rows += [self.__pad_row(row) for row in appended_rows]
+
+
+class CellUpdate(object):
+    def __init__(self, row, col, value):
+        # type: (int, int, Any) -> CellUpdate
+        self.row = row  # type: int
+        self.col = col  # type: int
+        self.value = value
+
+    def __str__(self):
+        return u'{}{} = {}'.format(chr(ord('A') + self.col - 1), self.row, self.value)
+
+
+class FileWrite(object):
+    def __init__(self, file_path, description, writer):
+        # type: (str, str, Callable[[], None]) -> FileWrite
+        self.file_path = file_path  # type: str
+        self.description = description  # type: str
+        self.writer = writer  # type: Callable[[], None]
+
+    def __str__(self):
+        return u'{} ({})'.format(self.file_path, self.description)
+
+
+class ChangeSet(object):
+    """
+    The complete list of changes that a sync step wants to make to one worksheet and to the local files.
+    Cell updates and deletions are expressed in the row numbers of the snapshot the plan was computed against.
+    New rows are placed at their sorted position (by the first column), so the worksheet never needs a full sort.
+    """
+
+    def __init__(self, worksheet, snapshot=None):
+        # type: (Any, WorksheetSnapshot) -> ChangeSet
+        self.worksheet = worksheet
+        self.snapshot = snapshot  # type: WorksheetSnapshot
+        self.new_rows = []  # type: List[List[Any]]
+        self.cell_updates = []  # type: List[CellUpdate]
+        self.deletions = []  # type: List[int]
+        self.file_writes = []  # type: List[FileWrite]
+        # for a sharded worksheet (sharded by path), the new rows go to the shard of this key (ex. the Android module)
+        self.shard_key = None  # type: str
+
+    @property
+    def title(self):
+        # type: () -> str
+        if self.worksheet is None:
+            return 'LOCAL FILES'
+        return u'{} - {}'.format(self.worksheet.spreadsheet.title, self.worksheet.title)
+
+    def has_remote_changes(self):
+        # type: () -> bool
+        return len(self.new_rows) > 0 or len(self.cell_updates) > 0 or len(self.deletions) > 0
+
+    def is_empty(self):
+        # type: () -> bool
+        return not self.has_remote_changes() and len(self.file_writes) == 0
+
+    def update_cell(self, row, col, value):
+        # type: (int, int, Any) -> None
+        self.cell_updates.append(CellUpdate(row=row, col=col, value=value))
+
+    def write_file(self, file_path, description, writer):
+        # type: (str, str, Callable[[], None]) -> None
+        self.file_writes.append(FileWrite(file_path=file_path, description=description, writer=writer))
+
+    def row_placement(self):
+        # type: () -> Tuple[List[Tuple[int, List[List[Any]]]], List[List[Any]]]
+        """
+        Computes where every new row goes, by merging the sorted new rows into the rows of the snapshot that are kept
+        after the deletions. The worksheet is expected to be sorted by the first column (if it is not, the new rows
+        are still inserted next to rows with similar values).
+        :return: the groups of rows to insert as (0 based data row index after the deletions, rows), ordered
+        bottom-up, and the rows that go after the last row of the worksheet
+        """
+        snapshot_rows = self.snapshot.rows if self.snapshot is not None else []
+        deleted_row_numbers = set(self.deletions)
+        kept_keys = [sort_key(row[0] if len(row) > 0 else '') for idx, row in enumerate(snapshot_rows)
+                     if idx + 2 not in deleted_row_numbers]
+
+        inserted_groups = {}  # type: Dict[int, List[List[Any]]]
+        appended_rows = []  # type: List[List[Any]]
+        for row in sorted(self.new_rows, key=lambda r: sort_key(r[0] if len(r) > 0 else '')):
+            row_index = bisect_right(kept_keys, sort_key(row[0] if len(row) > 0 else ''))
+            if row_index >= len(kept_keys):
+                appended_rows.append(row)
+            else:
+                inserted_groups.setdefault(row_index, []).append(row)
+
+        return sorted(inserted_groups.items(), reverse=True), appended_rows
+
+    def appended_rows_start(self, row_placement):
+        # type: (Tuple[List[Tuple[int, List[List[Any]]]], List[List[Any]]]) -> int
+        """
+        :param row_placement: the result of row_placement()
+        :return: the 0 based worksheet row index of the first appended row, once the whole change set was applied
+        """
+        snapshot_rows = self.snapshot.rows if self.snapshot is not None else []
+        deleted_rows_count = len([n for n in set(self.deletions) if 2 <= n < len(snapshot_rows) + 2])
+        inserted_groups, _ = row_placement
+        inserted_rows_count = sum(len(rows) for _, rows in inserted_groups)
+        return 1 + len(snapshot_rows) - deleted_rows_count + inserted_rows_count
+
+    def to_batch_requests(self, append_rows=True):
+        # type: (bool) -> List[Dict[str, Any]]
+        """
+        :param bool append_rows: if False, the rows that go after the last row of the worksheet are not written, the
+        grid is only extended to fit them (they are uploaded separately, in chunks)
+        :return: the spreadsheets.batchUpdate requests that apply this change set. The server runs them in order, so
+        the cell updates (snapshot row numbers) go first, then the deletions (bottom-up) and the new rows.
+        """
+        if not self.has_remote_changes():
+            return []
+
+        sheet_id = self.worksheet.id
+        requests = []
+
+        for cell_update in self.cell_updates:
+            requests.append({
+                'updateCells': {
+                    'rows': [{'values': [cell_data(cell_update.value)]}],
+                    'fields': 'userEnteredValue',
+                    'start': {'sheetId': sheet_id,
+                              'rowIndex': cell_update.row - 1,
+                              'columnIndex': cell_update.col - 1}
+                }
+            })
+
+        for row_number in sorted(set(self.deletions), reverse=True):
+            requests.append({
+                'deleteDimension': {
+                    'range': {'sheetId': sheet_id,
+                              'dimension': 'ROWS',
+                              'startIndex': row_number - 1,
+                              'endIndex': row_number}
+                }
+            })
+
+        inserted_groups, appended_rows = self.row_placement()
+
+        if len(appended_rows) > 0 and not append_rows:
+            requests.append({
+                'appendDimension': {
+                    'sheetId': sheet_id,
+                    'dimension': 'ROWS',
+                    'length': len(appended_rows)
+                }
+            })
+        elif len(appended_rows) > 0:
+            requests.append({
+                'appendCells': {
+                    'sheetId': sheet_id,
+                    'rows': [row_data(row) for row in appended_rows],
+                    'fields': 'userEnteredValue'
+                }
+            })
+
+        # bottom-up, so the positions of the groups above are not shifted by the inserted rows
+        for row_index, rows in inserted_groups:
+            requests.append({
+                'insertDimension': {
+                    'range': {'sheetId': sheet_id,
+                              'dimension': 'ROWS',
+                              'startIndex': row_index + 1,
+                              'endIndex': row_index + 1 + len(rows)},
+                    'inheritFromBefore': row_index > 0
+                }
+            })
+            requests.append({
+                'updateCells': {
+                    'rows': [row_data(row) for row in rows],
+                    'fields': 'userEnteredValue',
+                    'start': {'sheetId': sheet_id, 'rowIndex': row_index + 1, 'columnIndex': 0}
+                }
+            })
+
+        return requests
+
+    def print_summary(self):
+        # type: () -> None
+        logger.info(u'PLAN FOR {}: {} NEW ROWS, {} CELL UPDATES, {} DELETIONS, {} FILE WRITES'.format(
+            self.title, len(self.new_rows), len(self.cell_updates), len(self.deletions), len(self.file_writes)),
+            color='y')
+
+        for row in self.new_rows:
+            logger.debug(u'  + ADD {}'.format(row), color='g')
+        for cell_update in self.cell_updates:
+            logger.debug(u'  ~ UPDATE {}'.format(cell_update), color='y')
+        for row_number in sorted(self.deletions):
+            logger.debug(u'  - DELETE ROW {}'.format(row_number), color='r')
+        for file_write in self.file_writes:
+            logger.debug(u'  > WRITE {}'.format(file_write), color='y')
+
+
+def cell_data(value):
+    # type: (Any) -> Dict[str, Any]
+    """
+    :return: a CellData object for the batchUpdate requests. Formulas are kept as formulas (same as USER_ENTERED),
+    everything else is written as a plain string.
+    """
+    if value is None:
+        value = ''
+    value = u'{}'.format(value)
+    if value.startswith('='):
+        return {'userEnteredValue': {'formulaValue': value}}
+    return {'userEnteredValue': {'stringValue': value}}
+
+
+def row_data(values):
+    # type: (List[Any]) -> Dict[str, Any]
+    return {'values': [cell_data(value) for value in values]}
+
+
+def sort_key(value):
+    # type: (Any) -> Tuple[int, Any]
+    """
+    :return: a sort key that approximates the ascending order used by the Sheets sortRange request
+    (numbers first, then case insensitive text)
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0, value
+    return 1, u'{}'.format(value).lower()
@@ -1,38 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pygsheets
-from typing import List
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Any, Callable, Set
+
+from pygsheets.custom_types import ValueRenderOption
+
+from cloud_managers.change_set import ChangeSet, WorksheetSnapshot, row_data
+from cloud_managers.http_session import PooledHttp, DEFAULT_POOL_SIZE
+from cloud_managers.row_index import RowIndex, RowIndexCache
+from cloud_managers.sharding import ShardedWorksheet, ShardedSnapshot, ShardBy, worksheet_shards, split_change_set
+from utils.pygsheets_conditional_formatting import ConditionalFormattingPass
+from utils.logger import logger
+
+
+class SpreadsheetLayout(object):
+    # one spreadsheet per language, with one worksheet per platform (ex. MyProject_Spanish_localizations/ios_strings)
+    PER_LANGUAGE = 'language'
+    # one spreadsheet per project, with one worksheet per platform and language (ex. MyProject_localizations/ios_strings_Spanish)
+    PER_PROJECT = 'project'
+
+
+DEFAULT_UPLOAD_CHUNK_SIZE = 1000
+DEFAULT_UPLOADS_IN_FLIGHT = 4
 
 
 class GoogleSheetsManager(object):
-    def __init__(self, service_account_file_path, user_email=None, project_name=None):
-        # type: (str, str, str) -> GoogleSheetsManager
-        self.google_client = pygsheets.authorize(service_account_file=service_account_file_path)
+    def __init__(self, service_account_file_path, user_email=None, project_name=None, dry_run=False,
+                 layout=SpreadsheetLayout.PER_LANGUAGE, http=None, upload_chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE,
+                 uploads_in_flight=DEFAULT_UPLOADS_IN_FLIGHT, shared_sources=False, shards=1, shard_by=ShardBy.KEY,
+                 row_index_cache=None, api_endpoint=None):
+        # type: (str, str, str, bool, str, PooledHttp, int, int, bool, int, str, RowIndexCache, str) -> GoogleSheetsManager
+        # a single pooled session is shared by all the spreadsheets opened during the run
+        # (api_endpoint sends all the requests to another host, ex. the local stand-in of benchmarks/sheets_stand_in.py)
+        if http is None:
+            http = PooledHttp(pool_size=max(DEFAULT_POOL_SIZE, uploads_in_flight), endpoint=api_endpoint)
+        self.http = http  # type: PooledHttp
+        self.google_client = pygsheets.authorize(service_account_file=service_account_file_path, http=self.http)
         self.user_email = user_email
         self.project_name = project_name
+        self.dry_run = dry_run  # type: bool
+        self.layout = layout  # type: str
+        # the new rows added after the last row of a worksheet are uploaded in chunks of this size (large exports)
+        self.upload_chunk_size = upload_chunk_size  # type: int
+        self.uploads_in_flight = uploads_in_flight  # type: int
+        # the source texts used by both platforms are stored once, in the shared worksheet of every language
+        self.shared_sources = shared_sources  # type: bool
+        # with more than one shard, every worksheet is split between this number of spreadsheets (see ShardedWorksheet)
+        self.shards = max(shards, 1)  # type: int
+        self.shard_by = shard_by  # type: str
+        # the row indexes are kept between runs, while their spreadsheets are not modified
+        self.row_index_cache = row_index_cache  # type: RowIndexCache
+        self._spreadsheets = {}  # type: Dict[str, pygsheets.Spreadsheet]
+        self._worksheets = {}  # type: Dict[Tuple[str, str], pygsheets.Worksheet]
+        self._snapshots = {}  # type: Dict[Tuple[str, int, str], WorksheetSnapshot]
+        self._sharded_snapshots = {}  # type: Dict[Tuple[str, int, str], ShardedSnapshot]
+        self._projections = {}  # type: Dict[Tuple[str, int, str, Tuple[str, ...]], List[List[Any]]]
+        # the 0 based worksheet column of every column of the cached projections, to mirror the change sets on them
+        self._projection_columns = {}  # type: Dict[Tuple[str, int, str, Tuple[str, ...]], List[int]]
+        self._row_indexes = {}  # type: Dict[Tuple[str, int, str, Tuple[str, ...]], RowIndex]
+        self._queued_requests = None  # type: Dict[str, List[dict]]
+        # spreadsheets changed since the last when_sent call, and the callbacks waiting for queued requests
+        self._touched_spreadsheet_ids = set()  # type: Set[str]
+        self._sent_callbacks = []  # type: List[Tuple[Set[str], Callable[[], None]]]
+        # the worksheets that a dry run would create (see PlannedWorksheet)
+        self._planned_worksheet_count = 0  # type: int
+        self.highlighting = ConditionalFormattingPass(self.google_client)  # type: ConditionalFormattingPass
 
-    def get_spreadsheet_name(self, language):
-        # type: (str) -> str
-        if self.project_name is not None:
-            return '{}_{}_localizations'.format(self.project_name, language)
+    def get_spreadsheet_name(self, language, shard_index=0):
+        # type: (str, int) -> str
+        """
+        :param int shard_index: the 0 based shard index (the first shard uses the name of the unsharded spreadsheet)
+        """
+        if self.layout == SpreadsheetLayout.PER_PROJECT:
+            spreadsheet_name = '{}_localizations'.format(self.project_name if self.project_name is not None else 'project')
+        elif self.project_name is not None:
+            spreadsheet_name = '{}_{}_localizations'.format(self.project_name, language)
         else:
-            return '{}_localizations'.format(language)
+            spreadsheet_name = '{}_localizations'.format(language)
+
+        if shard_index > 0:
+            return '{}_shard{}'.format(spreadsheet_name, shard_index + 1)
+        return spreadsheet_name
 
-    def create_spreadsheet(self, platform, language, header_values, overwrite=False):
+    def get_worksheet_name(self, platform, language):
+        # type: (str, str) -> str
+        if self.layout == SpreadsheetLayout.PER_PROJECT:
+            return '{}_strings_{}'.format(platform, language)
+        return '{}_strings'.format(platform)
 
-        sh_name = self.get_spreadsheet_name(language=language)
+    def create_spreadsheet(self, platform, language, header_values, overwrite=False, shard_index=0):
+
+        sh_name = self.get_spreadsheet_name(language=language, shard_index=shard_index)
         # Delete all spreadsheets with the same name if overwrite = True
         if overwrite:
-            all_sh = self.google_client.open_all()
-            sh_to_delete = [sh for sh in all_sh if sh.title == sh_name]
-
-            for sh in sh_to_delete:
+            for sh_metadata in self.find_spreadsheets(sh_name):
                 try:
-                    sh.delete()
+                    self.google_client.drive.delete(sh_metadata['id'])
                 except Exception as api_exception:
-                    print('Failed to delete spreadsheet {} - {}'.format(sh.title, sh.id))
-                    print(api_exception)
+                    logger.error(u'FAILED TO DELETE SPREADSHEET {} - {}: {}'.format(
+                        sh_metadata['name'], sh_metadata['id'], api_exception), event='spreadsheet_delete_failed',
+                        spreadsheet=sh_metadata['name'], spreadsheet_id=sh_metadata['id'])
 
         lang_sh = self.google_client.create(sh_name)
-        platform_worksheet_name = '{}_strings'.format(platform)
+        platform_worksheet_name = self.get_worksheet_name(platform=platform, language=language)
         platform_worksheet = lang_sh.add_worksheet(title=platform_worksheet_name, rows=1, cols=len(header_values))
         lang_sh.del_worksheet(lang_sh.sheet1)
         lang_sh.share(self.user_email, type='user', role='owner', transferOwnership=True)
@@ -42,33 +114,775 @@ class GoogleSheetsManager(object):
 
         return lang_sh
 
+    def find_spreadsheets(self, spreadsheet_name):
+        # type: (str) -> List[Dict[str, Any]]
+        """
+        :return: the Drive metadata (id, name, parents) of the spreadsheets with the given name, most recent first.
+        The name is filtered by the Drive query, so the metadata of the other spreadsheets is not downloaded.
+        """
+        query = "name = '{}'".format(spreadsheet_name.replace('\\', '\\\\').replace("'", "\\'"))
+        return self.google_client.drive.spreadsheet_metadata(query=query)
+
+    def find_worksheet(self, platform, language):
+        # type: (str, str) -> pygsheets.Worksheet
+        """
+        Opens the worksheet for the platform and language only if it exists (nothing is created and the header is
+        not checked). Used to read the worksheets of the other platform.
+        :return: the worksheet (a ShardedWorksheet of the existing shards, if sharded), or None if it does not exist
+        """
+        if (platform, language) in self._worksheets:
+            return self._worksheets[(platform, language)]
+
+        if self.shards == 1:
+            return self.__find_shard_worksheet(platform=platform, language=language, shard_index=0)
+
+        shards = [self.__find_shard_worksheet(platform=platform, language=language, shard_index=idx)
+                  for idx in range(self.shards)]
+        shards = [shard for shard in shards if shard is not None]
+        if len(shards) == 0:
+            return None
+        # no new rows are added to the found worksheets, so the header (used to place them) is not needed
+        return ShardedWorksheet(shards=shards, header_values=[], shard_by=self.shard_by)
+
+    def __find_shard_worksheet(self, platform, language, shard_index):
+        # type: (str, str, int) -> pygsheets.Worksheet
+        spreadsheet_name = self.get_spreadsheet_name(language=language, shard_index=shard_index)
+        language_spreadsheet = self._spreadsheets.get(spreadsheet_name)
+        if language_spreadsheet is None:
+            matching_spreadsheets = self.find_spreadsheets(spreadsheet_name)
+            if len(matching_spreadsheets) == 0:
+                return None
+            language_spreadsheet = self.google_client.open_by_key(matching_spreadsheets[0]['id'])
+            language_spreadsheet.default_parse = False
+            self._spreadsheets[spreadsheet_name] = language_spreadsheet
+
+        try:
+            return language_spreadsheet.worksheet('title', self.get_worksheet_name(platform=platform,
+                                                                                   language=language))
+        except pygsheets.exceptions.WorksheetNotFound:
+            return None
+
     def get_worksheet(self, platform, language, header_values):
         # type: (str, str, List[str]) -> pygsheets.Worksheet
-        spreadsheet_name = self.get_spreadsheet_name(language=language)
-        worksheet_name = '{}_strings'.format(platform)
+        """
+        Opens (or creates) the worksheet for the platform and language. The worksheet is cached, so the spreadsheet
+        is opened and the header is checked only once per run.
+        """
+        if (platform, language) in self._worksheets:
+            return self._worksheets[(platform, language)]
 
-        try:
-            language_spreadsheet = self.google_client.open(spreadsheet_name)
-        except pygsheets.exceptions.SpreadsheetNotFound:
-            language_spreadsheet = self.create_spreadsheet(platform=platform,
-                                                           language=language,
-                                                           header_values=header_values)
-        language_spreadsheet.default_parse = False
+        platform_worksheet = self.__open_worksheet(platform=platform, language=language, header_values=header_values)
+        for shard in worksheet_shards(platform_worksheet):
+            self.update_worksheet_header(shard, header_values)
+        self._worksheets[(platform, language)] = platform_worksheet
+        return platform_worksheet
+
+    def __open_worksheet(self, platform, language, header_values):
+        # type: (str, str, List[str]) -> pygsheets.Worksheet
+        if self.shards == 1:
+            return self.__open_shard_worksheet(platform=platform, language=language, header_values=header_values,
+                                               shard_index=0)
+
+        shards = [self.__open_shard_worksheet(platform=platform, language=language, header_values=header_values,
+                                              shard_index=idx)
+                  for idx in range(self.shards)]
+        return ShardedWorksheet(shards=shards, header_values=header_values, shard_by=self.shard_by)
+
+    def __open_shard_worksheet(self, platform, language, header_values, shard_index):
+        # type: (str, str, List[str], int) -> pygsheets.Worksheet
+        spreadsheet_name = self.get_spreadsheet_name(language=language, shard_index=shard_index)
+        worksheet_name = self.get_worksheet_name(platform=platform, language=language)
+
+        language_spreadsheet = self._spreadsheets.get(spreadsheet_name)
+        if language_spreadsheet is None:
+            matching_spreadsheets = self.find_spreadsheets(spreadsheet_name)
+            if len(matching_spreadsheets) > 0:
+                language_spreadsheet = self.google_client.open_by_key(matching_spreadsheets[0]['id'])
+            elif self.dry_run:
+                logger.info(u'DRY RUN - SPREADSHEET {} WOULD BE CREATED AND SHARED WITH {}'.format(
+                    spreadsheet_name, self.user_email), color='y')
+                language_spreadsheet = PlannedSpreadsheet(title=spreadsheet_name)
+            else:
+                language_spreadsheet = self.create_spreadsheet(platform=platform,
+                                                               language=language,
+                                                               header_values=header_values,
+                                                               shard_index=shard_index)
+            language_spreadsheet.default_parse = False
+            self._spreadsheets[spreadsheet_name] = language_spreadsheet
 
         try:
             platform_worksheet = language_spreadsheet.worksheet('title', worksheet_name)  # type: pygsheets.Worksheet
         except pygsheets.exceptions.WorksheetNotFound:
-            platform_worksheet = language_spreadsheet.add_worksheet(title=worksheet_name, rows=1, cols=len(header_values))
+            if self.dry_run:
+                logger.info(u'DRY RUN - WORKSHEET {} WOULD BE ADDED TO {}'.format(worksheet_name, spreadsheet_name),
+                            color='y')
+                # the API only assigns positive sheet IDs, so the planned worksheets can not clash with the others
+                self._planned_worksheet_count += 1
+                platform_worksheet = PlannedWorksheet(spreadsheet=language_spreadsheet, title=worksheet_name,
+                                                      header_values=header_values,
+                                                      worksheet_id=-self._planned_worksheet_count)
+            else:
+                platform_worksheet = language_spreadsheet.add_worksheet(title=worksheet_name, rows=1,
+                                                                        cols=len(header_values))
 
-        self.update_worksheet_header(platform_worksheet, header_values)
         return platform_worksheet
 
     def update_worksheet_header(self, worksheet, header_values):
         # type: (pygsheets.Worksheet, List[str]) -> None
+        if isinstance(worksheet, PlannedWorksheet):
+            # the header is written when the worksheet is created
+            return
 
         current_header = worksheet.get_row(row=1)
-        if current_header != header_values:
+        if current_header != header_values and self.dry_run:
+            logger.info(u'DRY RUN - HEADER OF {} WOULD BE SET TO {}'.format(worksheet.title, header_values), color='y')
+        elif current_header != header_values:
             update_range = 'A1:{}1'.format(chr(ord('A') + (worksheet.cols - 1)))
             worksheet.update_values(crange=update_range, values=[header_values], parse=False)
 
         pass
+
+    def get_snapshot(self, worksheet, value_render=ValueRenderOption.FORMULA):
+        # type: (pygsheets.Worksheet, ValueRenderOption) -> WorksheetSnapshot
+        """
+        Reads all the values of a worksheet with a single request. The snapshot is cached and kept up to date by
+        apply_change_sets, so every plan of the run is computed without reading the worksheet again.
+        For a ShardedWorksheet, the shards are read in parallel and a ShardedSnapshot is returned.
+        """
+        self.__fetch_snapshots(worksheets=worksheet_shards(worksheet), value_render=value_render)
+        if not isinstance(worksheet, ShardedWorksheet):
+            return self._snapshots[snapshot_key(worksheet, value_render)]
+
+        sharded_key = snapshot_key(worksheet.shards[0], value_render)
+        if sharded_key not in self._sharded_snapshots:
+            shard_snapshots = [self._snapshots[snapshot_key(shard, value_render)] for shard in worksheet.shards]
+            self._sharded_snapshots[sharded_key] = ShardedSnapshot(worksheet=worksheet, shard_snapshots=shard_snapshots)
+        return self._sharded_snapshots[sharded_key]
+
+    def __fetch_snapshots(self, worksheets, value_render):
+        # type: (List[pygsheets.Worksheet], ValueRenderOption) -> None
+        """
+        Reads the worksheets that have no cached snapshot, with one values.batchGet request per spreadsheet
+        """
+        worksheets_by_spreadsheet = {}  # type: Dict[str, List[pygsheets.Worksheet]]
+        for worksheet in self.__register_planned_snapshots(worksheets, value_render):
+            if snapshot_key(worksheet, value_render) not in self._snapshots:
+                worksheets_by_spreadsheet.setdefault(worksheet.spreadsheet.id, []).append(worksheet)
+
+        def fetch_values(spreadsheet_id, spreadsheet_worksheets):
+            return self.google_client.sheet.values_batch_get(
+                spreadsheet_id=spreadsheet_id,
+                value_ranges=[worksheet_range(worksheet) for worksheet in spreadsheet_worksheets],
+                major_dimension='ROWS',
+                value_render_option=value_render)
+
+        value_ranges_by_spreadsheet = self.__map_spreadsheets(fetch_values, worksheets_by_spreadsheet)
+        for spreadsheet_id, value_ranges in value_ranges_by_spreadsheet.items():
+            for worksheet, value_range in zip(worksheets_by_spreadsheet[spreadsheet_id], value_ranges):
+                self._snapshots[snapshot_key(worksheet, value_render)] = WorksheetSnapshot(
+                    worksheet=worksheet, values=value_range.get('values', []))
+
+    def __register_planned_snapshots(self, worksheets, value_render):
+        # type: (List[pygsheets.Worksheet], ValueRenderOption) -> List[pygsheets.Worksheet]
+        """
+        Caches an empty snapshot (only the header) for the worksheets that a dry run would create
+        :return: the other worksheets, that exist and are read from the API
+        """
+        existing_worksheets = []  # type: List[pygsheets.Worksheet]
+        for worksheet in worksheets:
+            if isinstance(worksheet, PlannedWorksheet):
+                self._snapshots[snapshot_key(worksheet, value_render)] = WorksheetSnapshot(
+                    worksheet=worksheet, values=[list(worksheet.header_values)])
+            else:
+                existing_worksheets.append(worksheet)
+        return existing_worksheets
+
+    def __map_spreadsheets(self, function, items_by_spreadsheet):
+        # type: (Callable[[str, Any], Any], Dict[str, Any]) -> Dict[str, Any]
+        """
+        Calls function(spreadsheet_id, items) for every spreadsheet. The calls for different spreadsheets (ex. the
+        shards of a worksheet) run at the same time, up to `uploads_in_flight` of them.
+        :return: the result of every call, by spreadsheet id
+        """
+        if len(items_by_spreadsheet) <= 1:
+            return {sh_id: function(sh_id, items) for sh_id, items in items_by_spreadsheet.items()}
+
+        with ThreadPoolExecutor(max_workers=min(self.uploads_in_flight, len(items_by_spreadsheet))) as executor:
+            pending_calls = {sh_id: executor.submit(function, sh_id, items)
+                             for sh_id, items in items_by_spreadsheet.items()}
+            return {sh_id: pending_call.result() for sh_id, pending_call in pending_calls.items()}
+
+    def prefetch_snapshots(self, platform, header_values_by_language, value_render=ValueRenderOption.FORMULA):
+        # type: (str, Dict[str, List[str]], ValueRenderOption) -> None
+        """
+        Opens the worksheets of all the provided languages and reads them with a single values.batchGet request per
+        spreadsheet (a single request for the whole project with SpreadsheetLayout.PER_PROJECT, the spreadsheets of
+        the shards are read in parallel). The header checks are done on the fetched values, and any header fixes are
+        sent in one batchUpdate per spreadsheet.
+        :param str platform: the platform name ('ios', 'android')
+        :param header_values_by_language: the expected header of every language worksheet
+        :param ValueRenderOption value_render: the render option of the cached snapshots
+        """
+        worksheets_by_spreadsheet = {}  # type: Dict[str, List[Tuple[str, pygsheets.Worksheet]]]
+        for language, header_values in header_values_by_language.items():
+            if (platform, language) in self._worksheets:
+                worksheet = self._worksheets[(platform, language)]
+            else:
+                worksheet = self.__open_worksheet(platform=platform, language=language, header_values=header_values)
+            self._worksheets[(platform, language)] = worksheet
+            self.__drop_sharded_snapshots(worksheet)
+            for shard in self.__register_planned_snapshots(worksheet_shards(worksheet), value_render):
+                worksheets_by_spreadsheet.setdefault(shard.spreadsheet.id, []).append((language, shard))
+
+        def fetch_values(spreadsheet_id, language_worksheets):
+            return self.google_client.sheet.values_batch_get(
+                spreadsheet_id=spreadsheet_id,
+                value_ranges=[worksheet_range(worksheet) for _, worksheet in language_worksheets],
+                major_dimension='ROWS',
+                value_render_option=value_render)
+
+        value_ranges_by_spreadsheet = self.__map_spreadsheets(fetch_values, worksheets_by_spreadsheet)
+
+        header_requests_by_spreadsheet = {}  # type: Dict[str, List[dict]]
+        for spreadsheet_id, language_worksheets in worksheets_by_spreadsheet.items():
+            header_requests = []
+            for (language, worksheet), value_range in zip(language_worksheets,
+                                                          value_ranges_by_spreadsheet[spreadsheet_id]):
+                values = value_range.get('values', [])
+                header_values = header_values_by_language[language]
+
+                if (len(values) == 0 or list(values[0]) != header_values) and not self.dry_run:
+                    header_requests.append({
+                        'updateCells': {
+                            'rows': [row_data(header_values)],
+                            'fields': 'userEnteredValue',
+                            'start': {'sheetId': worksheet.id, 'rowIndex': 0, 'columnIndex': 0}
+                        }
+                    })
+                values = [header_values] + list(values[1:])
+                self._snapshots[snapshot_key(worksheet, value_render)] = WorksheetSnapshot(worksheet=worksheet,
+                                                                                           values=values)
+
+            if len(header_requests) > 0:
+                header_requests_by_spreadsheet[spreadsheet_id] = header_requests
+
+        self.__map_spreadsheets(lambda sh_id, requests: self.google_client.sheet.batch_update(spreadsheet_id=sh_id,
+                                                                                              requests=requests),
+                                header_requests_by_spreadsheet)
+
+    def __drop_sharded_snapshots(self, worksheet):
+        # type: (pygsheets.Worksheet) -> None
+        if not isinstance(worksheet, ShardedWorksheet):
+            return
+        first_shard = worksheet.shards[0]
+        for sharded_key in list(self._sharded_snapshots.keys()):
+            if sharded_key[:2] == (first_shard.spreadsheet.id, first_shard.id):
+                del self._sharded_snapshots[sharded_key]
+
+    def fetch_columns(self, worksheet, header_values, column_names, value_render=ValueRenderOption.FORMULA):
+        # type: (pygsheets.Worksheet, List[str], List[str], ValueRenderOption) -> List[List[Any]]
+        """
+        Reads only the requested columns of a worksheet, as raw value arrays (no dicts, no header row). If the full
+        snapshot of the worksheet is already cached, the columns are projected from it without any request.
+        :param worksheet: a worksheet returned by get_worksheet (so its header matches header_values)
+        :param header_values: the header of the worksheet, used to map the column names to column indexes
+        :param column_names: the header values of the columns to read
+        :param value_render: the render option of the values
+        :return: one list per worksheet row, with the values in the same order as column_names (for a
+        ShardedWorksheet, the rows of all the shards, in shard order)
+        """
+        shards = worksheet_shards(worksheet)
+        self.__fetch_all_projections(projections=[(shard, header_values, column_names) for shard in shards],
+                                     value_render=value_render)
+
+        ws_rows = []  # type: List[List[Any]]
+        for shard in shards:
+            snapshot = self._snapshots.get(snapshot_key(shard, value_render))
+            if snapshot is not None:
+                column_indexes = [snapshot.column_index(name) for name in column_names]
+                ws_rows += [[row[idx] for idx in column_indexes] for row in snapshot.rows]
+            else:
+                ws_rows += self._projections[projection_key(shard, value_render, column_names)]
+        return ws_rows
+
+    def get_row_index(self, worksheet, header_values, key_header, value_render=ValueRenderOption.FORMULA):
+        # type: (pygsheets.Worksheet, List[str], str, ValueRenderOption) -> RowIndex
+        """
+        Finds the row number of every key of a worksheet without reading the whole worksheet. The index is taken from
+        the cached snapshot or column projection that has the key column, else from the row index cache if the
+        spreadsheet has not been modified since, else the key column is read. It is kept up to date by
+        apply_change_sets. For a ShardedWorksheet, the index is built from the (sharded) snapshot.
+        :param worksheet: a worksheet returned by get_worksheet (so its header matches header_values)
+        :param header_values: the header of the worksheet
+        :param key_header: the header value of the key column (ex. IosHeaderValues.KEY)
+        :param value_render: the render option used to read the keys
+        """
+        key_column = header_values.index(key_header) + 1
+        if isinstance(worksheet, ShardedWorksheet):
+            snapshot = self.get_snapshot(worksheet, value_render=value_render)
+            return RowIndex(worksheet=worksheet, keys=snapshot.column(key_header), key_column=key_column,
+                            snapshot=snapshot)
+
+        index_key = projection_key(worksheet, value_render, [key_header])
+        if index_key in self._row_indexes:
+            return self._row_indexes[index_key]
+
+        self.__register_planned_snapshots([worksheet], value_render)
+        keys = self.__cached_column(worksheet, key_header, value_render)
+        if keys is None:
+            modified_time = None
+            if self.row_index_cache is not None:
+                modified_time = self.google_client.drive.get_update_time(worksheet.spreadsheet.id)
+                keys = self.row_index_cache.load(worksheet, key_header, modified_time)
+            if keys is None:
+                # the modification time was read first, a change made during the read only invalidates the entry
+                keys = [row[0] for row in self.fetch_columns(worksheet, header_values=header_values,
+                                                             column_names=[key_header], value_render=value_render)]
+                if self.row_index_cache is not None:
+                    self.row_index_cache.save(worksheet, key_header, modified_time, keys)
+
+        self._row_indexes[index_key] = RowIndex(worksheet=worksheet, keys=keys, key_column=key_column)
+        return self._row_indexes[index_key]
+
+    def __cached_column(self, worksheet, column_name, value_render):
+        # type: (pygsheets.Worksheet, str, ValueRenderOption) -> List[Any]
+        """
+        :return: the values of a column, from the cached snapshot or from a cached projection that has the column
+        (None if neither is cached)
+        """
+        snapshot = self._snapshots.get(snapshot_key(worksheet, value_render))
+        if snapshot is not None and column_name in snapshot.header:
+            return snapshot.column(column_name)
+
+        for cached_key, projection in self._projections.items():
+            if cached_key[:3] == snapshot_key(worksheet, value_render) and column_name in cached_key[3]:
+                column_idx = cached_key[3].index(column_name)
+                return [row[column_idx] for row in projection]
+        return None
+
+    def prefetch_columns(self, platform, header_values_by_language, column_names_by_language,
+                         value_render=ValueRenderOption.FORMULA):
+        # type: (str, Dict[str, List[str]], Dict[str, List[str]], ValueRenderOption) -> None
+        """
+        Reads the requested columns of all the provided languages, with a single values.batchGet request per
+        spreadsheet. Use this instead of prefetch_snapshots for the read-only (import) operations.
+        """
+        projections = []  # type: List[Tuple[pygsheets.Worksheet, List[str], List[str]]]
+        for language, header_values in header_values_by_language.items():
+            worksheet = self.get_worksheet(platform=platform, language=language, header_values=header_values)
+            projections += [(shard, header_values, column_names_by_language[language])
+                            for shard in worksheet_shards(worksheet)]
+
+        self.__fetch_all_projections(projections=projections, value_render=value_render)
+
+    def __fetch_all_projections(self, projections, value_render):
+        # type: (List[Tuple[pygsheets.Worksheet, List[str], List[str]]], ValueRenderOption) -> None
+        """
+        Reads the projections that are not cached (and have no cached snapshot), with one values.batchGet request
+        per spreadsheet
+        """
+        projections_by_spreadsheet = {}  # type: Dict[str, List[Tuple[pygsheets.Worksheet, List[str], List[str]]]]
+        self.__register_planned_snapshots([worksheet for worksheet, _, _ in projections], value_render)
+        for worksheet, header_values, column_names in projections:
+            if snapshot_key(worksheet, value_render) in self._snapshots or \
+                    projection_key(worksheet, value_render, column_names) in self._projections:
+                continue
+            projections_by_spreadsheet.setdefault(worksheet.spreadsheet.id, []).append(
+                (worksheet, header_values, column_names))
+
+        fetched_projections = self.__map_spreadsheets(
+            lambda sh_id, sh_projections: self.__fetch_projections(sh_id, sh_projections, value_render),
+            projections_by_spreadsheet)
+        for spreadsheet_projections in fetched_projections.values():
+            self._projections.update(spreadsheet_projections)
+        for worksheet, header_values, column_names in projections:
+            self._projection_columns[projection_key(worksheet, value_render, column_names)] = \
+                [header_values.index(column_name) for column_name in column_names]
+
+    def __fetch_projections(self, spreadsheet_id, projections, value_render):
+        # type: (str, List[Tuple[pygsheets.Worksheet, List[str], List[str]]], ValueRenderOption) -> Dict[Tuple, List[List[Any]]]
+        value_ranges = []
+        for worksheet, header_values, column_names in projections:
+            for column_name in column_names:
+                letter = column_letter(header_values.index(column_name))
+                value_ranges.append(u'{}!{}2:{}'.format(worksheet_range(worksheet), letter, letter))
+
+        response_ranges = self.google_client.sheet.values_batch_get(spreadsheet_id=spreadsheet_id,
+                                                                    value_ranges=value_ranges,
+                                                                    major_dimension='COLUMNS',
+                                                                    value_render_option=value_render)
+
+        fetched_projections = {}  # type: Dict[Tuple, List[List[Any]]]
+        range_idx = 0
+        for worksheet, _, column_names in projections:
+            columns = []
+            for _ in column_names:
+                column_values = response_ranges[range_idx].get('values', [])
+                columns.append(list(column_values[0]) if len(column_values) > 0 else [])
+                range_idx += 1
+
+            # the API trims the trailing empty cells of every column
+            row_count = max(len(c) for c in columns) if len(columns) > 0 else 0
+            columns = [c + [''] * (row_count - len(c)) for c in columns]
+
+            fetched_projections[projection_key(worksheet, value_render, column_names)] = \
+                [list(row) for row in zip(*columns)]
+        return fetched_projections
+
+    @contextmanager
+    def batched_writes(self):
+        """
+        Inside this context, the change sets are planned and mirrored in the cached snapshots as usual, but their
+        requests are queued and sent when the context exits, with one batchUpdate per spreadsheet. If the context
+        exits with an exception, the requests queued before it are sent too.
+        """
+        if self._queued_requests is not None:
+            yield
+            return
+
+        self._queued_requests = {}
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            queued_requests = self._queued_requests
+            self._queued_requests = None
+            if failed:
+                # the change sets planned before the failure are complete, so they are still sent (a resumed run
+                # can skip them)
+                try:
+                    self.__flush_queued_requests(queued_requests)
+                except Exception as send_exception:
+                    logger.warning(u'COULD NOT SEND THE QUEUED CHANGES: {}'.format(send_exception))
+
+        self.__flush_queued_requests(queued_requests)
+
+    def when_sent(self, callback):
+        # type: (Callable[[], None]) -> None
+        """
+        Calls `callback` once the requests of the change sets applied since the previous call are sent to all the
+        spreadsheets they change (right away, unless the requests are queued by batched_writes).
+        Used to record the completed steps of a run.
+        """
+        spreadsheet_ids = self._touched_spreadsheet_ids
+        self._touched_spreadsheet_ids = set()
+        if self._queued_requests is None or len(spreadsheet_ids) == 0:
+            callback()
+        else:
+            self._sent_callbacks.append((spreadsheet_ids, callback))
+
+    def invalidate_snapshots(self):
+        # type: () -> None
+        """
+        Drops the cached snapshots and column projections, so the next reads see the changes made by other users
+        """
+        self._snapshots = {}
+        self._sharded_snapshots = {}
+        self._projections = {}
+        self._projection_columns = {}
+        self._row_indexes = {}
+
+    def release_language(self, language):
+        # type: (str) -> None
+        """
+        Drops the cached snapshots and column projections of the worksheets of a language (all the platforms), once
+        the language is processed. The worksheets stay open.
+        """
+        released_worksheets = set()
+        for (_, worksheet_language), worksheet in self._worksheets.items():
+            if worksheet_language == language:
+                released_worksheets.update((shard.spreadsheet.id, shard.id) for shard in worksheet_shards(worksheet))
+
+        for cache in (self._snapshots, self._sharded_snapshots, self._projections, self._projection_columns,
+                      self._row_indexes):
+            for cached_key in [k for k in cache.keys() if k[:2] in released_worksheets]:
+                del cache[cached_key]
+
+    def apply_change_set(self, change_set):
+        # type: (ChangeSet) -> None
+        self.apply_change_sets([change_set])
+
+    def apply_change_sets(self, change_sets):
+        # type: (List[ChangeSet]) -> None
+        """
+        Runs the provided change sets with one spreadsheets.batchUpdate call per spreadsheet, then writes the local
+        files. When more than `upload_chunk_size` rows go after the last row of a worksheet (ex. the first export of
+        a large project), they are uploaded in chunks. The change sets of sharded worksheets are split into one
+        change set per shard. In dry run mode, the change sets are only printed.
+        """
+        change_sets = [c for c in change_sets if c is not None and not c.is_empty()]
+
+        if self.dry_run:
+            logger.info('DRY RUN - NOTHING WILL BE CHANGED', color='y')
+            for change_set in change_sets:
+                change_set.print_summary()
+            return
+
+        remote_change_sets = []  # type: List[ChangeSet]
+        for change_set in change_sets:
+            if not change_set.has_remote_changes():
+                continue
+            if isinstance(change_set.worksheet, ShardedWorksheet):
+                remote_change_sets += split_change_set(change_set)
+            else:
+                remote_change_sets.append(change_set)
+
+        requests_by_spreadsheet = {}  # type: Dict[str, List[dict]]
+        chunked_uploads = []  # type: List[Tuple[ChangeSet, int, List[List[Any]]]]
+        for change_set in remote_change_sets:
+            spreadsheet_id = change_set.worksheet.spreadsheet.id
+            row_placement = change_set.row_placement()
+            appended_rows = row_placement[1]
+            upload_in_chunks = len(appended_rows) > self.upload_chunk_size
+            if upload_in_chunks:
+                chunked_uploads.append((change_set, change_set.appended_rows_start(row_placement), appended_rows))
+            requests_by_spreadsheet.setdefault(spreadsheet_id, []).extend(
+                change_set.to_batch_requests(append_rows=not upload_in_chunks))
+
+        if self._queued_requests is not None:
+            for spreadsheet_id, requests in requests_by_spreadsheet.items():
+                self._queued_requests.setdefault(spreadsheet_id, []).extend(requests)
+            self._touched_spreadsheet_ids.update(requests_by_spreadsheet.keys())
+            # the chunks are written right away, so the requests that extend the grid must be sent before them
+            uploading_spreadsheet_ids = set(c.worksheet.spreadsheet.id for c, _, _ in chunked_uploads)
+            self.__send_batch_requests({sh_id: self._queued_requests.pop(sh_id)
+                                        for sh_id in uploading_spreadsheet_ids if sh_id in self._queued_requests})
+        else:
+            self.__send_batch_requests(requests_by_spreadsheet)
+
+        for change_set, start_row_index, appended_rows in chunked_uploads:
+            self.__upload_rows_in_chunks(change_set, start_row_index, appended_rows)
+
+        for change_set in remote_change_sets:
+            self.__mirror_change_set(change_set)
+        self.__refresh_sharded_snapshots(remote_change_sets)
+
+        for change_set in change_sets:
+            for file_write in change_set.file_writes:
+                file_write.writer()
+
+    def apply_highlighting(self):
+        # type: () -> None
+        """
+        Sends the highlighting rules gathered for all the worksheets touched in this run (one batchUpdate per
+        spreadsheet). Must be called after the change sets were applied.
+        """
+        self.highlighting.apply(dry_run=self.dry_run)
+
+    def __send_batch_requests(self, requests_by_spreadsheet):
+        # type: (Dict[str, List[dict]]) -> None
+        """
+        Sends the requests of every spreadsheet, up to `uploads_in_flight` spreadsheets at once (ex. the shards of a
+        worksheet). A failed spreadsheet does not cancel the others, the first failure is raised once all are done.
+        """
+        spreadsheet_requests = [(sh_id, requests) for sh_id, requests in requests_by_spreadsheet.items()]
+        if len(spreadsheet_requests) <= 1:
+            for spreadsheet_id, requests in spreadsheet_requests:
+                self.__send_spreadsheet_requests(spreadsheet_id, requests)
+                self.__mark_sent(spreadsheet_id)
+            return
+
+        send_exceptions = []
+        with ThreadPoolExecutor(max_workers=min(self.uploads_in_flight, len(spreadsheet_requests))) as executor:
+            pending_sends = {executor.submit(self.__send_spreadsheet_requests, sh_id, requests): sh_id
+                             for sh_id, requests in spreadsheet_requests}
+            for finished_send in as_completed(pending_sends):
+                try:
+                    finished_send.result()
+                except Exception as send_exception:
+                    send_exceptions.append(send_exception)
+                    continue
+                # the callbacks run on this thread only
+                self.__mark_sent(pending_sends[finished_send])
+
+        if len(send_exceptions) > 0:
+            raise send_exceptions[0]
+
+    def __send_spreadsheet_requests(self, spreadsheet_id, requests):
+        # type: (str, List[dict]) -> None
+        if len(requests) > 0:
+            self.google_client.sheet.batch_update(spreadsheet_id=spreadsheet_id, requests=requests)
+
+    def __flush_queued_requests(self, queued_requests):
+        # type: (Dict[str, List[dict]]) -> None
+        # the spreadsheets without queued requests have nothing left to send
+        for spreadsheet_ids, _ in list(self._sent_callbacks):
+            for spreadsheet_id in list(spreadsheet_ids):
+                if spreadsheet_id not in queued_requests:
+                    self.__mark_sent(spreadsheet_id)
+        self._touched_spreadsheet_ids = set()
+        try:
+            self.__send_batch_requests(queued_requests)
+        finally:
+            # the steps waiting for a spreadsheet that could not be updated are not reported as sent
+            self._sent_callbacks = []
+
+    def __mark_sent(self, spreadsheet_id):
+        # type: (str) -> None
+        pending_callbacks = []
+        for spreadsheet_ids, callback in self._sent_callbacks:
+            spreadsheet_ids.discard(spreadsheet_id)
+            if len(spreadsheet_ids) == 0:
+                callback()
+            else:
+                pending_callbacks.append((spreadsheet_ids, callback))
+        self._sent_callbacks = pending_callbacks
+
+    def __upload_rows_in_chunks(self, change_set, start_row_index, rows):
+        # type: (ChangeSet, int, List[List[Any]]) -> None
+        """
+        Writes the rows starting at `start_row_index` (the grid must already fit them), `upload_chunk_size` rows per
+        request, with up to `uploads_in_flight` requests sent at once. A failed chunk does not cancel the others.
+        """
+        worksheet = change_set.worksheet
+        chunks = [(start_row_index + idx, rows[idx:idx + self.upload_chunk_size])
+                  for idx in range(0, len(rows), self.upload_chunk_size)]
+
+        logger.info(u'UPLOADING {} ROWS TO {} IN {} CHUNKS'.format(len(rows), change_set.title, len(chunks)), color='y')
+        start_time = time.time()
+        uploaded_rows_count = 0
+
+        with ThreadPoolExecutor(max_workers=self.uploads_in_flight) as executor:
+            pending_uploads = [executor.submit(self.__upload_chunk, worksheet, row_index, chunk_rows)
+                               for row_index, chunk_rows in chunks]
+            for finished_upload in as_completed(pending_uploads):
+                uploaded_rows_count += finished_upload.result()
+                rows_per_second = uploaded_rows_count / max(time.time() - start_time, 0.001)
+                logger.info(u'UPLOADED {}/{} ROWS TO {} ({:.0f} ROWS/S)'.format(uploaded_rows_count, len(rows),
+                                                                                change_set.title, rows_per_second),
+                            color='g', event='rows_uploaded', worksheet=change_set.title, count=uploaded_rows_count,
+                            rows_per_second=rows_per_second)
+
+    def __upload_chunk(self, worksheet, row_index, rows):
+        # type: (pygsheets.Worksheet, int, List[List[Any]]) -> int
+        update_cells_request = {
+            'updateCells': {
+                'rows': [row_data(row) for row in rows],
+                'fields': 'userEnteredValue',
+                'start': {'sheetId': worksheet.id, 'rowIndex': row_index, 'columnIndex': 0}
+            }
+        }
+        self.google_client.sheet.batch_update(spreadsheet_id=worksheet.spreadsheet.id,
+                                              requests=[update_cells_request])
+        return len(rows)
+
+    def __mirror_change_set(self, change_set):
+        # type: (ChangeSet) -> None
+        worksheet = change_set.worksheet
+        row_placement = change_set.row_placement()
+        for cached_key, projection in self._projections.items():
+            if cached_key[0] == worksheet.spreadsheet.id and cached_key[1] == worksheet.id:
+                mirror_projection(projection, self._projection_columns[cached_key], change_set, row_placement)
+        for cached_key, snapshot in self._snapshots.items():
+            if cached_key[0] == worksheet.spreadsheet.id and cached_key[1] == worksheet.id:
+                snapshot.mirror(change_set, row_placement)
+        for cached_key, row_index in self._row_indexes.items():
+            if cached_key[0] == worksheet.spreadsheet.id and cached_key[1] == worksheet.id:
+                row_index.mirror(change_set, row_placement)
+
+    def __refresh_sharded_snapshots(self, change_sets):
+        # type: (List[ChangeSet]) -> None
+        changed_worksheets = set((c.worksheet.spreadsheet.id, c.worksheet.id) for c in change_sets)
+        for sharded_snapshot in self._sharded_snapshots.values():
+            if any((s.worksheet.spreadsheet.id, s.worksheet.id) in changed_worksheets
+                   for s in sharded_snapshot.shard_snapshots):
+                sharded_snapshot.refresh()
+
+
+class PlannedSpreadsheet(object):
+    """
+    A spreadsheet that does not exist and would be created by the run. In dry run mode, it is used instead of
+    creating the spreadsheet, so the plan can be printed without changing the Google account.
+    """
+
+    def __init__(self, title):
+        # type: (str) -> PlannedSpreadsheet
+        self.id = u'dry-run:{}'.format(title)  # type: str
+        self.title = title  # type: str
+        self.default_parse = False
+
+    def worksheet(self, property='title', value=None):
+        # type: (str, Any) -> None
+        # its worksheets are opened (planned) once per run by get_worksheet, so none of them is found again
+        raise pygsheets.exceptions.WorksheetNotFound()
+
+
+class PlannedWorksheet(object):
+    """
+    A worksheet that does not exist and would be created by the run (dry run mode). It is read as an empty
+    worksheet (only the header), so the plan lists all its rows as new rows.
+    """
+
+    def __init__(self, spreadsheet, title, header_values, worksheet_id):
+        # type: (Any, str, List[str], int) -> PlannedWorksheet
+        """
+        :param spreadsheet: the existing spreadsheet the worksheet would be added to, or a PlannedSpreadsheet
+        :param int worksheet_id: a negative sheet ID, unique in the run
+        """
+        self.spreadsheet = spreadsheet
+        self.title = title  # type: str
+        self.header_values = list(header_values)  # type: List[str]
+        self.id = worksheet_id  # type: int
+        self.rows = 1  # type: int
+        self.cols = len(header_values)  # type: int
+
+
+def snapshot_key(worksheet, value_render):
+    # type: (pygsheets.Worksheet, ValueRenderOption) -> Tuple[str, int, str]
+    return worksheet.spreadsheet.id, worksheet.id, value_render.name
+
+
+def projection_key(worksheet, value_render, column_names):
+    # type: (pygsheets.Worksheet, ValueRenderOption, List[str]) -> Tuple[str, int, str, Tuple[str, ...]]
+    return worksheet.spreadsheet.id, worksheet.id, value_render.name, tuple(column_names)
+
+
+def mirror_projection(rows, column_indexes, change_set, row_placement):
+    # type: (List[List[Any]], List[int], ChangeSet, Tuple[List[Tuple[int, List[List[Any]]]], List[List[Any]]]) -> None
+    """
+    Applies an executed change set on the rows of a column projection, like WorksheetSnapshot.mirror
+    :param column_indexes: the 0 based worksheet column of every column of the projection
+    """
+    def project(row):
+        return [row[idx] if idx < len(row) else '' for idx in column_indexes]
+
+    for cell_update in change_set.cell_updates:
+        if cell_update.col - 1 not in column_indexes:
+            continue
+        # the API trims the trailing rows that are empty in all the projected columns
+        while len(rows) < cell_update.row - 1:
+            rows.append([''] * len(column_indexes))
+        rows[cell_update.row - 2][column_indexes.index(cell_update.col - 1)] = cell_update.value
+
+    for row_number in sorted(set(change_set.deletions), reverse=True):
+        if row_number - 2 < len(rows):
+            del rows[row_number - 2]
+
+    inserted_groups, appended_rows = row_placement
+    for row_index, inserted_rows in inserted_groups:
+        rows[row_index:row_index] = [project(row) for row in inserted_rows]
+
+    rows += [project(row) for row in appended_rows]
+
+
+def worksheet_range(worksheet):
+    # type: (pygsheets.Worksheet) -> str
+    """
+    :return: an A1 range that covers the whole worksheet (only the sheet title, quoted)
+    """
+    return u"'{}'".format(worksheet.title.replace("'", "''"))
+
+
+def column_letter(column_index):
+    # type: (int) -> str
+    """
+    :param int column_index: 0 based column index
+    :return: the A1 notation letters of the column (0 -> A, 25 -> Z, 26 -> AA)
+    """
+    letters = ''
+    column_index += 1
+    while column_index > 0:
+        column_index, remainder = divmod(column_index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
@@ -0,0 +1,89 @@
+import errno
+import socket
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Tuple, Any
+
+try:
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    from urlparse import urlsplit, urlunsplit
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 120
+
+# the body is already decoded by requests, so these headers no longer describe it
+_DROPPED_RESPONSE_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+class PooledHttp(object):
+    """
+    An httplib2.Http compatible transport (the interface used by google-api-python-client and google-auth-httplib2)
+    backed by a single requests.Session. The session keeps a pool of keep-alive connections, so all the Sheets and
+    Drive calls of a run reuse the same TLS connections, and asks for gzip compressed responses.
+    Unlike httplib2.Http, it can be shared by several threads.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, endpoint=None):
+        # type: (int, float, str) -> PooledHttp
+        """
+        :param int pool_size: maximum number of connections kept open per host
+        :param float timeout: connect and read timeout of every request, in seconds
+        :param str endpoint: if set (ex. http://localhost:8080), every request is sent to this scheme and host
+                             instead of the Google hosts (used to run against a local HTTP stand-in)
+        """
+        self.timeout = timeout
+        self.endpoint = endpoint  # type: str
+        self.follow_redirects = True
+        self.connections = {}  # type: Dict[str, Any]
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+
+    def __rewrite_uri(self, uri):
+        # type: (str) -> str
+        if self.endpoint is None:
+            return uri
+        endpoint = urlsplit(self.endpoint)
+        parts = urlsplit(uri)
+        return urlunsplit((endpoint.scheme, endpoint.netloc, parts.path, parts.query, parts.fragment))
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None, **kwargs):
+        # type: (str, str, Any, Dict[str, str], int, Any, Any) -> Tuple[httplib2.Response, bytes]
+        """
+        Same signature and return value as httplib2.Http.request
+        """
+        if isinstance(body, type(u'')):
+            body = body.encode('utf-8')
+
+        try:
+            response = self.session.request(method, self.__rewrite_uri(uri), data=body, headers=headers,
+                                            timeout=self.timeout,
+                                            allow_redirects=self.follow_redirects and redirections > 0)
+        except requests.exceptions.Timeout as request_exception:
+            # the API client retries on timeouts, same as with the default transport
+            raise socket.timeout(str(request_exception))
+        except requests.exceptions.ConnectionError as request_exception:
+            # the API client retries only the socket errors with a known errno (a ConnectionResetError on Python 3)
+            raise socket.error(errno.ECONNRESET, str(request_exception))
+
+        info = {k.lower(): v for k, v in response.headers.items() if k.lower() not in _DROPPED_RESPONSE_HEADERS}
+        info['status'] = str(response.status_code)
+        info['content-location'] = uri
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+    def add_certificate(self, key, cert, domain, password=None):
+        # type: (str, str, str, str) -> None
+        self.session.cert = (cert, key)
+
+    def close(self):
+        # type: () -> None
+        self.session.close()
@@ -0,0 +1,126 @@
+import io
+import os
+import json
+import hashlib
+
+from typing import Any, Dict, List, Tuple
+
+from cloud_managers.change_set import ChangeSet, WorksheetSnapshot
+
+DEFAULT_ROW_INDEX_DIR = os.path.join(os.path.expanduser('~'), '.gslocalization', 'row_index')
+
+
+class RowIndex(object):
+    """
+    The row number of every key of a worksheet (ex. the iOS string keys), so the cells of known keys can be updated
+    without reading the whole worksheet. It is built from the key column only, and it is kept up to date by the
+    GoogleSheetsManager when the change sets are applied (the same way as the cached snapshots).
+    """
+
+    def __init__(self, worksheet, keys, key_column, snapshot=None):
+        # type: (Any, List[Any], int, WorksheetSnapshot) -> RowIndex
+        """
+        :param worksheet: the indexed worksheet
+        :param keys: the values of the key column, from the first data row (row 2) to the last one
+        :param int key_column: the 1 based index of the key column
+        :param WorksheetSnapshot snapshot: the snapshot the index was built from, if any (the change sets of a
+                                           ShardedWorksheet need it to find the shard of every row)
+        """
+        self.worksheet = worksheet
+        self.keys = list(keys)  # type: List[Any]
+        self.key_column = key_column  # type: int
+        self.snapshot = snapshot  # type: WorksheetSnapshot
+        self._row_numbers = None  # type: Dict[Any, int]
+
+    def row_number(self, key):
+        # type: (Any) -> int
+        """
+        :return: the 1 based row number of the key, or None if the key is not in the worksheet
+        """
+        if self._row_numbers is None:
+            self._row_numbers = {key: idx + 2 for idx, key in enumerate(self.keys)}
+        return self._row_numbers.get(key)
+
+    def row_numbers_by_key(self, key_header=None):
+        # type: (str) -> Dict[Any, int]
+        """
+        Same as WorksheetSnapshot.row_numbers_by_key, so the index can be used instead of a snapshot to find the rows
+        of the changed sources (see ConditionalFormattingPass.add_changed_sources)
+        """
+        self.row_number(None)
+        return self._row_numbers
+
+    def mirror(self, change_set, row_placement):
+        # type: (ChangeSet, Tuple[List[Tuple[int, List[List[Any]]]], List[List[Any]]]) -> None
+        """
+        Applies an executed change set on the keys, like WorksheetSnapshot.mirror
+        """
+        for cell_update in change_set.cell_updates:
+            if cell_update.col == self.key_column:
+                self.keys[cell_update.row - 2] = cell_update.value
+
+        for row_number in sorted(set(change_set.deletions), reverse=True):
+            del self.keys[row_number - 2]
+
+        key_idx = self.key_column - 1
+        inserted_groups, appended_rows = row_placement
+        for row_index, rows in inserted_groups:
+            self.keys[row_index:row_index] = [row[key_idx] if key_idx < len(row) else '' for row in rows]
+
+        self.keys += [row[key_idx] if key_idx < len(row) else '' for row in appended_rows]
+        self._row_numbers = None
+
+
+class RowIndexCache(object):
+    """
+    On-disk copy of the row indexes (one JSON file per worksheet and key column), so the next runs do not read the
+    key column again. An entry is valid only while the modification time of the spreadsheet is unchanged: any edit
+    (including the sorts, inserts and deletes made by other users) invalidates it.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_ROW_INDEX_DIR):
+        # type: (str) -> RowIndexCache
+        self.cache_dir = cache_dir  # type: str
+
+    def entry_path(self, worksheet, key_header):
+        # type: (Any, str) -> str
+        entry_hash = hashlib.sha1(u'{}|{}|{}'.format(worksheet.spreadsheet.id, worksheet.id,
+                                                     key_header).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, '{}.json'.format(entry_hash))
+
+    def load(self, worksheet, key_header, modified_time):
+        # type: (Any, str, str) -> List[Any]
+        """
+        :return: the cached keys of the worksheet, or None if the spreadsheet was modified since they were cached
+        """
+        try:
+            with io.open(self.entry_path(worksheet, key_header), 'r', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry.get('modified_time') != modified_time:
+            return None
+        return entry.get('keys')
+
+    def save(self, worksheet, key_header, modified_time, keys):
+        # type: (Any, str, str, List[Any]) -> None
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+        entry_path = self.entry_path(worksheet, key_header)
+        temp_path = u'{}.{}.tmp'.format(entry_path, os.getpid())
+        with io.open(temp_path, 'w', encoding='utf-8') as entry_file:
+            entry_file.write(u'{}'.format(json.dumps({'modified_time': modified_time, 'keys': keys},
+                                                     ensure_ascii=False)))
+
+        try:
+            os.replace(temp_path, entry_path)
+        except AttributeError:
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+            os.rename(temp_path, entry_path)
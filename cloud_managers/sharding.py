@@ -0,0 +1,147 @@
+import zlib
+from bisect import bisect_right
+
+from typing import List, Any, Tuple
+
+from cloud_managers.change_set import ChangeSet, WorksheetSnapshot
+from utils.gs_header_types import IosHeaderValues, AndroidHeaderValues
+
+
+class ShardBy(object):
+    # the hash of the string ID (Android) / string key (iOS) of every row
+    KEY = 'key'
+    # the hash of the XLIFF file path (iOS) or of the Gradle module (Android), so the strings of a file stay together
+    PATH = 'path'
+
+
+# the header values of the columns that identify the rows, by priority (the first column is used if none is found)
+KEY_HEADERS = (IosHeaderValues.KEY, AndroidHeaderValues.STRING_ID)
+
+
+def shard_index(value, shard_count):
+    # type: (Any, int) -> int
+    """
+    :return: the shard of a value (stable between runs and machines, unlike hash())
+    """
+    return (zlib.crc32(u'{}'.format(value).encode('utf-8')) & 0xffffffff) % shard_count
+
+
+class ShardedWorksheet(object):
+    """
+    A worksheet split into several worksheets (the shards), each one in its own spreadsheet, so a project is not
+    limited by the size of a single spreadsheet. The models use it (and its ShardedSnapshot) as a single table, the
+    GoogleSheetsManager reads and writes the shards in parallel.
+    The rows that are already in a shard stay there, the new rows go to the shard of their key (see ShardBy).
+    """
+
+    def __init__(self, shards, header_values, shard_by=ShardBy.KEY):
+        # type: (List[Any], List[str], str) -> ShardedWorksheet
+        """
+        :param shards: the worksheets of the shards, in shard order
+        :param header_values: the header of every shard
+        :param str shard_by: one of the ShardBy values
+        """
+        self.shards = shards  # type: List[Any]
+        self.header_values = header_values  # type: List[str]
+        self.shard_by = shard_by  # type: str
+        self.key_idx = next((header_values.index(h) for h in KEY_HEADERS if h in header_values), 0)  # type: int
+        self.path_idx = header_values.index(IosHeaderValues.PATH) if IosHeaderValues.PATH in header_values else None
+
+    @property
+    def spreadsheet(self):
+        return self.shards[0].spreadsheet
+
+    @property
+    def title(self):
+        # type: () -> str
+        return u'{} ({} SHARDS)'.format(self.shards[0].title, len(self.shards))
+
+    def shard_of(self, row, shard_key=None):
+        # type: (List[Any], str) -> int
+        """
+        :param row: a new row
+        :param str shard_key: with ShardBy.PATH, the key of the rows that have no path column (ex. the Android module)
+        :return: the index of the shard the row goes to
+        """
+        if self.shard_by == ShardBy.PATH and shard_key is not None:
+            return shard_index(shard_key, len(self.shards))
+        if self.shard_by == ShardBy.PATH and self.path_idx is not None and self.path_idx < len(row):
+            return shard_index(row[self.path_idx], len(self.shards))
+        return shard_index(row[self.key_idx] if self.key_idx < len(row) else u'', len(self.shards))
+
+
+class ShardedSnapshot(WorksheetSnapshot):
+    """
+    The snapshots of all the shards of a ShardedWorksheet, seen as one worksheet: the rows of the shards follow
+    each other, in shard order, and the row numbers are the numbers of this logical worksheet.
+    """
+
+    def __init__(self, worksheet, shard_snapshots):
+        # type: (ShardedWorksheet, List[WorksheetSnapshot]) -> ShardedSnapshot
+        self.worksheet = worksheet
+        self.shard_snapshots = shard_snapshots  # type: List[WorksheetSnapshot]
+        self.header = []  # type: List[str]
+        self.rows = []  # type: List[List[Any]]
+        self._shard_starts = []  # type: List[int]
+        self.refresh()
+
+    def refresh(self):
+        # type: () -> None
+        """
+        Rebuilds the logical rows from the shard snapshots (called after the shard snapshots were mirrored)
+        """
+        self.header = next((list(s.header) for s in self.shard_snapshots if len(s.header) > 0), [])
+        self.rows = []
+        self._shard_starts = []
+        for shard_snapshot in self.shard_snapshots:
+            self._shard_starts.append(len(self.rows))
+            self.rows += shard_snapshot.rows
+
+    def locate(self, row_number):
+        # type: (int) -> Tuple[int, int]
+        """
+        :param int row_number: a 1 based row number of the logical worksheet
+        :return: the index of the shard that holds the row, and the row number in that shard
+        """
+        row_idx = row_number - 2
+        shard_idx = max(bisect_right(self._shard_starts, row_idx) - 1, 0)
+        # the empty shards start at the same index as the next one, bisect_right picks the last of them
+        while shard_idx > 0 and row_idx - self._shard_starts[shard_idx] >= len(self.shard_snapshots[shard_idx].rows):
+            shard_idx -= 1
+        return shard_idx, row_idx - self._shard_starts[shard_idx] + 2
+
+
+def worksheet_shards(worksheet):
+    # type: (Any) -> List[Any]
+    """
+    :return: the shards of a ShardedWorksheet, or a list with the worksheet itself
+    """
+    if isinstance(worksheet, ShardedWorksheet):
+        return worksheet.shards
+    return [worksheet]
+
+
+def split_change_set(change_set):
+    # type: (ChangeSet) -> List[ChangeSet]
+    """
+    Splits a change set planned against a ShardedSnapshot into one change set per shard. The cell updates and the
+    deletions go to the shard that holds their row, the new rows go to the shard chosen by ShardedWorksheet.shard_of.
+    :return: the change sets of the shards that have remote changes (the file writes are not copied)
+    """
+    worksheet = change_set.worksheet  # type: ShardedWorksheet
+    snapshot = change_set.snapshot  # type: ShardedSnapshot
+    shard_change_sets = [ChangeSet(worksheet=shard, snapshot=shard_snapshot)
+                         for shard, shard_snapshot in zip(worksheet.shards, snapshot.shard_snapshots)]
+
+    for cell_update in change_set.cell_updates:
+        shard_idx, row_number = snapshot.locate(cell_update.row)
+        shard_change_sets[shard_idx].update_cell(row=row_number, col=cell_update.col, value=cell_update.value)
+
+    for deleted_row_number in set(change_set.deletions):
+        shard_idx, row_number = snapshot.locate(deleted_row_number)
+        shard_change_sets[shard_idx].deletions.append(row_number)
+
+    for row in change_set.new_rows:
+        shard_change_sets[worksheet.shard_of(row, shard_key=change_set.shard_key)].new_rows.append(row)
+
+    return [c for c in shard_change_sets if c.has_remote_changes()]
@@ -1,13 +1,26 @@
 import argparse
 from sys import exit
+from contextlib import closing
 from os import path
 
 from typing import List
 
-from utils.utils import pwt
-from models.ios_xliff_file import export_xliff_files, load_xliff_files
-from cloud_managers.google_sheets_manager import GoogleSheetsManager
-from utils.utils import xcode_supports_dev_language_operations, get_input
+from utils.logger import logger, LogLevel
+from models.ios_xliff_file import load_xliff_files, prefetch_google_sheets_snapshots, \
+    prefetch_google_sheets_columns, get_xliff_file_path, run_xliff_export, iter_xliff_files, \
+    fan_out_development_sources, find_export_input_files
+from utils.file_watcher import FileWatcher, run_watch_loop
+from cloud_managers.sharding import ShardBy
+from cloud_managers.google_sheets_manager import GoogleSheetsManager, SpreadsheetLayout, \
+    DEFAULT_UPLOAD_CHUNK_SIZE, DEFAULT_UPLOADS_IN_FLIGHT
+from cloud_managers.row_index import RowIndexCache
+from utils.parse_cache import ParsedFileCache
+from utils.journal import OperationJournal, run_step
+from utils.leases import LanguageLeases, open_lease_store, DEFAULT_LEASE_TTL
+from utils.pipeline import load_ahead
+from utils.git_changes import GitChanges
+from utils.placeholders import PlaceholderCheck
+from utils.utils import xcode_supports_dev_language_operations, get_input, get_language_name
 
 
 def parse_args():
@@ -23,23 +36,219 @@ def parse_args():
                                                               'localizations (comma separated)', metavar='\b')
     ap.add_argument('-o', '--output_dir', required=True, help='output dir for saving the xliff files generated '
                                                               'from Xcode', metavar='\b')
+    ap.add_argument('-n', '--dry_run', required=False, action='store_true',
+                    help='print the planned changes without applying them')
+    ap.add_argument('--no_cache', required=False, action='store_true',
+                    help='parse all the XLIFF files and read the worksheet rows, without using the parsed files and row '
+                         'index caches')
+    ap.add_argument('--layout', required=False, default=SpreadsheetLayout.PER_LANGUAGE,
+                    choices=[SpreadsheetLayout.PER_LANGUAGE, SpreadsheetLayout.PER_PROJECT],
+                    help='one spreadsheet per language (default) or one spreadsheet per project')
+    ap.add_argument('-w', '--watch', required=False, action='store_true',
+                    help='keep running, upload the changed XLIFF files as they are exported and import the remote '
+                         'changes periodically')
+    ap.add_argument('--pull_interval', required=False, type=float, default=300,
+                    help='seconds between two imports in watch mode (default=300)', metavar='\b')
+    ap.add_argument('--chunk_size', required=False, type=int, default=DEFAULT_UPLOAD_CHUNK_SIZE,
+                    help='number of rows per request when uploading a large number of new rows '
+                         '(default={})'.format(DEFAULT_UPLOAD_CHUNK_SIZE), metavar='\b')
+    ap.add_argument('--uploads_in_flight', required=False, type=int, default=DEFAULT_UPLOADS_IN_FLIGHT,
+                    help='number of row chunks uploaded at the same time '
+                         '(default={})'.format(DEFAULT_UPLOADS_IN_FLIGHT), metavar='\b')
+    ap.add_argument('--shared_sources', required=False, action='store_true',
+                    help='store the source texts used by both the Android and the iOS apps once, in the shared '
+                         'worksheet of every language')
+    ap.add_argument('--shards', required=False, type=int, default=1,
+                    help='split every worksheet between this number of spreadsheets, for the projects that do not '
+                         'fit in one spreadsheet (default=1)', metavar='\b')
+    ap.add_argument('--shard_by', required=False, default=ShardBy.KEY, choices=[ShardBy.KEY, ShardBy.PATH],
+                    help='put the new strings in the shard of their string key (key) or of their file path (path) '
+                         '(default=key)')
+    ap.add_argument('-q', '--quiet', required=False, action='store_true',
+                    help='print only the totals of every file, not every added or translated string')
+    ap.add_argument('--log_json', required=False, default=None,
+                    help='path of a JSON lines file that receives every log message (all levels, with structured '
+                         'fields)', metavar='\b')
+    ap.add_argument('--resume', required=False, action='store_true',
+                    help='skip the steps completed by the previous (failed) run, for the files that have not changed '
+                         'since')
+    ap.add_argument('--lease_store', required=False, default=None,
+                    help='split the languages between the workers that share this lock store (a directory, or a .db '
+                         '/ .sqlite file)', metavar='\b')
+    ap.add_argument('--lease_run_id', required=False, default=None,
+                    help='identifies the run in the lock store (ex. the CI pipeline id), required with --lease_store',
+                    metavar='\b')
+    ap.add_argument('--lease_ttl', required=False, type=float, default=DEFAULT_LEASE_TTL,
+                    help='seconds after which the languages of a stalled worker are claimed by the others '
+                         '(default={})'.format(DEFAULT_LEASE_TTL), metavar='\b')
+    ap.add_argument('--worker_id', required=False, default=None,
+                    help='name of this worker in the lock store (default=host name and process id)', metavar='\b')
+    ap.add_argument('--placeholder_check', required=False, default=PlaceholderCheck.BLOCK,
+                    choices=[PlaceholderCheck.BLOCK, PlaceholderCheck.WARN, PlaceholderCheck.OFF],
+                    help='when importing, skip (block) or only report (warn) the translations whose placeholders '
+                         'differ from the source text (default=block)')
+    ap.add_argument('--since', required=False, default=None,
+                    help='sync only the strings added or changed since this git commit, branch or tag of the project '
+                         'repository (ignored in watch mode)', metavar='\b')
+    ap.add_argument('--api_endpoint', required=False, default=None,
+                    help='send the Google Sheets and Drive requests to this URL instead of the Google hosts '
+                         '(ex. http://localhost:8080, a local stand-in)', metavar='\b')
 
-    return vars(ap.parse_args())
+    args = vars(ap.parse_args())
+    if args['lease_store'] is not None and args['lease_run_id'] is None:
+        ap.error('--lease_run_id is required with --lease_store')
+    return args
 
 
-if __name__ == "__main__":
-    args = parse_args()
+def export_files(xcodeproj_path, languages, dev_language, loc_output_path, journal):
+    """
+    Exports the XLIFF files of the languages from Xcode, unless the previous run did it from the same project files.
+    The exported files are inputs of the step too (a missing or edited XLIFF file is exported again), the changes
+    written to them by the import of the run are followed by the journal.
+    """
+    input_paths = []  # type: List[str]
+    if journal is not None:
+        input_paths = [get_xliff_file_path(loc_output_path, language) for language in languages] + \
+            find_export_input_files(xcodeproj_path, dev_language, excluded_dirs=(loc_output_path,))
+    run_step(journal, 'export', input_paths, lambda: run_xliff_export(xcodeproj_path, languages, loc_output_path))
 
-    op_type = get_input('Export XCLOC files? [0=no, 1=yes]: ')
-    should_export = op_type == '1'
 
-    op_values = ['1', '2', '3', '4', '5']
-    op_type = get_input('Enter operation type [1=export, 2=import, 3=export&import, '
-                        '4=remove unused, 5=translation memory]: ')
+def sync_files(google_sheets_manager, xliff_files, xcodeproj_path, op_type, journal, git_changes=None,
+               placeholder_check=PlaceholderCheck.BLOCK):
+    """
+    Runs the operation (1=export, 2=import, 3=export&import, 4=remove unused, 5=translation memory) for the provided
+    files, then releases the cached worksheets of their languages
+    :param GitChanges git_changes: in --since mode, only the strings changed since the reference are synced
+    :param str placeholder_check: what the import does with the translations with mismatched placeholders
+    """
+    sync_identifiers = {}
+    if git_changes is not None and op_type in ['1', '3', '4']:
+        project_path = path.dirname(path.abspath(xcodeproj_path))
+        for l_file in xliff_files:
+            sync_identifiers[l_file.original_file_path] = l_file.changed_identifiers(git_changes, project_path)
+        # the import and the removal of the unused strings need every file, the export only the changed ones
+        if op_type == '1':
+            xliff_files = [f for f in xliff_files if len(sync_identifiers[f.original_file_path]) > 0]
+            if len(xliff_files) == 0:
+                return
 
-    if op_type not in op_values:
-        pwt('INVALID OPERATION', color='r')
-        exit(1)
+    # the import and translation memory operations only read the columns they need, all the other operations need
+    # the full worksheets
+    if op_type in ['2', '5']:
+        prefetch_google_sheets_columns(gsheets_manager=google_sheets_manager, xliff_files=xliff_files)
+    else:
+        prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xliff_files=xliff_files)
+
+    with google_sheets_manager.batched_writes():
+        for l_file in xliff_files:
+            input_paths = [l_file.original_file_path]
+
+            if op_type in ['1', '3', '4']:
+                run_step(journal, 'sync', input_paths,
+                         lambda: l_file.sync_with_google_sheets(gsheets_manager=google_sheets_manager,
+                                                                remove_unused_strings=op_type == '4',
+                                                                identifiers=sync_identifiers.get(
+                                                                    l_file.original_file_path)),
+                         gsheets_manager=google_sheets_manager)
+            if op_type in ['2', '3']:
+                # the import writes the file, the sync and the export of the file stay completed
+                imported = run_step(journal, 'import', input_paths,
+                                    lambda: l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
+                                                                             placeholder_check=placeholder_check),
+                                    rewrites_inputs=True)
+                # when the import was done by the previous run, its Xcode import may still be missing
+                if (l_file.has_updates or not imported) and not google_sheets_manager.dry_run:
+                    run_step(journal, 'xcode_import', input_paths,
+                             lambda: l_file.import_in_xcode(xcodeproj_path=xcodeproj_path))
+            if op_type == '5':
+                run_step(journal, 'translation_memory', input_paths,
+                         lambda: l_file.update_from_google_sheets_memory(gsheets_manager=google_sheets_manager),
+                         gsheets_manager=google_sheets_manager)
+
+    google_sheets_manager.apply_highlighting()
+    for language in set(f.target_language for f in xliff_files):
+        google_sheets_manager.release_language(language)
+
+
+def sync_languages(google_sheets_manager, xcodeproj_path, languages, dev_language, loc_output_path, op_type,
+                   should_export, journal, parse_cache, git_changes=None, placeholder_check=PlaceholderCheck.BLOCK):
+    """
+    Runs the operation for all the languages (when a single worker processes the run): exports the XLIFF files if
+    requested, then every language is synced and released in turn, while the XLIFF file of the next language is
+    parsed. The source texts are the same in every XLIFF file, the changed ones are updated in all the worksheets
+    first.
+    """
+    if should_export:
+        export_files(xcodeproj_path, languages, dev_language, loc_output_path, journal)
+
+    sources_fanned_out = op_type not in ['1', '3', '4']
+    for language, xliff_files in load_ahead(iter_xliff_files(languages, loc_output_path, parse_cache=parse_cache)):
+        if not sources_fanned_out and len(xliff_files) > 0:
+            fan_out_sources(google_sheets_manager, xliff_files[0], languages, xcodeproj_path, git_changes=git_changes)
+            sources_fanned_out = True
+        sync_files(google_sheets_manager, xliff_files, xcodeproj_path, op_type, journal, git_changes=git_changes,
+                   placeholder_check=placeholder_check)
+
+
+def fan_out_sources(google_sheets_manager, xliff_file, languages, xcodeproj_path, git_changes=None):
+    """
+    Updates the changed source texts of the XLIFF file in the worksheets of the languages at once (sync operations
+    only), then releases the columns read for it. Not recorded in the journal: a repeated fan-out finds nothing to
+    update.
+    """
+    identifiers = None
+    if git_changes is not None:
+        identifiers = xliff_file.changed_identifiers(git_changes, path.dirname(path.abspath(xcodeproj_path)))
+    fan_out_development_sources(gsheets_manager=google_sheets_manager, xliff_file=xliff_file, languages=languages,
+                                identifiers=identifiers)
+    for language in languages:
+        google_sheets_manager.release_language(get_language_name(language))
+
+
+def run_watch_mode(google_sheets_manager, xcodeproj_path, languages, loc_output_path, parse_cache, pull_interval,
+                   placeholder_check=PlaceholderCheck.BLOCK):
+    """
+    Keeps the authorized manager and its worksheet snapshots warm: the changed XLIFF files are synced in debounced
+    batches and the translations are imported (and imported in Xcode) every pull_interval seconds
+    """
+    languages_by_path = {get_xliff_file_path(loc_output_path, language): language for language in languages}
+    state = {'files': load_xliff_files(languages, loc_output_path, parse_cache=parse_cache)}
+
+    def push_changes(changed_paths):
+        changed_languages = [languages_by_path[p] for p in changed_paths if p in languages_by_path]
+        changed_files = load_xliff_files(changed_languages, loc_output_path, parse_cache=parse_cache)
+        state['files'] = [f for f in state['files'] if f.original_file_path not in changed_paths] + changed_files
+
+        with google_sheets_manager.batched_writes():
+            for l_file in changed_files:
+                l_file.sync_with_google_sheets(gsheets_manager=google_sheets_manager, remove_unused_strings=False)
+        google_sheets_manager.apply_highlighting()
+
+    def pull_changes():
+        # fresh snapshots, the import reads its columns from them and the next push plans against them
+        google_sheets_manager.invalidate_snapshots()
+        prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xliff_files=state['files'])
+        written_paths = []
+        for l_file in state['files']:
+            change_set = l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager,
+                                                          placeholder_check=placeholder_check)
+            written_paths += [w.file_path for w in change_set.file_writes]
+            if l_file.has_updates and not google_sheets_manager.dry_run:
+                l_file.import_in_xcode(xcodeproj_path=xcodeproj_path)
+        # only the written files are not reported as local changes (the files changed during the pull are pushed)
+        return written_paths
+
+    prefetch_google_sheets_snapshots(gsheets_manager=google_sheets_manager, xliff_files=state['files'])
+    push_changes(list(languages_by_path.keys()))
+
+    watcher = FileWatcher(list_files=lambda: list(languages_by_path.keys()))
+    run_watch_loop(watcher, push_changes=push_changes, pull_changes=pull_changes, pull_interval=pull_interval)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    logger.configure(level=LogLevel.INFO if args['quiet'] else LogLevel.DEBUG, json_lines_path=args['log_json'])
 
     xcodeproj_path = args['xcodeproj_path'].rstrip('/')
     project_name = path.splitext(path.basename(xcodeproj_path))[0]
@@ -49,34 +258,74 @@ if __name__ == "__main__":
     localization_languages = args['languages'].split(',')  # type: List[str]
     dev_language = args['dev_language']
 
-    google_sheets_manager = GoogleSheetsManager(service_account_file, user_email, project_name)
+    google_sheets_manager = GoogleSheetsManager(service_account_file, user_email, project_name,
+                                                dry_run=args['dry_run'], layout=args['layout'],
+                                                upload_chunk_size=args['chunk_size'],
+                                                uploads_in_flight=args['uploads_in_flight'],
+                                                shared_sources=args['shared_sources'],
+                                                shards=args['shards'], shard_by=args['shard_by'],
+                                                row_index_cache=None if args['no_cache'] else RowIndexCache(),
+                                                api_endpoint=args['api_endpoint'])
 
     # Starting with XCode 10.2, operations with the development languages (import/export) are supported
     if xcode_supports_dev_language_operations():
-        localization_languages = [dev_language] + lang_codes
+        localization_languages = [dev_language] + localization_languages
 
-    if should_export:
-        xliff_files = export_xliff_files(xcodeproj_path, lang_codes, loc_output_path)
+    parse_cache = None if args['no_cache'] else ParsedFileCache()
+
+    if args['watch']:
+        run_watch_mode(google_sheets_manager, xcodeproj_path, localization_languages, loc_output_path,
+                       parse_cache=parse_cache, pull_interval=args['pull_interval'],
+                       placeholder_check=args['placeholder_check'])
+        exit(0)
+
+    op_type = get_input('Export XCLOC files? [0=no, 1=yes]: ')
+    should_export = op_type == '1'
+
+    op_values = ['1', '2', '3', '4', '5']
+    op_type = get_input('Enter operation type [1=export, 2=import, 3=export&import, '
+                        '4=remove unused, 5=translation memory]: ')
+
+    if op_type not in op_values:
+        logger.error('INVALID OPERATION')
+        exit(1)
+
+    # the completed steps are recorded, so a failed run can be resumed (nothing is recorded in dry run mode)
+    journal = None
+    if not args['dry_run']:
+        journal_name = u'ios|{}|{}'.format(path.abspath(xcodeproj_path), path.abspath(loc_output_path))
+        journal = OperationJournal(name=journal_name,
+                                   context={'operation': op_type, 'layout': args['layout'],
+                                            'languages': localization_languages,
+                                            'shared_sources': args['shared_sources'],
+                                            'shards': args['shards'], 'shard_by': args['shard_by'],
+                                            'since': args['since'], 'placeholder_check': args['placeholder_check']},
+                                   resume=args['resume'])
+
+    # the XLIFF files are exported by Xcode, the changes are read from the repository of the project
+    git_changes = None
+    if args['since'] is not None:
+        git_changes = GitChanges(args['since'], [path.dirname(path.abspath(xcodeproj_path))])
+
+    if args['lease_store'] is None:
+        sync_languages(google_sheets_manager, xcodeproj_path, localization_languages, dev_language, loc_output_path,
+                       op_type, should_export, journal, parse_cache, git_changes=git_changes,
+                       placeholder_check=args['placeholder_check'])
     else:
-        xliff_files = load_xliff_files(lang_codes, loc_output_path)
+        # this worker exports and processes only the languages it claims, the other workers of the run process the
+        # others (the Xcode exports are split between the workers too)
+        language_leases = LanguageLeases(store=open_lease_store(args['lease_store']), run_id=args['lease_run_id'],
+                                         platform='ios', worker_id=args['worker_id'], ttl=args['lease_ttl'])
+        with closing(language_leases.claim(localization_languages)) as claimed_languages:
+            for language in claimed_languages:
+                if should_export:
+                    export_files(xcodeproj_path, [language], dev_language, loc_output_path, journal)
+                xliff_files = load_xliff_files([language], loc_output_path, parse_cache=parse_cache)
+                if op_type in ['1', '3', '4'] and len(xliff_files) > 0:
+                    fan_out_sources(google_sheets_manager, xliff_files[0], [language], xcodeproj_path,
+                                    git_changes=git_changes)
+                sync_files(google_sheets_manager, xliff_files, xcodeproj_path, op_type, journal,
+                           git_changes=git_changes, placeholder_check=args['placeholder_check'])
 
-    if op_type == '1':
-        for l_file in xliff_files:
-            l_file.sync_with_google_sheets(gsheets_manager=google_sheets_manager, remove_unused_strings=False)
-    elif op_type == '2':
-        for l_file in xliff_files:
-            l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager)
-            if l_file.has_updates:
-                l_file.import_in_xcode(xcodeproj_path=xcodeproj_path)
-    elif op_type == '3':
-        for l_file in xliff_files:
-            l_file.sync_with_google_sheets(gsheets_manager=google_sheets_manager, remove_unused_strings=False)
-            l_file.update_from_google_sheets(gsheets_manager=google_sheets_manager)
-            if l_file.has_updates:
-                l_file.import_in_xcode(xcodeproj_path=xcodeproj_path)
-    elif op_type == '4':
-        for l_file in xliff_files:
-            l_file.sync_with_google_sheets(gsheets_manager=google_sheets_manager, remove_unused_strings=True)
-    elif op_type == '5':
-        for l_file in xliff_files:
-            l_file.update_from_google_sheets_memory(gsheets_manager=google_sheets_manager)
+    if journal is not None:
+        journal.clear()
@@ -1,16 +1,22 @@
 from sys import exit
-from copy import deepcopy
 from os import path, walk
 from lxml import etree
-from typing import List
+from typing import List, Tuple, Dict, Iterator, Set
 
 from pygsheets.custom_types import ValueRenderOption
 
+from cloud_managers.change_set import ChangeSet
 from utils.gs_header_types import AndroidHeaderValues
+from utils.parse_cache import ParsedFileCache
+from utils.git_changes import GitChanges
+from utils.placeholders import PlaceholderCheck, find_placeholder_mismatches
 from utils.utils import get_language_name, string_has_placeholders
 from utils.utils import escape_xml_characters, unescape_xml_characters
-from utils.utils import pwt, is_python_2, get_timestamp
-from models.translation_units import AndroidXmlTranslationUnit
+from utils.utils import is_python_2, get_timestamp
+from utils.logger import logger
+from models.translation_units import AndroidXmlTranslationUnit, AndroidXmlTranslationUnitOverlay
+from models.shared_strings import SharedStrings, normalize_source_text
+from models.source_changes import fan_out_source_changes
 
 if is_python_2():
     from io import open
@@ -18,16 +24,34 @@ if is_python_2():
 
 class AndroidXmlFile(object):
 
-    def __init__(self, file_path, source_language):
-        # type: (str, str) -> AndroidXmlFile
+    def __init__(self, file_path, source_language, parse_cache=None):
+        # type: (str, str, ParsedFileCache) -> AndroidXmlFile
         self.source_language = get_language_name(source_language)
         self.source_language_code = source_language  # type: str
         self.target_language = None  # type: str
         self.target_language_code = None  # type: str
         self.translation_units = []  # type: List[AndroidXmlTranslationUnit]
-        self.untranslated = []  # type: List[AndroidXmlTranslationUnit]
+        self.untranslated = []  # type: List[AndroidXmlTranslationUnitOverlay]
         self.original_file_path = file_path  # type: str
-        self.load(file_path=file_path)
+        self.load(file_path=file_path, parse_cache=parse_cache)
+
+    @property
+    def res_folder_path(self):
+        """
+        :return: the 'res' folder that contains this file (used to match the files of the same module)
+        """
+        return path.dirname(path.dirname(self.original_file_path))
+
+    @property
+    def module_name(self):
+        # type: () -> str
+        """
+        :return: the name of the Gradle module of this file (ex. 'app' for app/src/main/res/values/strings.xml)
+        """
+        res_folder_parts = path.normpath(path.abspath(self.res_folder_path)).split(path.sep)
+        if len(res_folder_parts) >= 4 and res_folder_parts[-3] == 'src':
+            return res_folder_parts[-4]
+        return res_folder_parts[-2] if len(res_folder_parts) >= 2 else self.res_folder_path
 
     @property
     def source_language_header(self):
@@ -39,36 +63,57 @@ class AndroidXmlFile(object):
 
     @property
     def header_values(self):
-        return [self.source_language_header, self.target_language_header, AndroidHeaderValues.STRING_ID]
+        return AndroidXmlFile.worksheet_header_values(self.source_language, self.target_language)
 
-    def load(self, file_path):
-        # type: (str) -> None
+    @staticmethod
+    def worksheet_header_values(source_language, target_language):
+        # type: (str, str) -> List[str]
+        """
+        :return: the header of the worksheet of a language (the language names, ex. English and Spanish)
+        """
+        return [AndroidHeaderValues.SOURCE_LANGUAGE.format(source_language),
+                AndroidHeaderValues.TARGET_LANGUAGE.format(target_language),
+                AndroidHeaderValues.STRING_ID]
 
-        parent_folder_name = path.basename(path.dirname(file_path))
-        lang_tokens = parent_folder_name.split('-')
+    @staticmethod
+    def cache_kind(source_language_code):
+        # type: (str) -> str
+        """
+        :return: the ParsedFileCache kind of the parsed files. The parsed units depend on the source language too
+        (the source texts are set only for the development language file).
+        """
+        return 'android:{}'.format(source_language_code)
 
+    @staticmethod
+    def language_code(file_path, source_language_code):
+        # type: (str, str) -> str
+        """
+        :return: the language code of a 'strings.xml' file, from the name of its folder (ex. values-es -> es, values ->
+        the source language)
+        """
+        lang_tokens = path.basename(path.dirname(file_path)).split('-')
         if len(lang_tokens) < 2:
-            self.target_language_code = self.source_language_code
-        else:
-            self.target_language_code = lang_tokens[-1]  # last element
+            return source_language_code
+        return lang_tokens[-1]  # last element
+
+    def load(self, file_path, parse_cache=None):
+        # type: (str, ParsedFileCache) -> None
+
+        cache_kind = AndroidXmlFile.cache_kind(self.source_language_code)
+        if parse_cache is not None:
+            cached_data = parse_cache.load(file_path, cache_kind)
+            if cached_data is not None:
+                self.target_language_code, self.target_language, self.translation_units = cached_data
+                return
 
+        self.target_language_code = AndroidXmlFile.language_code(file_path, self.source_language_code)
         self.target_language = get_language_name(self.target_language_code)
 
         f_stream = open(file_path, 'r', encoding='utf-8')
         str_content = f_stream.read()
         f_stream.close()
 
-        normalized_xml = normalize_xml_file_content(str_content)
-
-        xml_root = etree.fromstring(normalized_xml)
-
-        for string_element in xml_root.iter('string'):
-            string_id = string_element.get('name')
-
-            string_value = etree.tostring(string_element, encoding='unicode')
-            string_value = string_value.split('\">')[-1]
-            string_value = string_value[:string_value.index('</string>')]
-
+        for string_id, string_value in parse_string_values(str_content):
             t_unit = AndroidXmlTranslationUnit(target_text=string_value,
                                                identifier=string_id,
                                                target_language=self.target_language_code,
@@ -81,74 +126,151 @@ class AndroidXmlFile(object):
                 t_unit.source_text = string_value.replace('&lt;', '<').replace('&gt;', '>')
 
             self.translation_units.append(t_unit)
-        pass
+
+        if parse_cache is not None:
+            parse_cache.save(file_path, cache_kind,
+                             (self.target_language_code, self.target_language, self.translation_units))
 
     def update_source_language(self, source_xml_file):
         """
         Updates the source_text property, based on the provided source language file (matches between string IDs)
         :param AndroidXmlFile source_xml_file: the xml file for the development language
         """
-        pwt("UPDATING SOURCES FOR {}".format(self.original_file_path), color='y')
+        logger.info("UPDATING SOURCES FOR {}".format(self.original_file_path), color='y')
+
+        source_units_by_id = {t.identifier: t for t in source_xml_file.translation_units}
 
         # Add original text (source language) to translation units
+        not_found_count = 0
         for t_unit in self.translation_units:
-            t_unit_source_match = next((t for t in source_xml_file.translation_units if t.identifier == t_unit.identifier), None)
+            t_unit_source_match = source_units_by_id.get(t_unit.identifier)
             if t_unit_source_match is None:
-                pwt("{} - {} NOT FOUND IN SOURCE LANGUAGE FILE".format(t_unit.identifier, t_unit.target_text), color='r')
+                not_found_count += 1
+                logger.debug(u"{} - {} NOT FOUND IN SOURCE LANGUAGE FILE".format(t_unit.identifier, t_unit.target_text),
+                             color='r', event='source_not_found', file=self.original_file_path,
+                             identifier=t_unit.identifier)
             else:
                 t_unit.source_text = t_unit_source_match.source_text
 
-        target_lang_ids = [t_unit.identifier for t_unit in self.translation_units]
-        self.untranslated = deepcopy(
-            [t for t in source_xml_file.translation_units if t.identifier not in target_lang_ids])
+        if not_found_count > 0:
+            logger.warning("{} STRINGS OF {} NOT FOUND IN SOURCE LANGUAGE FILE".format(not_found_count,
+                                                                                      self.original_file_path))
 
-        for t_unit in self.untranslated:
-            t_unit.target_text = ''
-            t_unit.target_language = self.target_language_code
-            t_unit.friendly_target_language = self.target_language
-            pwt(u"MISSING {} TRANSLATION FOR: {} - {}".format(self.target_language, t_unit.identifier,
-                                                             t_unit.source_text), color='r')
+        # the missing units reference the source units, only the target fields are allocated for every language
+        target_lang_ids = set(t_unit.identifier for t_unit in self.translation_units)
+        self.untranslated = [AndroidXmlTranslationUnitOverlay(source_unit=t,
+                                                              target_language=self.target_language_code,
+                                                              friendly_target_language=self.target_language)
+                             for t in source_xml_file.translation_units if t.identifier not in target_lang_ids]
 
-    def upload_to_google_sheets(self, gsheets_manager):
-        # type: (GoogleSheetsManager) -> None
+        for t_unit in self.untranslated:
+            logger.debug(u"MISSING {} TRANSLATION FOR: {} - {}".format(self.target_language, t_unit.identifier,
+                                                                      t_unit.source_text), color='r',
+                         event='missing_translation', file=self.original_file_path, identifier=t_unit.identifier)
+        if len(self.untranslated) > 0:
+            logger.info(u"{} MISSING {} TRANSLATIONS IN {}".format(len(self.untranslated), self.target_language,
+                                                                  self.original_file_path), color='r',
+                        event='missing_translations', file=self.original_file_path, count=len(self.untranslated))
+
+    def changed_identifiers(self, git_changes):
+        # type: (GitChanges) -> Set[str]
+        """
+        :param GitChanges git_changes: the files changed since the --since reference
+        :return: the IDs of the strings added or changed in this file since the reference
+        """
+        return git_changes.changed_units(self.original_file_path,
+                                         parse_units=lambda content: dict(parse_string_values(content)))
 
-        pwt("SYNCING {} WITH GOOGLE SHEETS".format(self.original_file_path), color='y')
+    def plan_upload(self, gsheets_manager, identifiers=None):
+        # type: (GoogleSheetsManager, Set[str]) -> ChangeSet
+        """
+        Compares the translation units with a snapshot of the corresponding worksheet, without changing anything
+        :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheet
+        :param Set[str] identifiers: if provided, only the strings with these IDs are uploaded (ex. the changed ones)
+        :return: the rows that are missing from the worksheet, as a ChangeSet
+        :rtype: ChangeSet
+        """
         lang_ws = gsheets_manager.get_worksheet(platform='android',
                                                 language=self.target_language,
                                                 header_values=self.header_values)
 
-        ws_records = lang_ws.get_all_records(numericise_data=False, value_render=ValueRenderOption.FORMULA)
-        ws_records_ids = [r[AndroidHeaderValues.STRING_ID] for r in ws_records]
+        ws_snapshot = gsheets_manager.get_snapshot(lang_ws, value_render=ValueRenderOption.FORMULA)
+        ws_records_ids = set(ws_snapshot.column(AndroidHeaderValues.STRING_ID))
 
-        missing_records = [u.record_value for u in self.translation_units if u.identifier not in ws_records_ids]
-        missing_untranslated_records = [u.record_value for u in self.untranslated if u.identifier not in ws_records_ids]
-        missing_records += missing_untranslated_records
+        change_set = ChangeSet(worksheet=lang_ws, snapshot=ws_snapshot)
+        # the worksheets sharded by path keep the strings of a module in the same shard
+        change_set.shard_key = self.module_name
+        change_set.new_rows = [u.record_value for u in self.translation_units + self.untranslated
+                               if u.identifier not in ws_records_ids and
+                               (identifiers is None or u.identifier in identifiers)]
 
-        if len(missing_records) > 0:
-            lang_ws.insert_rows(row=lang_ws.rows, number=len(missing_records), values=missing_records, inherit=True)
+        return change_set
 
-        lang_ws.sort_range((2, 1), (lang_ws.rows, lang_ws.cols))
+    def upload_to_google_sheets(self, gsheets_manager, identifiers=None):
+        # type: (GoogleSheetsManager, Set[str]) -> None
 
-        for r_to_add in missing_records:
-            pwt("ADDED {} TO {} - {}".format(r_to_add, lang_ws.spreadsheet.title, lang_ws.title), color='y')
+        logger.info("SYNCING {} WITH GOOGLE SHEETS".format(self.original_file_path), color='y')
+        change_set = self.plan_upload(gsheets_manager=gsheets_manager, identifiers=identifiers)
+        shared_change_sets = []  # type: List[ChangeSet]
+        if gsheets_manager.shared_sources:
+            shared_strings = self.shared_strings(gsheets_manager)
+            shared_change_sets = shared_strings.plan_dedup(change_set=change_set, platform='android')
+            gsheets_manager.highlighting.add_translation_rules(worksheet=shared_strings.worksheet,
+                                                               source_col=0, target_col=1)
 
-        pwt("ADDED {} RECORDS TO {} - {}".format(len(missing_records), lang_ws.spreadsheet.title, lang_ws.title), color='g')
+        gsheets_manager.apply_change_sets([change_set] + shared_change_sets)
+        gsheets_manager.highlighting.add_translation_rules(worksheet=change_set.worksheet, source_col=0, target_col=1)
+
+        if gsheets_manager.dry_run:
+            return
+
+        for r_to_add in change_set.new_rows:
+            logger.debug(u"ADDED {} TO {}".format(r_to_add, change_set.title), color='y',
+                         event='row_added', worksheet=change_set.title, row=r_to_add)
+
+        logger.info(u"ADDED {} RECORDS TO {}".format(len(change_set.new_rows), change_set.title), color='g',
+                    event='rows_added', worksheet=change_set.title, file=self.original_file_path,
+                    count=len(change_set.new_rows))
 
         pass
 
-    def update_from_google_sheets(self, gsheets_manager, dev_language_file):
-        # type: (GoogleSheetsManager, AndroidXmlFile) -> None
+    def shared_strings(self, gsheets_manager):
+        # type: (GoogleSheetsManager) -> SharedStrings
+        """
+        :return: the shared worksheet (source texts used by both platforms) of the target language
+        """
+        return SharedStrings(gsheets_manager=gsheets_manager,
+                             source_language=self.source_language,
+                             target_language=self.target_language)
 
-        pwt("UPDATING {}".format(self.original_file_path), color='y')
+    def plan_update_from_google_sheets(self, gsheets_manager, dev_language_file,
+                                       placeholder_check=PlaceholderCheck.BLOCK):
+        # type: (GoogleSheetsManager, AndroidXmlFile, str) -> ChangeSet
+        """
+        Updates the translation units from the corresponding worksheet and plans the write of the local XML file
+        :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheet
+        :param AndroidXmlFile dev_language_file: the xml file for the development language
+        :param str placeholder_check: what to do with the translations whose placeholders differ from the source text
+                                      (see PlaceholderCheck)
+        :return: a ChangeSet containing the local file write (empty if nothing was translated)
+        :rtype: ChangeSet
+        """
         online_translation_units = self.__get_google_sheets_translation_units(gsheets_manager=gsheets_manager,
                                                                               dev_language_file=dev_language_file)
+        blocked_ids = find_placeholder_mismatches([(u.identifier, u.source_text, u.target_text)
+                                                   for u in online_translation_units if u.is_translated()],
+                                                  file_path=self.original_file_path,
+                                                  placeholder_check=placeholder_check)
+        # the blocked translations are left out, the local file keeps its previous translation
+        online_units_by_id = {u.identifier: u for u in online_translation_units if u.identifier not in blocked_ids}
 
         mismatched_records = []
         for offline_t_unit in self.translation_units:
-            online_t_unit = next((u for u in online_translation_units if u.identifier == offline_t_unit.identifier), None)
+            online_t_unit = online_units_by_id.get(offline_t_unit.identifier)
 
             if online_t_unit is None:
-                mismatched_records.append(offline_t_unit)
+                if offline_t_unit.identifier not in blocked_ids:
+                    mismatched_records.append(offline_t_unit)
             else:
                 offline_target_text = offline_t_unit.target_text if offline_t_unit.target_text is not None else ''
                 if online_t_unit.target_text != offline_target_text:
@@ -156,41 +278,65 @@ class AndroidXmlFile(object):
                     mismatched_records.append(offline_t_unit)
 
         for untranslated_unit in self.untranslated:
-            matched_unit = next((u for u in online_translation_units if u.identifier == untranslated_unit.identifier and
-                             u.target_text is not None and u.target_text != ''), None)
+            matched_unit = online_units_by_id.get(untranslated_unit.identifier)
 
-            if matched_unit is not None:
-                m_unit_target_text = matched_unit.target_text if matched_unit.target_text is not None else ''
-                untranslated_unit.target_text = m_unit_target_text
+            if matched_unit is not None and matched_unit.target_text is not None and matched_unit.target_text != '':
+                untranslated_unit.target_text = matched_unit.target_text
                 mismatched_records.append(untranslated_unit)
 
+        translated_count = 0
         for t_unit in mismatched_records:
-            matched_unit = next((online_unit for online_unit in online_translation_units if
-                                 online_unit.identifier == t_unit.identifier), None)
+            matched_unit = online_units_by_id.get(t_unit.identifier)
             if matched_unit is not None and matched_unit.is_translated():
-                pwt(u"TRANSLATED: {}".format(matched_unit), color='g')
+                logger.debug(u"TRANSLATED: {}".format(matched_unit), color='g', event='unit_translated',
+                             file=self.original_file_path, identifier=matched_unit.identifier)
                 t_unit.target_text = matched_unit.target_text
+                translated_count += 1
+
+        logger.info(u"TRANSLATED {} UNITS IN {}".format(translated_count, self.original_file_path), color='g',
+                    event='units_translated', file=self.original_file_path, count=translated_count)
+
+        change_set = ChangeSet(worksheet=None)
+        if len(mismatched_records) > 0:
+            change_set.write_file(file_path=self.original_file_path,
+                                  description='{} TRANSLATED UNITS'.format(translated_count),
+                                  writer=self.update_source_xml)
+        return change_set
+
+    def update_from_google_sheets(self, gsheets_manager, dev_language_file, placeholder_check=PlaceholderCheck.BLOCK):
+        # type: (GoogleSheetsManager, AndroidXmlFile, str) -> ChangeSet
+        """
+        :return: the applied changes (the write of the local file, if anything was translated)
+        """
+
+        logger.info("UPDATING {}".format(self.original_file_path), color='y')
+        change_set = self.plan_update_from_google_sheets(gsheets_manager=gsheets_manager,
+                                                         dev_language_file=dev_language_file,
+                                                         placeholder_check=placeholder_check)
+        gsheets_manager.apply_change_set(change_set)
+        return change_set
 
     def __get_google_sheets_translation_units(self, gsheets_manager, dev_language_file):
         # type: (GoogleSheetsManager, AndroidXmlFile) -> List[XliffTranslationUnit]
         lang_ws = gsheets_manager.get_worksheet(platform='android',
                                                 language=self.target_language,
                                                 header_values=self.header_values)
-        ws_records = lang_ws.get_all_records(numericise_data=False, value_render=ValueRenderOption.FORMULA)
+        ws_rows = gsheets_manager.fetch_columns(lang_ws,
+                                                header_values=self.header_values,
+                                                column_names=[self.target_language_header,
+                                                              AndroidHeaderValues.STRING_ID],
+                                                value_render=ValueRenderOption.FORMULA)
         xml_translation_units = []
+        dev_lang_units_by_id = {t.identifier: t for t in dev_language_file.translation_units}
 
-        if len(ws_records) == 0:
-            return xml_translation_units
+        for target_text, string_id in ws_rows:
 
-        for record in ws_records:
-
-            xml_translation_unit = AndroidXmlTranslationUnit(target_text=record[self.target_language_header],
-                                                             identifier=record[AndroidHeaderValues.STRING_ID],
+            xml_translation_unit = AndroidXmlTranslationUnit(target_text=u'{}'.format(target_text),
+                                                             identifier=string_id,
                                                              target_language=self.target_language_code,
                                                              friendly_target_language=self.target_language)
 
-            dev_lang_unit = next((t for t in dev_language_file.translation_units if
-                                            t.identifier == xml_translation_unit.identifier), None)
+            dev_lang_unit = dev_lang_units_by_id.get(xml_translation_unit.identifier)
 
             if dev_lang_unit is not None:
                 xml_translation_unit.source_text = dev_lang_unit.source_text
@@ -198,6 +344,30 @@ class AndroidXmlFile(object):
                 xml_translation_unit.friendly_source_language = dev_language_file.source_language
                 xml_translation_units.append(xml_translation_unit)
 
+        if not gsheets_manager.shared_sources:
+            return xml_translation_units
+
+        # the strings are matched with the shared worksheet by source text. The rows of the Android worksheet whose
+        # source text is shared are kept read-only: their translation is taken from the shared worksheet.
+        units_by_id = {u.identifier: u for u in xml_translation_units}
+        shared_translations = self.shared_strings(gsheets_manager).translations()
+        for dev_lang_unit in dev_language_file.translation_units:
+            target_text = shared_translations.get(normalize_source_text(dev_lang_unit.source_text))
+            if target_text is None:
+                continue
+            if dev_lang_unit.identifier in units_by_id:
+                units_by_id[dev_lang_unit.identifier].target_text = target_text
+                continue
+
+            xml_translation_unit = AndroidXmlTranslationUnit(target_text=target_text,
+                                                             identifier=dev_lang_unit.identifier,
+                                                             target_language=self.target_language_code,
+                                                             friendly_target_language=self.target_language)
+            xml_translation_unit.source_text = dev_lang_unit.source_text
+            xml_translation_unit.source_language = dev_language_file.source_language_code
+            xml_translation_unit.friendly_source_language = dev_language_file.source_language
+            xml_translation_units.append(xml_translation_unit)
+
         return xml_translation_units
 
     @staticmethod
@@ -271,6 +441,11 @@ class AndroidXmlFile(object):
                 string_node.tail = '\n\t'
                 string_node.text = escape_xml_characters(t_unit.target_text)
                 xml_root.append(string_node)
+            elif xml_t_unit_node is not None and not t_unit.is_translated() and \
+                    self.target_language_code != self.source_language_code:
+                # a cleared translation (ex. its source text changed) is removed, Android falls back to the string of
+                # the development language instead of showing an empty string
+                xml_t_unit_node.getparent().remove(xml_t_unit_node)
             elif xml_t_unit_node is not None:
 
                 if string_has_placeholders(t_unit.target_text):
@@ -317,32 +492,265 @@ def normalize_xml_file_content(file_content):
     return filtered_content.encode('utf-8')
 
 
-def import_from_res_folder(res_folder_path, development_language):
-    # type: (str) -> List[AndroidXmlFile]
+def parse_string_values(file_content):
+    # type: (str) -> List[Tuple[str, str]]
+    """
+    :param str file_content: the content of a 'strings.xml' file
+    :return: the ID and the value (as written in the file) of every string, in file order
+    """
+    xml_root = etree.fromstring(normalize_xml_file_content(file_content))
+
+    string_values = []  # type: List[Tuple[str, str]]
+    for string_element in xml_root.iter('string'):
+        string_value = etree.tostring(string_element, encoding='unicode', with_tail=False)
+        if string_value.endswith('/>'):
+            # an empty string (ex. a translation cleared by a source text change) is written as <string name=".."/>
+            string_values.append((string_element.get('name'), u''))
+            continue
+        string_value = string_value.split('\">')[-1]
+        string_value = string_value[:string_value.index('</string>')]
+        string_values.append((string_element.get('name'), string_value))
+
+    return string_values
+
 
-    pwt("LOADING XML FILES FROM {}".format(res_folder_path), color='y')
+def find_strings_files(res_folder_paths):
+    # type: (List[str]) -> List[str]
+    """
+    Finds the 'strings.xml' files of one or more 'res' folders. Only the 'values*' folders are visited (the drawable,
+    layout, etc. folders are pruned from the walk).
+    :param List[str] res_folder_paths: the 'res' folders (ex. one for every Gradle module)
+    :return: the paths of the found files
+    :rtype: List[str]
+    """
+    file_paths = []  # type: List[str]
+    for res_folder_path in res_folder_paths:
+        for root, dirs, files in walk(res_folder_path):
+            if root == res_folder_path:
+                # skip folders that are not for localized strings
+                dirs[:] = [d for d in dirs if d.startswith('values')]
+            else:
+                dirs[:] = []
 
-    xml_files = []  # type: List[AndroidXmlFile]
-    for root, dirs, files in walk(res_folder_path):
-        for file in files:
-            # skip folders that are not for localized string
             if 'values' not in path.basename(root):
                 continue
-            # skip files that are not 'strings.xml' or 'array.xml'
-            if not file.endswith('strings.xml'):  # and not file.endswith('array.xml'):
-                continue
-            file_path = path.join(root, file)
 
-            xml_files.append(AndroidXmlFile(file_path=file_path, source_language=development_language))
-            pwt("FOUND {}".format(file_path), color='y')
+            for file in files:
+                # skip files that are not 'strings.xml' or 'array.xml'
+                if not file.endswith('strings.xml'):  # and not file.endswith('array.xml'):
+                    continue
+                file_paths.append(path.join(root, file))
+
+    return sorted(file_paths)
+
+
+def _load_android_xml_file(load_args):
+    # type: (Tuple[str, str, ParsedFileCache]) -> AndroidXmlFile
+    """ Process pool entry point (must be a module level function to be picklable) """
+    file_path, development_language, parse_cache = load_args
+    return AndroidXmlFile(file_path=file_path, source_language=development_language, parse_cache=parse_cache)
+
+
+def load_android_xml_files(file_paths, development_language, max_workers=None, parse_cache=None):
+    # type: (List[str], str, int, ParsedFileCache) -> List[AndroidXmlFile]
+    """
+    Parses the provided 'strings.xml' files on a process pool (one process per core by default)
+    :param List[str] file_paths: the files to parse
+    :param str development_language: the development language code
+    :param int max_workers: the number of processes (1 parses the files in the current process)
+    :param ParsedFileCache parse_cache: if provided, the unchanged files are loaded from this cache
+    :return: the parsed files, in the same order as file_paths
+    :rtype: List[AndroidXmlFile]
+    """
+    load_args = [(file_path, development_language, parse_cache) for file_path in file_paths]
 
-    if len(xml_files) == 0:
-        pwt("COULD NOT FIND ANY XML FILES IN {}".format(res_folder_path), color='r')
+    # the cached files are loaded in the current process, only the changed files are worth starting the pool for
+    cache_kind = AndroidXmlFile.cache_kind(development_language)
+    parse_args = [a for a in load_args if parse_cache is None or not parse_cache.contains(a[0], cache_kind)]
+    loaded_files = {a[0]: _load_android_xml_file(a) for a in load_args if a not in parse_args}
+
+    if max_workers == 1 or len(parse_args) < 2:
+        loaded_files.update((a[0], _load_android_xml_file(a)) for a in parse_args)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed_files = executor.map(_load_android_xml_file, parse_args, chunksize=4)
+            loaded_files.update(zip([a[0] for a in parse_args], parsed_files))
+
+    return [loaded_files[file_path] for file_path in file_paths]
+
+
+def import_from_res_folder(res_folder_paths, development_language, max_workers=None, parse_cache=None):
+    # type: (List[str], str, int, ParsedFileCache) -> List[AndroidXmlFile]
+    """
+    Loads all the 'strings.xml' files from one or more 'res' folders and updates the source texts of every language
+    file from the development language file of the same 'res' folder
+    :param res_folder_paths: a 'res' folder path, or a list of 'res' folder paths (ex. one for every Gradle module)
+    :param str development_language: the development language code
+    :param int max_workers: the number of processes used for parsing (defaults to the number of cores)
+    :param ParsedFileCache parse_cache: if provided, the unchanged files are loaded from this cache
+    :rtype: List[AndroidXmlFile]
+    """
+    if not isinstance(res_folder_paths, (list, tuple)):
+        res_folder_paths = [res_folder_paths]
+
+    logger.info("LOADING XML FILES FROM {}".format(', '.join(res_folder_paths)), color='y')
+
+    file_paths = find_strings_files(res_folder_paths)
+    for file_path in file_paths:
+        logger.debug("FOUND {}".format(file_path), color='y')
+
+    if len(file_paths) == 0:
+        logger.error("COULD NOT FIND ANY XML FILES IN {}".format(', '.join(res_folder_paths)))
         exit(1)
 
-    source_language_file = [f for f in xml_files if f.source_language_code == f.target_language_code].pop()
+    xml_files = load_android_xml_files(file_paths, development_language, max_workers=max_workers,
+                                       parse_cache=parse_cache)
+
+    source_language_files = {f.res_folder_path: f for f in xml_files
+                             if f.source_language_code == f.target_language_code}
 
     for xml_file in (f for f in xml_files if f.source_language_code != f.target_language_code):
+        source_language_file = source_language_files.get(xml_file.res_folder_path)
+        if source_language_file is None:
+            logger.error("NO {} STRINGS FILE FOUND IN {}".format(development_language, xml_file.res_folder_path))
+            continue
         xml_file.update_source_language(source_xml_file=source_language_file)
 
     return xml_files
+
+
+def group_strings_files(res_folder_paths, development_language):
+    # type: (List[str], str) -> Dict[str, List[str]]
+    """
+    Finds the 'strings.xml' files of the 'res' folders and groups them by language code, without parsing them
+    :rtype: Dict[str, List[str]]
+    """
+    file_paths = find_strings_files(res_folder_paths)
+    if len(file_paths) == 0:
+        logger.error("COULD NOT FIND ANY XML FILES IN {}".format(', '.join(res_folder_paths)))
+        exit(1)
+
+    file_paths_by_language = {}  # type: Dict[str, List[str]]
+    for file_path in file_paths:
+        logger.debug("FOUND {}".format(file_path), color='y')
+        file_paths_by_language.setdefault(AndroidXmlFile.language_code(file_path, development_language), []).append(
+            file_path)
+    return file_paths_by_language
+
+
+def iter_language_files(file_paths_by_language, development_language_files, development_language, max_workers=None,
+                        parse_cache=None):
+    # type: (Dict[str, List[str]], Dict[str, AndroidXmlFile], str, int, ParsedFileCache) -> Iterator[Tuple[str, List[AndroidXmlFile]]]
+    """
+    Parses the 'strings.xml' files one language at a time (the development language first), so only the files of
+    the languages being processed are in memory
+    :param file_paths_by_language: the result of group_strings_files
+    :param development_language_files: the already loaded development language file of every 'res' folder (only
+                                       the files of these 'res' folders are loaded)
+    :return: yields the language code and the files of every language, with their source texts
+    """
+    yield development_language, list(development_language_files.values())
+
+    for language_code in sorted(file_paths_by_language.keys()):
+        if language_code == development_language:
+            continue
+        yield language_code, load_language_files(file_paths_by_language[language_code], development_language_files,
+                                                 development_language, max_workers=max_workers,
+                                                 parse_cache=parse_cache)
+
+
+def load_language_files(file_paths, development_language_files, development_language, max_workers=None,
+                        parse_cache=None):
+    # type: (List[str], Dict[str, AndroidXmlFile], str, int, ParsedFileCache) -> List[AndroidXmlFile]
+    """
+    Parses the 'strings.xml' files of a language and updates their source texts from the development language file
+    of the same 'res' folder (the files of the 'res' folders without a development language file are skipped)
+    """
+    file_paths = [file_path for file_path in file_paths
+                  if path.dirname(path.dirname(file_path)) in development_language_files]
+    xml_files = load_android_xml_files(file_paths, development_language, max_workers=max_workers,
+                                       parse_cache=parse_cache)
+    for xml_file in xml_files:
+        xml_file.update_source_language(source_xml_file=development_language_files[xml_file.res_folder_path])
+    return xml_files
+
+
+def select_changed_files(file_paths_by_language, development_language_files, git_changes):
+    # type: (Dict[str, List[str]], Dict[str, AndroidXmlFile], GitChanges) -> Dict[str, List[str]]
+    """
+    Keeps only the 'strings.xml' files that can have strings to upload since the --since reference: the files that
+    changed, and all the files of the 'res' folders whose development language file has changed strings (their
+    strings are missing from every language)
+    :param file_paths_by_language: the result of group_strings_files
+    :param development_language_files: the loaded development language file of every 'res' folder
+    :return: the selected files, grouped by language code (the languages without selected files are left out)
+    """
+    changed_res_folders = set(res_folder_path for res_folder_path, f in development_language_files.items()
+                              if len(f.changed_identifiers(git_changes)) > 0)
+
+    selected_paths_by_language = {}  # type: Dict[str, List[str]]
+    for language_code, file_paths in file_paths_by_language.items():
+        selected_paths = [file_path for file_path in file_paths
+                          if git_changes.is_changed(file_path) or
+                          path.dirname(path.dirname(file_path)) in changed_res_folders]
+        if len(selected_paths) > 0:
+            selected_paths_by_language[language_code] = selected_paths
+    return selected_paths_by_language
+
+
+def prefetch_google_sheets_snapshots(gsheets_manager, xml_files):
+    # type: (GoogleSheetsManager, List[AndroidXmlFile]) -> None
+    """
+    Reads the worksheets of all the provided files in advance, with one values.batchGet request per spreadsheet
+    """
+    header_values_by_language = {f.target_language: f.header_values for f in xml_files}
+    gsheets_manager.prefetch_snapshots(platform='android',
+                                       header_values_by_language=header_values_by_language,
+                                       value_render=ValueRenderOption.FORMULA)
+
+
+def prefetch_google_sheets_columns(gsheets_manager, xml_files):
+    # type: (GoogleSheetsManager, List[AndroidXmlFile]) -> None
+    """
+    Reads only the target and string ID columns of all the provided files in advance (used by the import operation)
+    """
+    header_values_by_language = {f.target_language: f.header_values for f in xml_files}
+    column_names_by_language = {f.target_language: [f.target_language_header, AndroidHeaderValues.STRING_ID]
+                                for f in xml_files}
+    gsheets_manager.prefetch_columns(platform='android',
+                                     header_values_by_language=header_values_by_language,
+                                     column_names_by_language=column_names_by_language,
+                                     value_render=ValueRenderOption.FORMULA)
+
+
+def fan_out_development_sources(gsheets_manager, development_language_files, language_codes, git_changes=None):
+    # type: (GoogleSheetsManager, Dict[str, AndroidXmlFile], List[str], GitChanges) -> None
+    """
+    Updates the changed source texts of the development language files in the worksheets of all the provided
+    languages at once (see fan_out_source_changes)
+    :param development_language_files: the loaded development language file of every 'res' folder
+    :param List[str] language_codes: the codes of the languages to update (ex. all the languages of the project)
+    :param GitChanges git_changes: in --since mode, only the strings changed since the reference are compared
+    """
+    if len(development_language_files) == 0:
+        logger.warning(u'NO DEVELOPMENT LANGUAGE FILE FOUND, THE SOURCE TEXTS ARE NOT UPDATED',
+                       event='fan_out_skipped')
+        return
+
+    development_language_file = next(iter(development_language_files.values()))
+    source_texts = {}  # type: Dict[str, str]
+    development_targets = {}  # type: Dict[str, str]
+    for dev_language_file in development_language_files.values():
+        identifiers = dev_language_file.changed_identifiers(git_changes) if git_changes is not None else None
+        for t_unit in dev_language_file.translation_units:
+            if identifiers is None or t_unit.identifier in identifiers:
+                source_texts[t_unit.identifier] = t_unit.source_text
+                development_targets[t_unit.identifier] = t_unit.target_text
+
+    source_language = development_language_file.source_language
+    header_values_by_language = {get_language_name(code): AndroidXmlFile.worksheet_header_values(
+        source_language, get_language_name(code)) for code in language_codes}
+    fan_out_source_changes(gsheets_manager, platform='android', header_values_by_language=header_values_by_language,
+                           key_header=AndroidHeaderValues.STRING_ID, source_texts=source_texts,
+                           development_language=source_language, development_targets=development_targets)
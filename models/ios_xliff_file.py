@@ -1,26 +1,35 @@
+import os
+import re
 import sys
 
 from os import path
 from lxml import etree
-from typing import List, Dict, Any, Union, Tuple
+from typing import List, Dict, Any, Union, Tuple, Set
 from utils.gs_header_types import IosHeaderValues
-from utils.utils import pwt, get_language_name, get_language_code
+from utils.utils import get_language_name, get_language_code
+from utils.logger import logger
 from models.translation_units import XliffTranslationUnit
+from utils.parse_cache import ParsedFileCache
+from utils.git_changes import GitChanges
+from utils.placeholders import PlaceholderCheck, find_placeholder_mismatches
 from pygsheets.custom_types import ValueRenderOption
 from pygsheets import Worksheet
+from cloud_managers.change_set import ChangeSet
 from cloud_managers.google_sheets_manager import GoogleSheetsManager
+from models.shared_strings import SharedStrings, normalize_source_text
+from models.source_changes import fan_out_source_changes
 
 
 class IosXliffFile(object):
 
-    def __init__(self, file_path):
-        # type: (str) -> IosXliffFile
+    def __init__(self, file_path, parse_cache=None):
+        # type: (str, ParsedFileCache) -> IosXliffFile
         self.source_language = None  # type: str
         self.target_language = None  # type: str
         self.translation_units = []  # type: List[XliffTranslationUnit]
         self.original_file_path = file_path  # type: str
         self.has_updates = False  # type: bool
-        self.load(file_path=file_path)
+        self.load(file_path=file_path, parse_cache=parse_cache)
 
     @property
     def untranslated(self):
@@ -42,18 +51,41 @@ class IosXliffFile(object):
         """
         :return: A list of strings that represent the worksheet header values.
         """
-        return [self.source_language_header,
-                self.target_language_header,
+        return IosXliffFile.worksheet_header_values(self.source_language, self.target_language)
+
+    @staticmethod
+    def worksheet_header_values(source_language, target_language):
+        # type: (str, str) -> List[str]
+        """
+        :return: the header of the worksheet of a language (the language names, ex. English and Spanish)
+        """
+        return [IosHeaderValues.SOURCE_LANGUAGE.format(source_language),
+                IosHeaderValues.TARGET_LANGUAGE.format(target_language),
                 IosHeaderValues.EXAMPLE,
                 IosHeaderValues.COMMENT,
                 IosHeaderValues.KEY,
                 IosHeaderValues.PATH]
 
-    def load(self, file_path):
+    @property
+    def import_column_names(self):
+        """
+        :return: the header values of the columns that are read when importing translations from the worksheet
+        """
+        return [self.source_language_header, self.target_language_header, IosHeaderValues.KEY]
+
+    def load(self, file_path, parse_cache=None):
         """
         Updates its properties by loading and parsing an XLIFF file
         :param str file_path: The XLIFF file path
+        :param ParsedFileCache parse_cache: if provided, the file is loaded from this cache when it has not changed
         """
+        xliff_file_path = file_path
+        if parse_cache is not None:
+            cached_data = parse_cache.load(xliff_file_path, 'xliff')
+            if cached_data is not None:
+                self.source_language, self.target_language, self.translation_units = cached_data
+                return
+
         xliff_root = etree.parse(file_path).getroot()
 
         for file_element in xliff_root.iter('{urn:oasis:names:tc:xliff:document:1.2}file'):
@@ -96,124 +128,284 @@ class IosXliffFile(object):
 
                 self.translation_units.append(t_unit)
 
-    def sync_with_google_sheets(self, gsheets_manager, remove_unused_strings):
-        """
-        Updates the corresponding worksheet with self.translation_units. It adds missing strings to the worksheet and
-        updates any source text that has changed. This function does not remove any unused strings from Google Sheets.
+        if parse_cache is not None:
+            parse_cache.save(xliff_file_path, 'xliff',
+                             (self.source_language, self.target_language, self.translation_units))
 
-        :param remove_unused_strings:
-        :param gsheets_manager: a GoogleSheetsManager instance that is authorized to make changes in the corresponding
-                                worksheet
-        :type gsheets_manager: GoogleSheetsManager
-
-        :rtype: None
+    def changed_identifiers(self, git_changes, project_path):
+        # type: (GitChanges, str) -> Set[str]
+        """
+        :param GitChanges git_changes: the files changed since the --since reference
+        :param str project_path: the folder of the Xcode project (the paths of the XLIFF file are relative to it)
+        :return: the keys of the units added or changed since the reference. The '.strings' files are compared key
+        by key, all the units of the other changed files (storyboards, '.stringsdict', ...) are included. The units
+        extracted from the source code (their file is not in the project) are included when a source file changed.
         """
+        source_code_changed = any(p.endswith(SOURCE_CODE_EXTENSIONS) for p in git_changes.changed_paths)
 
-        pwt("SYNCING {} WITH GOOGLE SHEETS".format(self.original_file_path), color='y')
+        units_by_file_path = {}  # type: Dict[str, List[XliffTranslationUnit]]
+        for t_unit in self.translation_units:
+            units_by_file_path.setdefault(t_unit.file_path, []).append(t_unit)
+
+        changed_identifiers = set()  # type: Set[str]
+        for unit_file_path, t_units in units_by_file_path.items():
+            unit_file_path = path.join(project_path, unit_file_path)
+            if not path.isfile(unit_file_path):
+                if source_code_changed:
+                    changed_identifiers.update(u.identifier for u in t_units)
+            elif unit_file_path.endswith('.strings'):
+                changed_keys = git_changes.changed_units(unit_file_path, parse_units=parse_strings_file)
+                changed_identifiers.update(u.identifier for u in t_units if u.identifier in changed_keys)
+            elif git_changes.is_changed(unit_file_path):
+                changed_identifiers.update(u.identifier for u in t_units)
+        return changed_identifiers
+
+    def plan_sync(self, gsheets_manager, remove_unused_strings, identifiers=None):
+        """
+        Compares self.translation_units with a snapshot of the corresponding worksheet, without changing anything.
+
+        :param bool remove_unused_strings: if True, the rows that are not in the XLIFF file are planned for deletion
+        :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheet
+        :param Set[str] identifiers: if provided, only the units with these keys are added or have their source text
+                                     updated (the deletions still compare every unit)
+        :return: the missing rows, the source text updates and the deletions, as a ChangeSet
+        :rtype: ChangeSet
+        """
         lang_ws = gsheets_manager.get_worksheet(platform='ios', language=self.target_language,
                                                 header_values=self.header_values)  # type: Worksheet
 
-        ws_records = lang_ws.get_all_records(numericise_data=False, value_render=ValueRenderOption.UNFORMATTED_VALUE)
-        ws_records_ids = [r[IosHeaderValues.KEY] for r in ws_records]
-
-        records_to_add = [u.record_value for u in self.translation_units if u.identifier not in ws_records_ids]
-        if len(records_to_add) > 0:
-            lang_ws.insert_rows(row=lang_ws.rows, number=len(records_to_add), values=records_to_add, inherit=True)
+        ws_snapshot = gsheets_manager.get_snapshot(lang_ws, value_render=ValueRenderOption.UNFORMATTED_VALUE)
+        ws_records = ws_snapshot.records()
+        ws_records_ids = set(r[IosHeaderValues.KEY] for r in ws_records)
+        t_units_by_id = {u.identifier: u for u in self.translation_units}
 
-        if remove_unused_strings:
-            stings_to_remove = []
-            for t_unit in ws_records:
-                match = next((u for u in self.translation_units if u.identifier == t_unit[IosHeaderValues.KEY]), None)
-                if match is None:
-                    stings_to_remove.append(t_unit)
+        change_set = ChangeSet(worksheet=lang_ws, snapshot=ws_snapshot)
+        change_set.new_rows = [u.record_value for u in self.translation_units if u.identifier not in ws_records_ids and
+                               (identifiers is None or u.identifier in identifiers)]
 
-            for t_unit in stings_to_remove:
-                t_unit_index = ws_records.index(t_unit)
-                lang_ws.delete_rows(t_unit_index + 2)
-                pwt(u'DELETED {} ({}) [FROM ROW {}]'.format(t_unit[IosHeaderValues.KEY],
-                                                            t_unit[self.source_language_header],
-                                                            t_unit_index), color='r')
-                ws_records.remove(t_unit)
+        source_col = ws_snapshot.column_index(self.source_language_header) + 1
+        target_col = ws_snapshot.column_index(self.target_language_header) + 1
 
         for idx, t_unit in enumerate(ws_records):
-            match = next((u for u in self.translation_units if u.identifier == t_unit[IosHeaderValues.KEY]), None)
+            match = t_units_by_id.get(t_unit[IosHeaderValues.KEY])
 
-            if match is not None and match.source_text != t_unit[self.source_language_header]:
-                source_cell_address = 'A{}'.format(idx + 2)
-                target_cell_address = 'B{}'.format(idx + 2)
-                lang_ws.update_value(source_cell_address, match.source_text)
-                lang_ws.update_value(target_cell_address, '')
-                pwt(u'UPDATED SOURCE TEXT FOR {} FROM {} TO {}'.format(t_unit[IosHeaderValues.KEY],
-                                                                      t_unit[self.source_language_header],
-                                                                      match.source_text), color='g')
+            if match is None:
+                if remove_unused_strings:
+                    change_set.deletions.append(idx + 2)
+            elif identifiers is not None and match.identifier not in identifiers:
+                continue
+            elif match.source_text != t_unit[self.source_language_header]:
+                change_set.update_cell(row=idx + 2, col=source_col, value=match.source_text)
+                change_set.update_cell(row=idx + 2, col=target_col, value='')
 
-        lang_ws.sort_range((2, 1), (lang_ws.rows, lang_ws.cols))
+        return change_set
 
-        for r_to_add in records_to_add:
-            pwt(u"ADDED {} TO {} - {}".format(r_to_add, lang_ws.spreadsheet.title, lang_ws.title), color='g')
+    def sync_with_google_sheets(self, gsheets_manager, remove_unused_strings, identifiers=None):
+        """
+        Updates the corresponding worksheet with self.translation_units. It adds missing strings to the worksheet and
+        updates any source text that has changed. Unused strings are removed only if remove_unused_strings is True.
 
-        pwt(u"ADDED {} RECORDS TO {} - {}".format(len(records_to_add), lang_ws.spreadsheet.title, lang_ws.title), color='g')
+        :param remove_unused_strings:
+        :param gsheets_manager: a GoogleSheetsManager instance that is authorized to make changes in the corresponding
+                                worksheet
+        :type gsheets_manager: GoogleSheetsManager
+        :param Set[str] identifiers: if provided, only the units with these keys are synced (see plan_sync)
 
-        pass
+        :rtype: None
+        """
 
-    def update_from_google_sheets(self, gsheets_manager):
+        logger.info("SYNCING {} WITH GOOGLE SHEETS".format(self.original_file_path), color='y')
+        change_set = self.plan_sync(gsheets_manager=gsheets_manager, remove_unused_strings=remove_unused_strings,
+                                    identifiers=identifiers)
+        shared_change_sets = []  # type: List[ChangeSet]
+        if gsheets_manager.shared_sources:
+            shared_strings = self.shared_strings(gsheets_manager)
+            shared_change_sets = shared_strings.plan_dedup(change_set=change_set, platform='ios')
+            gsheets_manager.highlighting.add_translation_rules(worksheet=shared_strings.worksheet,
+                                                               source_col=0, target_col=1)
+        if not gsheets_manager.dry_run:
+            self.log_sync_change_set(change_set)
+
+        ws_snapshot = change_set.snapshot
+        source_col = ws_snapshot.column_index(self.source_language_header)
+        key_col = ws_snapshot.column_index(IosHeaderValues.KEY)
+        changed_keys = [ws_snapshot.rows[c.row - 2][key_col] for c in change_set.cell_updates if c.col == source_col + 1]
+
+        gsheets_manager.apply_change_sets([change_set] + shared_change_sets)
+        target_col = ws_snapshot.column_index(self.target_language_header)
+        gsheets_manager.highlighting.add_translation_rules(worksheet=change_set.worksheet,
+                                                           source_col=source_col, target_col=target_col)
+        gsheets_manager.highlighting.add_changed_sources(snapshot=ws_snapshot, key_header=IosHeaderValues.KEY,
+                                                         keys=changed_keys, source_col=source_col,
+                                                         target_col=target_col)
+
+    def log_sync_change_set(self, change_set):
         """
-        Updates its own properties (translation units) from the corresponding Google worksheet
-        :param GoogleSheetsManager gsheets_manager: a GoogleSheetsManager instance that is authorized to make changes in the corresponding
-                                                    worksheet
+        Prints the changes planned by plan_sync, in terms of string keys and source texts
+        :param ChangeSet change_set: a change set returned by plan_sync
+        """
+        ws_records = change_set.snapshot.records()
+
+        for row_number in change_set.deletions:
+            t_unit = ws_records[row_number - 2]
+            logger.debug(u'DELETED {} ({}) [FROM ROW {}]'.format(t_unit[IosHeaderValues.KEY],
+                                                                 t_unit[self.source_language_header],
+                                                                 row_number), color='r',
+                         event='row_deleted', worksheet=change_set.title, key=t_unit[IosHeaderValues.KEY])
+
+        source_col = change_set.snapshot.column_index(self.source_language_header) + 1
+        source_updates = [c for c in change_set.cell_updates if c.col == source_col]
+        for cell_update in source_updates:
+            t_unit = ws_records[cell_update.row - 2]
+            logger.debug(u'UPDATED SOURCE TEXT FOR {} FROM {} TO {}'.format(t_unit[IosHeaderValues.KEY],
+                                                                           t_unit[self.source_language_header],
+                                                                           cell_update.value), color='g',
+                         event='source_updated', worksheet=change_set.title, key=t_unit[IosHeaderValues.KEY])
+
+        for r_to_add in change_set.new_rows:
+            logger.debug(u"ADDED {} TO {}".format(r_to_add, change_set.title), color='g',
+                         event='row_added', worksheet=change_set.title, row=r_to_add)
+
+        if len(change_set.deletions) > 0:
+            logger.info(u"DELETED {} RECORDS FROM {}".format(len(change_set.deletions), change_set.title), color='r',
+                        event='rows_deleted', worksheet=change_set.title, count=len(change_set.deletions))
+        if len(source_updates) > 0:
+            logger.info(u"UPDATED {} SOURCE TEXTS IN {}".format(len(source_updates), change_set.title), color='g',
+                        event='sources_updated', worksheet=change_set.title, count=len(source_updates))
+        logger.info(u"ADDED {} RECORDS TO {}".format(len(change_set.new_rows), change_set.title), color='g',
+                    event='rows_added', worksheet=change_set.title, file=self.original_file_path,
+                    count=len(change_set.new_rows))
+
+    def shared_strings(self, gsheets_manager):
         """
+        :param GoogleSheetsManager gsheets_manager: the manager used to read and write the worksheets
+        :return: the shared worksheet (source texts used by both platforms) of the target language
+        :rtype: SharedStrings
+        """
+        return SharedStrings(gsheets_manager=gsheets_manager,
+                             source_language=self.source_language,
+                             target_language=self.target_language)
 
-        pwt("UPDATING {}".format(self.original_file_path), color='y')
+    def plan_update_from_google_sheets(self, gsheets_manager, placeholder_check=PlaceholderCheck.BLOCK):
+        """
+        Updates its own properties (translation units) from the corresponding Google worksheet and plans the write of
+        the XLIFF file
+        :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheet
+        :param str placeholder_check: what to do with the translations whose placeholders differ from the source text
+                                      (see PlaceholderCheck)
+        :return: a ChangeSet containing the local file write (empty if nothing was translated)
+        :rtype: ChangeSet
+        """
         online_translation_units = self.__get_google_sheets_translation_units(gsheets_manager=gsheets_manager)
+        # the translations are compared with the source texts of the XLIFF file
+        offline_source_texts = {u.identifier: u.source_text for u in self.translation_units}
+        blocked_keys = find_placeholder_mismatches([(u.identifier, offline_source_texts[u.identifier], u.target_text)
+                                                    for u in online_translation_units
+                                                    if u.identifier in offline_source_texts and u.is_translated()],
+                                                   file_path=self.original_file_path,
+                                                   placeholder_check=placeholder_check)
+
+        # the blocked translations are left out, the XLIFF file keeps its previous translation
+        online_units_by_id = {}  # type: Dict[str, XliffTranslationUnit]
+        for online_unit in online_translation_units:
+            if online_unit.identifier not in blocked_keys:
+                online_units_by_id.setdefault(online_unit.identifier, online_unit)
         self.has_updates = False
 
         mismatched_records = []
         for offline_t_unit in self.translation_units:
-            online_t_units = [u for u in online_translation_units if u.identifier == offline_t_unit.identifier]
+            online_t_unit = online_units_by_id.get(offline_t_unit.identifier)
 
-            if len(online_t_units) == 0:
-                mismatched_records.append(offline_t_unit)
-            elif online_t_units[0].target_text != offline_t_unit.target_text:
-                offline_t_unit.target_text = online_t_units[0].target_text
+            if online_t_unit is None:
+                if offline_t_unit.identifier not in blocked_keys:
+                    mismatched_records.append(offline_t_unit)
+            elif online_t_unit.target_text != offline_t_unit.target_text:
+                offline_t_unit.target_text = online_t_unit.target_text
                 mismatched_records.append(offline_t_unit)
 
+        translated_count = 0
         for t_unit in mismatched_records:
-            matched_units = [online_unit for online_unit in online_translation_units if
-                             online_unit.identifier == t_unit.identifier]
-            if len(matched_units) > 0 and matched_units[0].is_translated():
-                pwt(u"TRANSLATED: {}".format(matched_units[0]), color='g')
-                t_unit.target_text = matched_units[0].target_text
+            matched_unit = online_units_by_id.get(t_unit.identifier)
+            if matched_unit is not None and matched_unit.is_translated():
+                logger.debug(u"TRANSLATED: {}".format(matched_unit), color='g', event='unit_translated',
+                             file=self.original_file_path, key=matched_unit.identifier)
+                t_unit.target_text = matched_unit.target_text
                 self.has_updates = True
+                translated_count += 1
 
-        self.update_source_xml()
+        logger.info(u"TRANSLATED {} UNITS IN {}".format(translated_count, self.original_file_path), color='g',
+                    event='units_translated', file=self.original_file_path, count=translated_count)
 
-    def update_from_google_sheets_memory(self, gsheets_manager):
+        change_set = ChangeSet(worksheet=None)
+        change_set.write_file(file_path=self.original_file_path,
+                              description='{} TRANSLATED UNITS'.format(translated_count),
+                              writer=self.update_source_xml)
+        return change_set
+
+    def update_from_google_sheets(self, gsheets_manager, placeholder_check=PlaceholderCheck.BLOCK):
         """
         Updates its own properties (translation units) from the corresponding Google worksheet
         :param GoogleSheetsManager gsheets_manager: a GoogleSheetsManager instance that is authorized to make changes in the corresponding
                                                     worksheet
+        :param str placeholder_check: see plan_update_from_google_sheets
+        :return: the applied changes (the write of the XLIFF file)
+        :rtype: ChangeSet
         """
 
-        pwt("UPDATING {}".format(self.original_file_path), color='y')
+        logger.info("UPDATING {}".format(self.original_file_path), color='y')
+        change_set = self.plan_update_from_google_sheets(gsheets_manager=gsheets_manager,
+                                                         placeholder_check=placeholder_check)
+        gsheets_manager.apply_change_set(change_set)
+        return change_set
 
+    def plan_update_from_google_sheets_memory(self, gsheets_manager):
+        """
+        Plans the translation of the untranslated rows with the targets of already translated rows that have the same
+        source text (translation memory)
+        :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheet
+        :return: the target cell updates, as a ChangeSet
+        :rtype: ChangeSet
+        """
         lang_ws = gsheets_manager.get_worksheet(platform='ios', language=self.target_language,
                                                 header_values=self.header_values)  # type: Worksheet
-        ws_records = lang_ws.get_all_records(numericise_data=False, value_render=ValueRenderOption.UNFORMATTED_VALUE)
-        ws_records_ids = [r[IosHeaderValues.KEY] for r in ws_records]
-
         online_translation_units = self.__get_google_sheets_translation_units(gsheets_manager=gsheets_manager)  # type: List[XliffTranslationUnit]
 
-        untranslated_units = [u for u in online_translation_units if u.is_translated() is False]
-
-        for untranslated_unit in untranslated_units:
-            match = next((u for u in online_translation_units if u.source_text == untranslated_unit.source_text and u.is_translated()), None)
-            if match is not None:
-                for idx, record_id in enumerate(ws_records_ids):
-                    if record_id == untranslated_unit.identifier:
-                        target_cell_address = 'B{}'.format(idx + 2)
+        # the rows of the keys come from the columns that were just read, the worksheet is not read again
+        row_index = gsheets_manager.get_row_index(lang_ws, header_values=self.header_values,
+                                                  key_header=IosHeaderValues.KEY,
+                                                  value_render=ValueRenderOption.UNFORMATTED_VALUE)
+        target_col = self.header_values.index(self.target_language_header) + 1
+
+        translation_memory = {}  # type: Dict[str, XliffTranslationUnit]
+        for online_unit in online_translation_units:
+            if online_unit.is_translated():
+                translation_memory.setdefault(online_unit.source_text, online_unit)
+
+        change_set = ChangeSet(worksheet=lang_ws, snapshot=row_index.snapshot)
+        for untranslated_unit in (u for u in online_translation_units if u.is_translated() is False):
+            match = translation_memory.get(untranslated_unit.source_text)
+            row_number = row_index.row_number(untranslated_unit.identifier)
+            if match is not None and row_number is not None:
                 untranslated_unit.target_text = match.target_text
-                lang_ws.update_value(target_cell_address, match.target_text)
-                pwt(u"TRANSLATED: {}".format(untranslated_unit), color='g')
+                change_set.update_cell(row=row_number, col=target_col, value=match.target_text)
+                logger.debug(u"TRANSLATED: {}".format(untranslated_unit), color='g', event='unit_translated',
+                             worksheet=change_set.title, key=untranslated_unit.identifier)
+
+        logger.info(u"TRANSLATED {} UNITS FROM THE TRANSLATION MEMORY OF {}".format(len(change_set.cell_updates),
+                                                                                  change_set.title), color='g',
+                    event='units_translated', worksheet=change_set.title, count=len(change_set.cell_updates))
+        return change_set
+
+    def update_from_google_sheets_memory(self, gsheets_manager):
+        """
+        Updates its own properties (translation units) from the corresponding Google worksheet
+        :param GoogleSheetsManager gsheets_manager: a GoogleSheetsManager instance that is authorized to make changes in the corresponding
+                                                    worksheet
+        """
+
+        logger.info("UPDATING {}".format(self.original_file_path), color='y')
+        change_set = self.plan_update_from_google_sheets_memory(gsheets_manager=gsheets_manager)
+        gsheets_manager.apply_change_set(change_set)
 
         self.update_from_google_sheets(gsheets_manager=gsheets_manager)
 
@@ -228,70 +420,127 @@ class IosXliffFile(object):
         lang_ws = gsheets_manager.get_worksheet(platform='ios',
                                                 language=self.target_language,
                                                 header_values=self.header_values)
-        ws_records = lang_ws.get_all_records(numericise_data=False, value_render=ValueRenderOption.UNFORMATTED_VALUE)
+        ws_rows = gsheets_manager.fetch_columns(lang_ws,
+                                                header_values=self.header_values,
+                                                column_names=self.import_column_names,
+                                                value_render=ValueRenderOption.UNFORMATTED_VALUE)
 
         xliff_translation_units = []
 
-        if len(ws_records) == 0:
-            return xliff_translation_units
-
         source_language_code = get_language_code(self.source_language)
         target_language_code = get_language_code(self.target_language)
 
-        for record in ws_records:
+        # the Example, Comment and File Path columns are not needed for importing, so they are not fetched
+        for source_text, target_text, identifier in ws_rows:
 
-            xliff_translation_unit = XliffTranslationUnit(source_text=record[self.source_language_header],
-                                                          target_text=record[self.target_language_header],
-                                                          example_text=record[IosHeaderValues.EXAMPLE],
-                                                          notes=record[IosHeaderValues.COMMENT],
-                                                          identifier=record[IosHeaderValues.KEY],
-                                                          file_path=record[IosHeaderValues.PATH],
+            xliff_translation_unit = XliffTranslationUnit(source_text=source_text,
+                                                          target_text=target_text,
+                                                          example_text='',
+                                                          notes='',
+                                                          identifier=identifier,
+                                                          file_path='',
                                                           source_language=source_language_code,
                                                           target_language=target_language_code,
                                                           friendly_source_language=self.source_language,
                                                           friendly_target_language=self.target_language)
             xliff_translation_units.append(xliff_translation_unit)
 
-        return xliff_translation_units
-
-    def update_source_xml(self):
-        """
-        Overwrites the source XLIFF file to match the current state of the model
-        """
-
-        xliff_tree = etree.parse(self.original_file_path)
-        xliff_root = xliff_tree.getroot()
+        if not gsheets_manager.shared_sources:
+            return xliff_translation_units
 
+        # the strings are matched with the shared worksheet by source text. The rows of the iOS worksheet whose source
+        # text is shared are kept read-only: their translation is taken from the shared worksheet.
+        units_by_key = {u.identifier: u for u in xliff_translation_units}
+        shared_translations = self.shared_strings(gsheets_manager).translations()
         for t_unit in self.translation_units:
-            t_unit_id = t_unit.identifier.replace('\"', '&quot;').replace('\n', '&#10;')
+            target_text = shared_translations.get(normalize_source_text(t_unit.source_text))
+            if target_text is None:
+                continue
+            if t_unit.identifier in units_by_key:
+                units_by_key[t_unit.identifier].target_text = target_text
+                continue
 
-            xml_search_query = u'.//{{urn:oasis:names:tc:xliff:document:1.2}}trans-unit[@id=\"{}\"]'.format(t_unit_id)
-            xml_t_unit_node = xliff_root.find(xml_search_query)
+            xliff_translation_unit = XliffTranslationUnit(source_text=t_unit.source_text,
+                                                          target_text=target_text,
+                                                          example_text='',
+                                                          notes='',
+                                                          identifier=t_unit.identifier,
+                                                          file_path='',
+                                                          source_language=source_language_code,
+                                                          target_language=target_language_code,
+                                                          friendly_source_language=self.source_language,
+                                                          friendly_target_language=self.target_language)
+            xliff_translation_units.append(xliff_translation_unit)
+            units_by_key[t_unit.identifier] = xliff_translation_unit
 
-            if xml_t_unit_node is None:
-                continue
+        return xliff_translation_units
 
-            target_node = xml_t_unit_node.find('{urn:oasis:names:tc:xliff:document:1.2}target')
-
-            if target_node is None and t_unit.is_translated():
-                target_node = etree.Element('target')
-                target_node.text = unicode(t_unit.target_text)
-                xml_t_unit_node.append(target_node)
-            elif target_node is not None and target_node.text is not None and target_node.text != t_unit.target_text:
-                if t_unit.is_translated():
-                    target_node.text = unicode(t_unit.target_text)
-                else:
-                    target_node.getparent().remove(target_node)
-            elif target_node is not None and target_node.text is None and target_node.text != t_unit.target_text:
-                if t_unit.is_translated():
-                    target_node.text = unicode(t_unit.target_text)
-                else:
-                    target_node.getparent().remove(target_node)
-
-        xliff_tree.write(self.original_file_path,
-                         encoding='utf-8',
-                         pretty_print=True,
-                         xml_declaration=True)
+    def update_source_xml(self):
+        """
+        Overwrites the source XLIFF file to match the current state of the model. The file is streamed: it is read
+        with iterparse and written with an incremental writer, one trans-unit at a time, so only the trans-unit being
+        written is in memory (the '<target>' of the updated trans-units is replaced, the rest is copied as it is)
+        """
+        t_units_by_key = {(u.file_path, u.identifier): u for u in self.translation_units}
+        temp_file_path = u'{}.tmp'.format(self.original_file_path)
+
+        with open(temp_file_path, 'wb') as out_file:
+            # the comments and processing instructions after the root element (the incremental writer does not accept
+            # nodes after the root element, they are written once it is closed)
+            trailing_nodes = []  # type: List[Any]
+
+            with etree.xmlfile(out_file, encoding='utf-8') as xml_writer:
+                xml_writer.write_declaration()
+                # the XLIFF elements that contain trans-units, with their writer contexts
+                open_elements = []  # type: List[Tuple[Any, Any]]
+                file_path = None
+                root_written = False
+
+                for event, element in etree.iterparse(self.original_file_path,
+                                                      events=('start', 'end', 'comment', 'pi')):
+                    parent = element.getparent()
+                    is_child_of_open_element = len(open_elements) > 0 and parent is open_elements[-1][0]
+
+                    if event == 'start':
+                        if element.tag in XLIFF_CONTAINER_TAGS and (parent is None or is_child_of_open_element):
+                            if parent is not None:
+                                write_preceding_text(xml_writer, element)
+                            element_context = xml_writer.element(element.tag, xml_attributes(element),
+                                                                 nsmap=element.nsmap if parent is None else None)
+                            element_context.__enter__()
+                            open_elements.append((element, element_context))
+                            root_written = True
+                            if element.tag == XLIFF_NAMESPACE + 'file':
+                                file_path = element.get('original')
+                    elif parent is None and event != 'end':
+                        # a comment or a processing instruction before or after the root element
+                        if root_written:
+                            trailing_nodes.append(element)
+                        else:
+                            xml_writer.write(element, pretty_print=True)
+                    elif len(open_elements) > 0 and element is open_elements[-1][0]:
+                        # the text between the last child and the end tag
+                        xml_writer.write(element[-1].tail if len(element) > 0 and element[-1].tail
+                                         else element.text or '')
+                        open_elements.pop()[1].__exit__(None, None, None)
+                        release_written_element(element)
+                    elif is_child_of_open_element:
+                        if element.tag == XLIFF_NAMESPACE + 'trans-unit':
+                            t_unit = t_units_by_key.get((file_path, element.get('id')))
+                            if t_unit is not None:
+                                update_target_element(element, t_unit)
+                        write_preceding_text(xml_writer, element)
+                        write_element(xml_writer, element)
+                        release_written_element(element)
+
+            for trailing_node in trailing_nodes:
+                out_file.write(b'\n' + etree.tostring(trailing_node, encoding='utf-8', with_tail=False))
+
+        try:
+            os.replace(temp_file_path, self.original_file_path)
+        except AttributeError:
+            os.remove(self.original_file_path)
+            os.rename(temp_file_path, self.original_file_path)
 
     def import_in_xcode(self, xcodeproj_path):
         """
@@ -304,23 +553,158 @@ class IosXliffFile(object):
         xcb_params = ['-importLocalizations', '-localizationPath', self.original_file_path,
                       '-project', xcodeproj_path]
 
-        pwt("IMPORTING {} INTO {}".format(self.original_file_path, path.basename(path.normpath(xcodeproj_path))), color='y')
+        logger.info("IMPORTING {} INTO {}".format(self.original_file_path, path.basename(path.normpath(xcodeproj_path))), color='y')
         xcb = subprocess.Popen(['xcodebuild'] + xcb_params, stdout=subprocess.PIPE)
         xcb.wait()
 
 
-def export_xliff_files(xcodeproj_path, languages, output_dir):
+XLIFF_NAMESPACE = '{urn:oasis:names:tc:xliff:document:1.2}'
+XML_NAMESPACE = '{http://www.w3.org/XML/1998/namespace}'
+# the XLIFF elements that can contain trans-units (they are opened and closed by the streaming writer)
+XLIFF_CONTAINER_TAGS = set(XLIFF_NAMESPACE + tag for tag in ('xliff', 'file', 'body', 'group'))
+
+
+def update_target_element(trans_unit_element, t_unit):
+    # type: (Any, XliffTranslationUnit) -> None
+    """
+    Replaces the '<target>' of a trans-unit element with the target text of the unit (removes it if the unit is not
+    translated)
+    """
+    target_element = trans_unit_element.find(XLIFF_NAMESPACE + 'target')
+
+    if target_element is None and t_unit.is_translated():
+        target_element = etree.Element(XLIFF_NAMESPACE + 'target')
+        target_element.text = u'{}'.format(t_unit.target_text)
+        source_element = trans_unit_element.find(XLIFF_NAMESPACE + 'source')
+        if source_element is not None:
+            # the target follows the source, with the same indentation
+            target_element.tail = source_element.tail
+            source_element.addnext(target_element)
+        else:
+            trans_unit_element.append(target_element)
+    elif target_element is not None and target_element.text != t_unit.target_text:
+        if t_unit.is_translated():
+            target_element.text = u'{}'.format(t_unit.target_text)
+        else:
+            # keep the text that followed the removed element
+            previous_element = target_element.getprevious()
+            if previous_element is not None:
+                previous_element.tail = target_element.tail
+            trans_unit_element.remove(target_element)
+
+
+def xml_attributes(element):
+    # type: (Any) -> Dict[str, str]
+    """
+    :return: the attributes of an element, for the incremental writer (which would bind the 'xml' namespace to a new
+    prefix instead of using the reserved 'xml' prefix, ex. for xml:space)
+    """
+    return {(u'xml:' + name[len(XML_NAMESPACE):] if name.startswith(XML_NAMESPACE) else name): value
+            for name, value in element.attrib.items()}
+
+
+def write_element(xml_writer, element):
+    # type: (Any, Any) -> None
+    """
+    Writes an element and its children (without its tail). The elements are written one by one, so the namespaces
+    declared by the open elements are not declared again.
+    """
+    if isinstance(element, (etree._Comment, etree._ProcessingInstruction, etree._Entity)):
+        xml_writer.write(element, with_tail=False)
+        return
+
+    with xml_writer.element(element.tag, xml_attributes(element)):
+        if element.text:
+            xml_writer.write(element.text)
+        for child_element in element:
+            write_element(xml_writer, child_element)
+            if child_element.tail:
+                xml_writer.write(child_element.tail)
+
+
+def write_preceding_text(xml_writer, element):
+    # type: (Any, Any) -> None
+    """
+    Writes the text between an element and its previous sibling (or the start tag of its parent), usually the
+    indentation
+    """
+    previous_element = element.getprevious()
+    preceding_text = previous_element.tail if previous_element is not None else element.getparent().text
+    if preceding_text:
+        xml_writer.write(preceding_text)
+
+
+def release_written_element(element):
+    # type: (Any) -> None
+    """
+    Frees an element that was written and its previous siblings (its tail is kept, it is written before the next
+    sibling)
+    """
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+# the source files that 'xcodebuild' extracts localized strings from (ex. NSLocalizedString)
+SOURCE_CODE_EXTENSIONS = ('.swift', '.m', '.mm', '.h', '.c', '.cpp')
+# the files of the development language the localizations are exported from
+EXPORT_INPUT_EXTENSIONS = SOURCE_CODE_EXTENSIONS + ('.storyboard', '.xib', '.strings', '.stringsdict')
+
+# a "key" = "value"; entry of a '.strings' file, or a comment (matched so the entries in comments are skipped)
+STRINGS_ENTRY_REGEX = re.compile(r'/\*.*?\*/|//[^\n]*|"((?:[^"\\]|\\.)*)"\s*=\s*"((?:[^"\\]|\\.)*)"\s*;', re.S)
+
+
+def parse_strings_file(file_content):
+    # type: (str) -> Dict[str, str]
+    """
+    :param str file_content: the content of a '.strings' file
+    :return: the values of the file, by key (the escape sequences are kept as written)
+    """
+    return {m.group(1): m.group(2) for m in STRINGS_ENTRY_REGEX.finditer(file_content) if m.group(1) is not None}
+
+
+def get_xliff_file_path(localizations_dir, language):
+    """
+    :param str localizations_dir: the directory where 'xcodebuild' exports the localizations
+    :param str language: the language code
+    :return: the path of the XLIFF file exported by 'xcodebuild' for the language
+    :rtype: str
+    """
+    return path.join(localizations_dir, '{}.xcloc/'.format(language), 'Localized Contents', '{}.xliff'.format(language))
+
+
+def export_xliff_files(xcodeproj_path, languages, output_dir, parse_cache=None):
     """
     Runs 'xcodebuild' to export localizations from the source Xcode project
     :param str xcodeproj_path: the path of the 'xcodeproj' file of the source project
     :param List[str] languages: a list of language codes to export localizations for
     :param str output_dir: path to a location where the XLIFF files will be exported
+    :param ParsedFileCache parse_cache: if provided, the unchanged files are loaded from this cache
     :return: a list of the generated XLIFF files, loaded as IosXliffFile models
     :rtype: List[IosXliffFile]
     """
+    run_xliff_export(xcodeproj_path, languages, output_dir)
+
+    xliff_files = []  # type: List[IosXliffFile]
+    for language in languages:
+        xliff_file_path = get_xliff_file_path(output_dir, language)
+        xliff_file = IosXliffFile(file_path=xliff_file_path, parse_cache=parse_cache)
+        xliff_files.append(xliff_file)
+
+    return xliff_files
+
+
+def run_xliff_export(xcodeproj_path, languages, output_dir):
+    """
+    Runs 'xcodebuild' to export localizations from the source Xcode project, without loading the XLIFF files
+    :param str xcodeproj_path: the path of the 'xcodeproj' file of the source project
+    :param List[str] languages: a list of language codes to export localizations for
+    :param str output_dir: path to a location where the XLIFF files will be exported
+    """
 
     import subprocess
-    from os.path import join
 
     xcb_params = ['-exportLocalizations', '-localizationPath', output_dir,
                   '-project', xcodeproj_path]
@@ -329,42 +713,123 @@ def export_xliff_files(xcodeproj_path, languages, output_dir):
         xcb_params.append('-exportLanguage')
         xcb_params.append(language)
 
-    pwt('GENERATING XLIFF FILES FOR {} TO {}'.format(', '.join(languages), output_dir), color='y')
+    logger.info('GENERATING XLIFF FILES FOR {} TO {}'.format(', '.join(languages), output_dir), color='y')
     xcb = subprocess.Popen(['xcodebuild'] + xcb_params, stdout=subprocess.PIPE)
     xcb.wait()
 
-    xliff_files = []  # type: List[IosXliffFile]
-    for language in languages:
-        xliff_file_path = join(output_dir, '{}.xcloc/'.format(language),
-                               'Localized Contents', '{}.xliff'.format(language))
-        xliff_file = IosXliffFile(file_path=xliff_file_path)
-        xliff_files.append(xliff_file)
 
-    return xliff_files
-
-
-def load_xliff_files(languages, input_dir):
+def find_export_input_files(xcodeproj_path, dev_language, excluded_dirs=()):
+    # type: (str, str, Tuple[str, ...]) -> List[str]
+    """
+    Finds the files that 'xcodebuild -exportLocalizations' reads: the project file and the development language
+    sources of the project folder (the source code, the interface files and the '.strings' and '.stringsdict' files
+    outside of the '.lproj' folders of the other languages, that are written by the Xcode import). The hidden folders,
+    the build folders and the excluded folders (ex. the export folder) are skipped.
+    :param str xcodeproj_path: the path of the 'xcodeproj' file of the project
+    :param str dev_language: the development language code
+    :param excluded_dirs: the folders that are not searched
+    :return: the paths of the found files, sorted
+    :rtype: List[str]
+    """
+    excluded_dirs = set(path.abspath(d) for d in excluded_dirs)
+    source_lproj_dirs = ('Base.lproj', '{}.lproj'.format(dev_language))
+    input_paths = [path.join(xcodeproj_path, 'project.pbxproj')]
+    for root, dirs, files in os.walk(path.dirname(path.abspath(xcodeproj_path))):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and not d.endswith('.xcodeproj') and
+                   d not in ('build', 'DerivedData') and (not d.endswith('.lproj') or d in source_lproj_dirs) and
+                   path.join(root, d) not in excluded_dirs]
+        input_paths += [path.join(root, f) for f in files if f.endswith(EXPORT_INPUT_EXTENSIONS)]
+    return [input_paths[0]] + sorted(input_paths[1:])
+
+
+def load_xliff_files(languages, input_dir, parse_cache=None):
     """
     Loads XLIFF files for the specified languages, from an input directory
     :param List[str] languages: a list of language codes to export localizations for
     :param str input_dir: the input directory path
+    :param ParsedFileCache parse_cache: if provided, the unchanged files are loaded from this cache
     :return: a list of the XLIFF files found, loaded as IosXliffFile models
     :rtype: List[IosXliffFile]
     """
-    from os.path import join
 
-    pwt('LOADING LOCALIZATIONS FROM {}'.format(input_dir), color='y')
+    logger.info('LOADING LOCALIZATIONS FROM {}'.format(input_dir), color='y')
 
     xliff_files = []  # type: List[IosXliffFile]
     for language in languages:
-        xliff_file_path = join(input_dir, '{}.xcloc/'.format(language),
-                               'Localized Contents', '{}.xliff'.format(language))
+        xliff_file_path = get_xliff_file_path(input_dir, language)
 
         if not path.isfile(xliff_file_path):
             continue
 
-        xliff_file = IosXliffFile(file_path=xliff_file_path)
+        xliff_file = IosXliffFile(file_path=xliff_file_path, parse_cache=parse_cache)
         xliff_files.append(xliff_file)
-        pwt('LOADED {}'.format(xliff_file_path), color='y')
+        logger.debug('LOADED {}'.format(xliff_file_path), color='y')
 
     return xliff_files
+
+
+def iter_xliff_files(languages, input_dir, parse_cache=None):
+    """
+    Loads the XLIFF files one language at a time, so only the files of the languages being processed are in memory
+    :param List[str] languages: the language codes, in processing order
+    :param str input_dir: the input directory path
+    :param ParsedFileCache parse_cache: if provided, the unchanged files are loaded from this cache
+    :return: yields the language code and the loaded XLIFF files of every language (an empty list if the language
+    has no XLIFF file)
+    """
+    logger.info('LOADING LOCALIZATIONS FROM {}'.format(input_dir), color='y')
+
+    for language in languages:
+        xliff_file_path = get_xliff_file_path(input_dir, language)
+        if not path.isfile(xliff_file_path):
+            yield language, []
+            continue
+
+        xliff_file = IosXliffFile(file_path=xliff_file_path, parse_cache=parse_cache)
+        logger.debug('LOADED {}'.format(xliff_file_path), color='y')
+        yield language, [xliff_file]
+
+
+def prefetch_google_sheets_snapshots(gsheets_manager, xliff_files):
+    """
+    Reads the worksheets of all the provided files in advance, with one values.batchGet request per spreadsheet
+    :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheets
+    :param List[IosXliffFile] xliff_files: the loaded XLIFF files
+    """
+    header_values_by_language = {f.target_language: f.header_values for f in xliff_files}
+    gsheets_manager.prefetch_snapshots(platform='ios',
+                                       header_values_by_language=header_values_by_language,
+                                       value_render=ValueRenderOption.UNFORMATTED_VALUE)
+
+
+def prefetch_google_sheets_columns(gsheets_manager, xliff_files):
+    """
+    Reads only the columns needed for importing (source, target and key) of all the provided files in advance
+    :param GoogleSheetsManager gsheets_manager: the manager used to read the worksheets
+    :param List[IosXliffFile] xliff_files: the loaded XLIFF files
+    """
+    header_values_by_language = {f.target_language: f.header_values for f in xliff_files}
+    column_names_by_language = {f.target_language: f.import_column_names for f in xliff_files}
+    gsheets_manager.prefetch_columns(platform='ios',
+                                     header_values_by_language=header_values_by_language,
+                                     column_names_by_language=column_names_by_language,
+                                     value_render=ValueRenderOption.UNFORMATTED_VALUE)
+
+
+def fan_out_development_sources(gsheets_manager, xliff_file, languages, identifiers=None):
+    # type: (GoogleSheetsManager, IosXliffFile, List[str], Set[str]) -> None
+    """
+    Updates the changed source texts in the worksheets of all the provided languages at once (see
+    fan_out_source_changes)
+    :param IosXliffFile xliff_file: an exported XLIFF file (the source texts are the same in the files of every
+                                    language)
+    :param List[str] languages: the codes of the languages to update (ex. all the localizations of the project)
+    :param Set[str] identifiers: if provided, only the units with these keys are compared (ex. the changed ones)
+    """
+    source_texts = {u.identifier: u.source_text for u in xliff_file.translation_units
+                    if identifiers is None or u.identifier in identifiers}
+    header_values_by_language = {get_language_name(code): IosXliffFile.worksheet_header_values(
+        xliff_file.source_language, get_language_name(code)) for code in languages}
+    fan_out_source_changes(gsheets_manager, platform='ios', header_values_by_language=header_values_by_language,
+                           key_header=IosHeaderValues.KEY, source_texts=source_texts,
+                           development_language=xliff_file.source_language)
@@ -0,0 +1,147 @@
+import unicodedata
+
+from typing import List, Dict
+
+from pygsheets.custom_types import ValueRenderOption
+
+from cloud_managers.change_set import ChangeSet
+from cloud_managers.google_sheets_manager import GoogleSheetsManager
+from utils.gs_header_types import SharedHeaderValues
+from utils.logger import logger
+from utils.utils import unescape_android_string
+
+SHARED_PLATFORM = 'shared'
+
+# the value render option used by every platform for its worksheet snapshots (so the cached snapshots are reused)
+PLATFORM_VALUE_RENDER = {
+    'android': ValueRenderOption.FORMULA,
+    'ios': ValueRenderOption.UNFORMATTED_VALUE,
+}
+
+
+def normalize_source_text(source_text):
+    # type: (str) -> str
+    """
+    :return: the key used to match the same source text between platforms (without the Android escaping, unicode
+    NFC, without the leading, trailing and repeated whitespace). The placeholders are not changed (ex. %s and %@
+    differ).
+    """
+    if source_text is None:
+        return u''
+    source_text = unescape_android_string(u'{}'.format(source_text))
+    return u' '.join(unicodedata.normalize('NFC', source_text).split())
+
+
+class SharedStrings(object):
+    """
+    The shared worksheet of a language ('shared_strings'): the source texts used by both the Android and the iOS
+    apps, stored and translated only once. The rows are identified by the normalized source text, the translations
+    are matched with the string IDs / keys of every platform when importing.
+    """
+
+    def __init__(self, gsheets_manager, source_language, target_language):
+        # type: (GoogleSheetsManager, str, str) -> SharedStrings
+        """
+        :param GoogleSheetsManager gsheets_manager: the manager used to read and write the worksheets
+        :param str source_language: the name of the development language (ex. English)
+        :param str target_language: the name of the translation language (ex. Spanish)
+        """
+        self.gsheets_manager = gsheets_manager
+        self.source_language = source_language  # type: str
+        self.target_language = target_language  # type: str
+
+    @property
+    def source_language_header(self):
+        return SharedHeaderValues.SOURCE_LANGUAGE.format(self.source_language)
+
+    @property
+    def target_language_header(self):
+        return SharedHeaderValues.TARGET_LANGUAGE.format(self.target_language)
+
+    @property
+    def header_values(self):
+        return [self.source_language_header, self.target_language_header, SharedHeaderValues.PLATFORMS]
+
+    @property
+    def worksheet(self):
+        return self.gsheets_manager.get_worksheet(platform=SHARED_PLATFORM,
+                                                  language=self.target_language,
+                                                  header_values=self.header_values)
+
+    def translations(self):
+        # type: () -> Dict[str, str]
+        """
+        :return: the target texts of the shared worksheet, by normalized source text
+        """
+        ws_rows = self.gsheets_manager.fetch_columns(self.worksheet,
+                                                     header_values=self.header_values,
+                                                     column_names=[self.source_language_header,
+                                                                   self.target_language_header],
+                                                     value_render=ValueRenderOption.UNFORMATTED_VALUE)
+        translations = {}  # type: Dict[str, str]
+        for source_text, target_text in ws_rows:
+            translations.setdefault(normalize_source_text(source_text), u'{}'.format(target_text))
+        return translations
+
+    def plan_dedup(self, change_set, platform):
+        # type: (ChangeSet, str) -> List[ChangeSet]
+        """
+        Removes from the new rows of a platform change set the rows whose source text is already shared, or is used
+        by the other platform too. The later are added to the shared worksheet (with the translation of the other
+        platform, if any). The rows of the other platform are kept, read-only (the import takes the translation of a
+        shared source text from the shared worksheet), so their source text is still updated by key when it changes,
+        and the changed string gets its own translation again.
+        :param ChangeSet change_set: a change set planned for the worksheet of `platform` (source and target texts
+                                     are the first two values of the new rows)
+        :param str platform: 'android' or 'ios'
+        :return: the change sets of the shared worksheet
+        :rtype: List[ChangeSet]
+        """
+        shared_ws = self.worksheet
+        shared_snapshot = self.gsheets_manager.get_snapshot(shared_ws, value_render=ValueRenderOption.UNFORMATTED_VALUE)
+        shared_sources = set(normalize_source_text(s) for s in shared_snapshot.column(self.source_language_header))
+        shared_change_set = ChangeSet(worksheet=shared_ws, snapshot=shared_snapshot)
+
+        other_platform = 'ios' if platform == 'android' else 'android'
+        other_rows_by_source = self.__other_platform_rows(other_platform)
+
+        platform_rows = []
+        for row in change_set.new_rows:
+            normalized_source = normalize_source_text(row[0])
+
+            if normalized_source == '' or (normalized_source not in shared_sources and
+                                           normalized_source not in other_rows_by_source):
+                platform_rows.append(row)
+            elif normalized_source not in shared_sources:
+                other_targets = other_rows_by_source[normalized_source]
+                target_text = next((t for t in other_targets if t.strip() != ''), u'{}'.format(row[1]))
+                shared_change_set.new_rows.append([row[0], target_text, ', '.join(sorted([platform, other_platform]))])
+                shared_sources.add(normalized_source)
+                logger.debug(u'SHARED {} IN {}'.format(row[0], shared_change_set.title), color='y',
+                             event='source_shared', source_text=row[0], worksheet=shared_change_set.title)
+
+        change_set.new_rows = platform_rows
+        return [shared_change_set]
+
+    def __other_platform_rows(self, other_platform):
+        # type: (str) -> Dict[str, List[str]]
+        """
+        :return: the target texts of the worksheet of the other platform, by normalized source text
+        """
+        other_ws = self.gsheets_manager.find_worksheet(platform=other_platform, language=self.target_language)
+        if other_ws is None:
+            return {}
+
+        other_snapshot = self.gsheets_manager.get_snapshot(other_ws, value_render=PLATFORM_VALUE_RENDER[other_platform])
+        try:
+            source_idx = other_snapshot.column_index(self.source_language_header)
+            target_idx = other_snapshot.column_index(self.target_language_header)
+        except ValueError:
+            # a different development language (or an empty worksheet), nothing can be shared
+            return {}
+
+        other_rows_by_source = {}  # type: Dict[str, List[str]]
+        for row in other_snapshot.rows:
+            other_rows_by_source.setdefault(normalize_source_text(row[source_idx]), []).append(
+                u'{}'.format(row[target_idx]))
+        return other_rows_by_source
@@ -0,0 +1,125 @@
+from typing import Dict, List
+
+from cloud_managers.change_set import ChangeSet
+from cloud_managers.google_sheets_manager import GoogleSheetsManager
+from models.shared_strings import PLATFORM_VALUE_RENDER
+from utils.logger import logger
+
+
+def plan_source_updates(gsheets_manager, platform, language, header_values, key_header, source_texts,
+                        development_language=None, development_targets=None):
+    # type: (GoogleSheetsManager, str, str, List[str], str, Dict[str, str], str, Dict[str, str]) -> ChangeSet
+    """
+    Compares the source column of the worksheet of a language with the source texts of the development language
+    file, without changing anything. Only the source and key columns are read.
+    :param str platform: 'android' or 'ios'
+    :param str language: the name of the language of the worksheet (ex. Spanish)
+    :param List[str] header_values: the header of the worksheet (the source and target columns are the first two)
+    :param str key_header: the header value of the key column (ex. AndroidHeaderValues.STRING_ID)
+    :param Dict[str, str] source_texts: the current source texts, by key (the other keys are not compared)
+    :param str development_language: the name of the development language
+    :param Dict[str, str] development_targets: the target texts of the development language worksheet, by key (the
+                                               source texts by default)
+    :return: the source cell updates, with the target cells of the same rows cleared, as a ChangeSet
+    :rtype: ChangeSet
+    """
+    value_render = PLATFORM_VALUE_RENDER[platform]
+    source_header = header_values[0]
+
+    worksheet = gsheets_manager.get_worksheet(platform=platform, language=language, header_values=header_values)
+    ws_rows = gsheets_manager.fetch_columns(worksheet, header_values=header_values,
+                                            column_names=[source_header, key_header], value_render=value_render)
+    row_index = gsheets_manager.get_row_index(worksheet, header_values=header_values, key_header=key_header,
+                                              value_render=value_render)
+
+    # the development language worksheet has the source texts in its target column too
+    if language == development_language:
+        target_texts = development_targets if development_targets is not None else source_texts
+    else:
+        target_texts = {}
+
+    change_set = ChangeSet(worksheet=worksheet, snapshot=row_index.snapshot)
+    for idx, (ws_source_text, key) in enumerate(ws_rows):
+        source_text = source_texts.get(key)
+        if source_text is None or source_text == u'{}'.format(ws_source_text):
+            continue
+        change_set.update_cell(row=idx + 2, col=1, value=source_text)
+        change_set.update_cell(row=idx + 2, col=2, value=target_texts.get(key, ''))
+
+    return change_set
+
+
+def fan_out_source_changes(gsheets_manager, platform, header_values_by_language, key_header, source_texts,
+                           development_language=None, development_targets=None):
+    # type: (GoogleSheetsManager, str, Dict[str, List[str]], str, Dict[str, str], str, Dict[str, str]) -> None
+    """
+    Updates the changed source texts of the development language in the worksheets of every language in one pass, so
+    a copy edit of the development language file costs a few requests instead of a sync of every language file. The
+    source and key columns of all the worksheets are read with one values.batchGet request per spreadsheet, the
+    changed source cells are updated (and their target cells cleared, the translations have to be reviewed) with one
+    batchUpdate per spreadsheet, sent in parallel. The languages are synced afterwards as usual, without any source
+    text left to update. Only the worksheets that already exist are updated, the others are created (with the current
+    source texts) when their language is synced.
+    :param str platform: 'android' or 'ios'
+    :param header_values_by_language: the header of the worksheet of every language, by language name (the source
+                                      and target columns are the first two)
+    :param str key_header: the header value of the key column
+    :param Dict[str, str] source_texts: the source texts of the development language file, by key
+    :param str development_language: the name of the development language (see plan_source_updates)
+    :param Dict[str, str] development_targets: the target texts of the development language worksheet, by key
+    """
+    if len(source_texts) == 0:
+        return
+
+    missing_languages = [language for language in header_values_by_language.keys()
+                         if gsheets_manager.find_worksheet(platform=platform, language=language) is None]
+    for language in missing_languages:
+        logger.debug(u'NO {} WORKSHEET FOR {}, ITS SOURCE TEXTS ARE NOT UPDATED'.format(platform.upper(), language),
+                     event='fan_out_skipped', language=language)
+    header_values_by_language = {language: header_values for language, header_values
+                                 in header_values_by_language.items() if language not in missing_languages}
+    if len(header_values_by_language) == 0:
+        return
+
+    logger.info(u'UPDATING THE CHANGED SOURCE TEXTS OF {} LANGUAGES'.format(len(header_values_by_language)),
+                color='y')
+    gsheets_manager.prefetch_columns(platform=platform,
+                                     header_values_by_language=header_values_by_language,
+                                     column_names_by_language={language: [header_values[0], key_header]
+                                                               for language, header_values
+                                                               in header_values_by_language.items()},
+                                     value_render=PLATFORM_VALUE_RENDER[platform])
+
+    with gsheets_manager.batched_writes():
+        for language in sorted(header_values_by_language.keys()):
+            change_set = plan_source_updates(gsheets_manager, platform=platform, language=language,
+                                             header_values=header_values_by_language[language],
+                                             key_header=key_header, source_texts=source_texts,
+                                             development_language=development_language,
+                                             development_targets=development_targets)
+            if not change_set.has_remote_changes():
+                continue
+
+            changed_rows = [c.row for c in change_set.cell_updates if c.col == 1]
+            gsheets_manager.apply_change_set(change_set)
+
+            if gsheets_manager.dry_run:
+                continue
+
+            # the changed rows are resolved by key when the highlighting is applied
+            row_index = gsheets_manager.get_row_index(change_set.worksheet,
+                                                      header_values=header_values_by_language[language],
+                                                      key_header=key_header,
+                                                      value_render=PLATFORM_VALUE_RENDER[platform])
+            changed_keys = [row_index.keys[row_number - 2] for row_number in changed_rows]
+            gsheets_manager.highlighting.add_changed_sources(snapshot=row_index.snapshot or row_index,
+                                                             key_header=key_header, keys=changed_keys, source_col=0,
+                                                             target_col=1)
+            for key in changed_keys:
+                logger.debug(u'UPDATED SOURCE OF {} TO {}'.format(key, source_texts[key]), color='y',
+                             event='source_updated', worksheet=change_set.title, key=key)
+            logger.info(u'UPDATED {} SOURCE TEXTS IN {}'.format(len(changed_keys), change_set.title), color='g',
+                        event='sources_updated', worksheet=change_set.title, count=len(changed_keys))
+
+    # the changed rows are highlighted before the worksheets are synced one language at a time (and released)
+    gsheets_manager.apply_highlighting()
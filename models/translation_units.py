@@ -43,7 +43,7 @@ class XliffTranslationUnit(object):
         :return: True if the text_string is not None or empty, False otherwise
         :rtype: bool
         """
-        return False if not unicode(self.target_text).strip() else True
+        return False if not u'{}'.format(self.target_text).strip() else True
 
 
 class AndroidXmlTranslationUnit(object):
@@ -76,6 +76,58 @@ class AndroidXmlTranslationUnit(object):
         return False if not self.target_text.strip() else True
 
 
+class AndroidXmlTranslationUnitOverlay(object):
+    """
+    A translation unit of a language file that is missing from that file. It references the (shared) translation unit
+    of the development language file for the identifier and source fields, and only holds the target fields, so no
+    copy of the source unit is made for every language.
+    """
+    __slots__ = ('source_unit', 'target_text', 'target_language', 'friendly_target_language')
+
+    def __init__(self, source_unit, target_language, friendly_target_language, target_text=''):
+        # type: (AndroidXmlTranslationUnit, str, str, str) -> AndroidXmlTranslationUnitOverlay
+        self.source_unit = source_unit  # type: AndroidXmlTranslationUnit
+        self.target_text = target_text  # type: str
+        self.target_language = target_language  # type: str
+        self.friendly_target_language = friendly_target_language  # type: str
+
+    @property
+    def identifier(self):
+        # type: () -> str
+        return self.source_unit.identifier
+
+    @property
+    def source_text(self):
+        # type: () -> str
+        return self.source_unit.source_text
+
+    @property
+    def source_language(self):
+        # type: () -> str
+        return self.source_unit.source_language
+
+    @property
+    def friendly_source_language(self):
+        # type: () -> str
+        return self.source_unit.friendly_source_language
+
+    def __str__(self):
+        return u"{} = {} ({})".format(self.identifier, self.target_text, self.friendly_target_language)
+
+    @property
+    def record_value(self):
+        """
+        :return: A list of the translation unit properties, in the same order as they should
+        be placed in the corresponding worksheet.
+        :rtype: List[str]
+        """
+        return [self.source_text, self.target_text, self.identifier]
+
+    def is_translated(self):
+        # type: () -> bool
+        return False if not self.target_text.strip() else True
+
+
 class DotNetResxTranslationUnit(object):
     def __init__(self, target_text, identifier, target_language, friendly_target_language):
 
@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.sheets_stand_in import SheetsStandIn, write_service_account_file
+from cloud_managers.change_set import WorksheetSnapshot
+from cloud_managers.google_sheets_manager import GoogleSheetsManager
+
+# the key column is not the first one, like the worksheets of both platforms
+SNAPSHOT_HEADER = ['SOURCE', 'TARGET', 'KEY']
+
+
+class FakeSpreadsheet(object):
+    id = 'spreadsheet'
+
+
+class FakeWorksheet(object):
+    """
+    Stands for a pygsheets Worksheet in the tests that plan changes without sending them
+    """
+    spreadsheet = FakeSpreadsheet()
+
+    def __init__(self, worksheet_id=7, title='android_strings'):
+        self.id = worksheet_id
+        self.title = title
+
+
+def make_snapshot(keys, header=SNAPSHOT_HEADER, worksheet=None):
+    """
+    Builds the snapshot of a worksheet with one untranslated row per key: [KEY, '', key]
+    """
+    return WorksheetSnapshot(worksheet=worksheet if worksheet is not None else FakeWorksheet(),
+                             values=[header] + [[k.upper(), '', k] for k in keys])
+
+
+@pytest.fixture(scope='session')
+def service_account_file(tmp_path_factory):
+    file_path = str(tmp_path_factory.mktemp('auth') / 'stand_in_key.json')
+    write_service_account_file(file_path)
+    return file_path
+
+
+@pytest.fixture
+def stand_in():
+    with SheetsStandIn() as running_stand_in:
+        yield running_stand_in
+
+
+@pytest.fixture
+def sheets_manager_factory(stand_in, service_account_file):
+    """
+    Builds GoogleSheetsManager objects that send their requests to the stand-in
+    """
+    def create_manager(**kwargs):
+        kwargs.setdefault('user_email', 'owner@example.com')
+        kwargs.setdefault('project_name', 'Test')
+        return GoogleSheetsManager(service_account_file_path=service_account_file, api_endpoint=stand_in.url,
+                                   **kwargs)
+    return create_manager
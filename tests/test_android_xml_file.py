@@ -0,0 +1,39 @@
+import io
+
+from models.android_xml_file import load_android_xml_files, parse_string_values
+
+
+def test_parse_string_values_keeps_the_escaping():
+    content = u'<resources>\n    <string name="a">Don\\\'t &lt;b&gt;</string>\n</resources>'
+    assert parse_string_values(content) == [(u'a', u"Don\\'t &lt;b&gt;")]
+
+
+def test_parse_string_values_reads_the_emptied_strings():
+    content = u'<resources>\n    <string name="a"/>\n    <string name="b"></string>\n    <string name="c">C</string>\n' \
+              u'</resources>'
+    assert parse_string_values(content) == [(u'a', u''), (u'b', u''), (u'c', u'C')]
+
+
+def test_import_removes_the_cleared_translations(tmp_path, stand_in, sheets_manager_factory):
+    res_path = tmp_path / 'res'
+    for values_dir, content in [('values', u'<string name="a">Hello</string>\n\t<string name="b">Bye</string>'),
+                                ('values-es', u'<string name="a">Hola</string>\n\t<string name="b">Adiós</string>')]:
+        (res_path / values_dir).mkdir(parents=True)
+        with io.open(str(res_path / values_dir / 'strings.xml'), 'w', encoding='utf-8') as strings_file:
+            strings_file.write(u'<?xml version="1.0" encoding="utf-8"?>\n<resources>\n\t{}\n</resources>\n'.format(
+                content))
+    dev_file, es_file = load_android_xml_files([str(res_path / 'values' / 'strings.xml'),
+                                                str(res_path / 'values-es' / 'strings.xml')], 'en')
+    es_file.update_source_language(source_xml_file=dev_file)
+    es_file.upload_to_google_sheets(gsheets_manager=sheets_manager_factory())
+
+    # the source text of 'a' changed, its target cell was cleared by the fan-out
+    for spreadsheet in stand_in.emulator.spreadsheets.values():
+        for sheet in spreadsheet.sheets:
+            for row in sheet.rows[1:]:
+                if row[-1] == 'a':
+                    row[1] = ''
+    es_file.update_from_google_sheets(gsheets_manager=sheets_manager_factory(), dev_language_file=dev_file)
+
+    with io.open(str(res_path / 'values-es' / 'strings.xml'), encoding='utf-8') as strings_file:
+        assert parse_string_values(strings_file.read()) == [(u'b', u'Adiós')]
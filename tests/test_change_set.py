@@ -0,0 +1,82 @@
+from cloud_managers.change_set import ChangeSet, WorksheetSnapshot, sort_key
+from tests.conftest import SNAPSHOT_HEADER, FakeWorksheet, make_snapshot
+
+
+def test_snapshot_pads_the_trimmed_rows():
+    snapshot = WorksheetSnapshot(worksheet=FakeWorksheet(), values=[SNAPSHOT_HEADER, ['A', '', 'a'], ['B']])
+    assert snapshot.rows == [['A', '', 'a'], ['B', '', '']]
+    assert snapshot.records()[0] == {'SOURCE': 'A', 'TARGET': '', 'KEY': 'a'}
+    assert make_snapshot(['a', 'b']).row_numbers_by_key('KEY') == {'a': 2, 'b': 3}
+
+
+def test_sort_key_puts_numbers_first_and_ignores_the_case():
+    assert sorted(['b', 'A', 3, 'c'], key=sort_key) == [3, 'A', 'b', 'c']
+
+
+def test_row_placement_merges_the_new_rows_into_the_kept_rows():
+    change_set = ChangeSet(worksheet=FakeWorksheet(), snapshot=make_snapshot(['b', 'd', 'f']))
+    change_set.new_rows = [['g'], ['a'], ['e'], ['c'], ['C2']]
+    change_set.deletions = [3]  # 'd'
+
+    inserted_groups, appended_rows = change_set.row_placement()
+
+    # kept rows after the deletion: b, f (indexes 0, 1)
+    assert inserted_groups == [(1, [['c'], ['C2'], ['e']]), (0, [['a']])]
+    assert appended_rows == [['g']]
+    assert change_set.appended_rows_start((inserted_groups, appended_rows)) == 1 + 3 - 1 + 4
+
+
+def test_row_placement_without_snapshot_appends_everything():
+    change_set = ChangeSet(worksheet=FakeWorksheet())
+    change_set.new_rows = [['b'], ['a']]
+    assert change_set.row_placement() == ([], [['a'], ['b']])
+
+
+def test_to_batch_requests_orders_updates_deletions_and_inserts():
+    change_set = ChangeSet(worksheet=FakeWorksheet(worksheet_id=7), snapshot=make_snapshot(['b', 'd', 'f']))
+    change_set.update_cell(row=4, col=3, value='=A1')
+    change_set.deletions = [2, 3, 3]
+    change_set.new_rows = [['a', 'x'], ['z']]
+
+    requests = change_set.to_batch_requests()
+
+    assert [list(r.keys())[0] for r in requests] == ['updateCells', 'deleteDimension', 'deleteDimension',
+                                                     'appendCells', 'insertDimension', 'updateCells']
+    assert requests[0]['updateCells']['start'] == {'sheetId': 7, 'rowIndex': 3, 'columnIndex': 2}
+    assert requests[0]['updateCells']['rows'] == [{'values': [{'userEnteredValue': {'formulaValue': '=A1'}}]}]
+    # the deletions are sent bottom-up, without duplicates
+    assert [r['deleteDimension']['range']['startIndex'] for r in requests[1:3]] == [2, 1]
+    assert requests[3]['appendCells']['rows'] == [{'values': [{'userEnteredValue': {'stringValue': 'z'}}]}]
+    assert requests[4]['insertDimension']['range'] == {'sheetId': 7, 'dimension': 'ROWS', 'startIndex': 1,
+                                                       'endIndex': 2}
+    assert requests[4]['insertDimension']['inheritFromBefore'] is False
+    assert requests[5]['updateCells']['start'] == {'sheetId': 7, 'rowIndex': 1, 'columnIndex': 0}
+
+
+def test_to_batch_requests_only_extends_the_grid_for_the_chunked_rows():
+    change_set = ChangeSet(worksheet=FakeWorksheet(), snapshot=make_snapshot(['a']))
+    change_set.new_rows = [['b'], ['c']]
+
+    requests = change_set.to_batch_requests(append_rows=False)
+
+    assert requests == [{'appendDimension': {'sheetId': 7, 'dimension': 'ROWS', 'length': 2}}]
+
+
+def test_to_batch_requests_of_an_empty_change_set():
+    change_set = ChangeSet(worksheet=FakeWorksheet())
+    change_set.write_file('strings.xml', 'export', lambda: None)
+    assert change_set.to_batch_requests() == []
+    assert not change_set.is_empty()
+
+
+def test_mirror_gives_the_same_rows_as_a_fresh_read():
+    snapshot = make_snapshot(['b', 'd', 'f'])
+    change_set = ChangeSet(worksheet=snapshot.worksheet, snapshot=snapshot)
+    change_set.update_cell(row=2, col=2, value='B target')
+    change_set.deletions = [3]
+    change_set.new_rows = [['A', '', 'a'], ['E', '', 'e'], ['G']]
+
+    snapshot.mirror(change_set, change_set.row_placement())
+
+    assert snapshot.rows == [['A', '', 'a'], ['B', 'B target', 'b'], ['E', '', 'e'], ['F', '', 'f'], ['G', '', '']]
+    assert snapshot.row_numbers_by_key('KEY')['f'] == 5
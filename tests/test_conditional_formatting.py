@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from cloud_managers.change_set import ChangeSet
+from models.source_changes import fan_out_source_changes
+from utils.placeholders import placeholder_signature
+from utils.pygsheets_conditional_formatting import CHANGED_SOURCE_COLOR, placeholder_count_formula
+
+# the regular expression of the formula built for $B2
+PLACEHOLDER_COUNT_FORMULA_REGEX = re.compile(r'^\(LEN\(REGEXREPLACE\(REGEXREPLACE\(\$B2&"", "%%", ""\), '
+                                             r'"(.*)", CHAR\(1\)\)\)-')
+
+HEADER = ['SOURCE', 'TARGET', 'STRING_ID']
+
+
+def _stand_in_sheet(stand_in, title):
+    for spreadsheet in stand_in.emulator.spreadsheets.values():
+        for sheet in spreadsheet.sheets:
+            if sheet.title == title:
+                return sheet
+    return None
+
+
+def _create_worksheet(manager, rows):
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+    change_set = ChangeSet(worksheet=worksheet, snapshot=manager.get_snapshot(worksheet))
+    change_set.new_rows = rows
+    manager.apply_change_set(change_set)
+    return worksheet
+
+
+@pytest.mark.parametrize('text', [u'100%', u'100%% of %s', u'%1$s and %2$d', u'%<s %.2f %ld', u'%@ %#@count@ %%%d',
+                                  u'% of 5', u'no placeholders'])
+def test_placeholder_count_formula_counts_the_placeholders_of_the_signature(text):
+    # the formula is evaluated with Python's regular expressions (the pattern is also valid for RE2)
+    pattern = PLACEHOLDER_COUNT_FORMULA_REGEX.match(placeholder_count_formula('$B2')).group(1).replace('""', '"')
+    marked_text = re.sub(pattern, u'\x01', re.sub(u'%%', u'', text))
+
+    assert marked_text.count(u'\x01') == len(placeholder_signature(text))
+
+
+def test_translation_rules_are_added_once(stand_in, sheets_manager_factory):
+    manager = sheets_manager_factory()
+    worksheet = _create_worksheet(manager, [['A', 'a', 'a']])
+
+    for _ in range(2):
+        manager.highlighting.add_translation_rules(worksheet=worksheet, source_col=0, target_col=1)
+        manager.apply_highlighting()
+
+    rules = _stand_in_sheet(stand_in, worksheet.title).conditional_formats
+    assert sorted(r['booleanRule']['condition']['type'] for r in rules) == ['BLANK', 'CUSTOM_FORMULA']
+    assert all(r['ranges'][0]['startColumnIndex'] == 1 for r in rules)
+
+
+def test_changed_sources_are_highlighted_until_translated(stand_in, sheets_manager_factory):
+    manager = sheets_manager_factory()
+    worksheet = _create_worksheet(manager, [['A', 'a', 'a'], ['B', 'b', 'b'], ['C', 'c', 'c'], ['D', 'd', 'd']])
+
+    fan_out_source_changes(sheets_manager_factory(), platform='android', header_values_by_language={'es': HEADER},
+                           key_header='STRING_ID', source_texts={'a': 'A2', 'b': 'B2', 'c': 'C', 'd': 'D2'})
+
+    rules = _stand_in_sheet(stand_in, worksheet.title).conditional_formats
+    assert len(rules) == 1
+    condition = rules[0]['booleanRule']['condition']
+    assert condition == {'type': 'CUSTOM_FORMULA', 'values': [{'userEnteredValue': '=INDIRECT(ADDRESS(ROW(), 2))=""'}]}
+    assert [(r['startRowIndex'], r['endRowIndex'], r['startColumnIndex'], r['endColumnIndex'])
+            for r in rules[0]['ranges']] == [(1, 3, 0, 1), (4, 5, 0, 1)]
+    background_color = rules[0]['booleanRule']['format']['backgroundColor']
+    assert (background_color['red'], background_color['green'], background_color['blue']) == CHANGED_SOURCE_COLOR
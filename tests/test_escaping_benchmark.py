@@ -0,0 +1,26 @@
+import io
+import json
+
+from benchmarks.escaping_benchmark import check_reference
+
+
+def _write_reference(file_path, count, seed, outputs):
+    with io.open(file_path, 'w', encoding='utf-8') as reference_file:
+        reference_file.write(u'{}'.format(json.dumps({'count': count, 'seed': seed, 'outputs': outputs,
+                                                      'failures': {}})))
+
+
+def test_check_reference_counts_the_different_outputs(tmp_path):
+    reference_path = str(tmp_path / 'reference.json')
+    _write_reference(reference_path, count=2, seed=0, outputs={'escape': [u'a', u'b']})
+
+    assert check_reference({'escape': [u'a', u'b']}, {}, reference_path, count=2, seed=0) == 0
+    assert check_reference({'escape': [u'a', u'c']}, {}, reference_path, count=2, seed=0) == 1
+
+
+def test_check_reference_refuses_another_corpus(tmp_path):
+    reference_path = str(tmp_path / 'reference.json')
+    _write_reference(reference_path, count=2, seed=0, outputs={'escape': [u'a', u'b']})
+
+    assert check_reference({'escape': [u'a', u'b']}, {}, reference_path, count=2, seed=1) == 1
+    assert check_reference({'escape': [u'a', u'b']}, {}, reference_path, count=3, seed=0) == 1
@@ -0,0 +1,37 @@
+import io
+import os
+
+from utils.file_watcher import FileWatcher, run_watch_loop
+
+
+def write_file(file_path, content):
+    with io.open(file_path, 'w', encoding='utf-8') as watched_file:
+        watched_file.write(content)
+
+
+def test_files_changed_during_the_pull_are_pushed(tmp_path):
+    imported_path = str(tmp_path / 'values-es' / 'strings.xml')
+    edited_path = str(tmp_path / 'values' / 'strings.xml')
+    for file_path in (imported_path, edited_path):
+        os.makedirs(os.path.dirname(file_path))
+        write_file(file_path, u'<resources/>')
+    watcher = FileWatcher(list_files=lambda: [imported_path, edited_path], poll_interval=0.01, debounce_seconds=0.0)
+    pushed_paths = []
+    pull_count = []
+
+    def pull_changes():
+        pull_count.append(1)
+        if len(pull_count) > 1:
+            raise KeyboardInterrupt()
+        # the import writes its file while the developer saves the development language file
+        write_file(imported_path, u'<resources>\n</resources>')
+        write_file(edited_path, u'<resources>\n\n</resources>')
+        return [imported_path]
+
+    def push_changes(changed_paths):
+        pushed_paths.append(changed_paths)
+        raise KeyboardInterrupt()
+
+    run_watch_loop(watcher, push_changes=push_changes, pull_changes=pull_changes, pull_interval=0.0)
+
+    assert pushed_paths == [[edited_path]]
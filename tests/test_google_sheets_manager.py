@@ -0,0 +1,79 @@
+from pygsheets.custom_types import ValueRenderOption
+
+from cloud_managers.change_set import ChangeSet
+from cloud_managers.google_sheets_manager import PlannedWorksheet, SpreadsheetLayout
+
+HEADER = ['SOURCE', 'TARGET', 'STRING_ID']
+
+
+def test_dry_run_does_not_create_the_missing_spreadsheets(stand_in, sheets_manager_factory):
+    manager = sheets_manager_factory(dry_run=True)
+
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+    snapshot = manager.get_snapshot(worksheet)
+    row_index = manager.get_row_index(worksheet, header_values=HEADER, key_header='STRING_ID')
+    manager.prefetch_snapshots(platform='android', header_values_by_language={'es': HEADER, 'fr': HEADER})
+    columns = manager.fetch_columns(worksheet, header_values=HEADER, column_names=['SOURCE'],
+                                    value_render=ValueRenderOption.UNFORMATTED_VALUE)
+
+    change_set = ChangeSet(worksheet=worksheet, snapshot=snapshot)
+    change_set.new_rows = [['a', 'A', '']]
+    manager.apply_change_sets([change_set])
+
+    assert isinstance(worksheet, PlannedWorksheet)
+    assert snapshot.header == HEADER and snapshot.rows == []
+    assert row_index.row_numbers_by_key() == {}
+    assert columns == []
+    assert stand_in.emulator.spreadsheets == {}
+    assert stand_in.stats().get('write', 0) == 0
+
+
+def test_dry_run_plans_the_missing_worksheets_of_an_existing_spreadsheet(stand_in, sheets_manager_factory):
+    sheets_manager_factory(layout=SpreadsheetLayout.PER_PROJECT).get_worksheet(platform='ios', language='es',
+                                                                                header_values=HEADER)
+    stand_in.reset_stats()
+    manager = sheets_manager_factory(layout=SpreadsheetLayout.PER_PROJECT, dry_run=True)
+
+    existing_worksheet = manager.get_worksheet(platform='ios', language='es', header_values=HEADER)
+    planned_worksheets = [manager.get_worksheet(platform='ios', language=language, header_values=HEADER)
+                          for language in ('fr', 'de')]
+
+    assert not isinstance(existing_worksheet, PlannedWorksheet)
+    assert all(w.spreadsheet is existing_worksheet.spreadsheet for w in planned_worksheets)
+    assert len(set(w.id for w in planned_worksheets + [existing_worksheet])) == 3
+    spreadsheet = list(stand_in.emulator.spreadsheets.values())[0]
+    assert [s.title for s in spreadsheet.sheets] == ['ios_strings_es']
+    assert stand_in.stats().get('write', 0) == 0
+
+
+def test_get_worksheet_creates_the_spreadsheet_with_its_header(stand_in, sheets_manager_factory):
+    manager = sheets_manager_factory()
+
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+
+    assert worksheet.spreadsheet.title == 'Test_es_localizations'
+    assert manager.get_snapshot(worksheet).header == HEADER
+
+
+def test_fan_out_only_updates_the_existing_worksheets(stand_in, sheets_manager_factory):
+    from models.source_changes import fan_out_source_changes
+
+    manager = sheets_manager_factory()
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+    manager.apply_change_set(_new_rows_change_set(manager, worksheet,
+                                                  [['Old', 'Viejo', 'a'], ['Same', 'Igual', 'b']]))
+
+    manager = sheets_manager_factory()
+    fan_out_source_changes(manager, platform='android', header_values_by_language={'es': HEADER, 'fr': HEADER},
+                           key_header='STRING_ID', source_texts={'a': 'New', 'b': 'Same'})
+
+    assert [s.properties['title'] for s in stand_in.emulator.spreadsheets.values()] == ['Test_es_localizations']
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+    manager.invalidate_snapshots()
+    assert manager.get_snapshot(worksheet).rows == [['New', '', 'a'], ['Same', 'Igual', 'b']]
+
+
+def _new_rows_change_set(manager, worksheet, rows):
+    change_set = ChangeSet(worksheet=worksheet, snapshot=manager.get_snapshot(worksheet))
+    change_set.new_rows = rows
+    return change_set
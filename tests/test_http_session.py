@@ -0,0 +1,30 @@
+import errno
+import socket
+
+import pytest
+
+from cloud_managers.http_session import PooledHttp
+
+HEADER = ['SOURCE', 'TARGET', 'STRING_ID']
+
+
+def test_a_dropped_connection_raises_a_retriable_socket_error(stand_in):
+    stand_in.drop_rate = 1.0
+    http = PooledHttp(endpoint=stand_in.url)
+
+    with pytest.raises(socket.error) as raised:
+        http.request('https://sheets.googleapis.com/v4/spreadsheets/unknown')
+
+    assert raised.value.errno == errno.ECONNRESET
+    assert stand_in.stats()['dropped'] == 1
+
+
+def test_the_dropped_requests_are_retried(stand_in, sheets_manager_factory):
+    manager = sheets_manager_factory()
+    stand_in.drop_rate = 0.3
+
+    worksheet = manager.get_worksheet(platform='android', language='es', header_values=HEADER)
+    snapshot = manager.get_snapshot(worksheet)
+
+    assert snapshot.header == HEADER
+    assert stand_in.stats()['dropped'] > 0
@@ -0,0 +1,140 @@
+import importlib.util
+import io
+import os
+
+import pytest
+
+from models.ios_xliff_file import IosXliffFile, get_xliff_file_path
+from utils.journal import OperationJournal
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ios-gslocalization.py')
+
+XLIFF_TEMPLATE = u'''<?xml version="1.0" encoding="UTF-8"?>
+<xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" version="1.2">
+  <file original="App/en.lproj/Localizable.strings" source-language="en" target-language="{language}" datatype="plaintext">
+    <body>
+      <trans-unit id="hello" xml:space="preserve">
+        <source>Hello</source>
+        <target>Hello {language}</target>
+      </trans-unit>
+      <trans-unit id="bye" xml:space="preserve">
+        <source>Bye</source>
+      </trans-unit>
+    </body>
+  </file>
+</xliff>
+'''
+
+LANGUAGES = ['es', 'fr']
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location('ios_gslocalization', SCRIPT_PATH)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+def write_xliff_files(languages, output_dir):
+    for language in languages:
+        xliff_path = get_xliff_file_path(output_dir, language)
+        if not os.path.isdir(os.path.dirname(xliff_path)):
+            os.makedirs(os.path.dirname(xliff_path))
+        with io.open(xliff_path, 'w', encoding='utf-8') as xliff_file:
+            xliff_file.write(XLIFF_TEMPLATE.format(language=language))
+
+
+def translate_in_stand_in(stand_in, string_id, text):
+    for spreadsheet in stand_in.emulator.spreadsheets.values():
+        for sheet in spreadsheet.sheets:
+            for row in sheet.rows[1:]:
+                if string_id in row:
+                    row[1] = text
+
+
+class StepCounter(object):
+    def __init__(self, monkeypatch, script):
+        self.calls = []
+        self.failing_language = None
+        sync_with_google_sheets = IosXliffFile.sync_with_google_sheets
+        update_from_google_sheets = IosXliffFile.update_from_google_sheets
+
+        def run_xliff_export(xcodeproj_path, languages, output_dir):
+            self.calls.append(('export', None))
+            write_xliff_files(languages, output_dir)
+
+        def sync(l_file, *args, **kwargs):
+            self.calls.append(('sync', l_file.target_language))
+            return sync_with_google_sheets(l_file, *args, **kwargs)
+
+        def update(l_file, *args, **kwargs):
+            self.calls.append(('import', l_file.target_language))
+            return update_from_google_sheets(l_file, *args, **kwargs)
+
+        def import_in_xcode(l_file, xcodeproj_path):
+            if l_file.target_language == self.failing_language:
+                raise RuntimeError('xcodebuild failed')
+            self.calls.append(('xcode_import', l_file.target_language))
+            # the translations are written to the project (not read by the export)
+            lproj_path = os.path.join(os.path.dirname(xcodeproj_path), 'App', '{}.lproj'.format(l_file.target_language))
+            if not os.path.isdir(lproj_path):
+                os.makedirs(lproj_path)
+            with io.open(os.path.join(lproj_path, 'Localizable.strings'), 'w', encoding='utf-8') as strings_file:
+                strings_file.write(u'"bye" = "{}";'.format(len(self.calls)))
+
+        monkeypatch.setattr(script, 'run_xliff_export', run_xliff_export)
+        monkeypatch.setattr(IosXliffFile, 'sync_with_google_sheets', sync)
+        monkeypatch.setattr(IosXliffFile, 'update_from_google_sheets', update)
+        monkeypatch.setattr(IosXliffFile, 'import_in_xcode', import_in_xcode)
+
+
+@pytest.fixture
+def project(tmp_path):
+    xcodeproj_path = str(tmp_path / 'App.xcodeproj')
+    os.makedirs(xcodeproj_path)
+    os.makedirs(str(tmp_path / 'App'))
+    for file_path, content in [(os.path.join(xcodeproj_path, 'project.pbxproj'), u'// project'),
+                               (str(tmp_path / 'App' / 'ViewController.swift'), u'let title = "Hello"')]:
+        with io.open(file_path, 'w', encoding='utf-8') as project_file:
+            project_file.write(content)
+    return xcodeproj_path, str(tmp_path / 'Localizations')
+
+
+def test_resumed_export_and_import_runs_only_the_missing_steps(tmp_path, monkeypatch, stand_in,
+                                                               sheets_manager_factory, project):
+    xcodeproj_path, loc_output_path = project
+    script = load_script()
+    counter = StepCounter(monkeypatch, script)
+
+    def run(resume):
+        del counter.calls[:]
+        journal = OperationJournal(name=u'ios|Test', context={'operation': '3'}, resume=resume,
+                                   journal_dir=str(tmp_path / 'journal'))
+        script.sync_languages(sheets_manager_factory(), xcodeproj_path, LANGUAGES, 'en', loc_output_path, '3',
+                              should_export=True, journal=journal, parse_cache=None)
+
+    # the worksheets have a translation the files don't have, the import of every language rewrites its file
+    write_xliff_files(LANGUAGES, loc_output_path)
+    script.sync_languages(sheets_manager_factory(), xcodeproj_path, LANGUAGES, 'en', loc_output_path, '1',
+                          should_export=False, journal=None, parse_cache=None)
+    translate_in_stand_in(stand_in, 'bye', u'Adiós')
+
+    # the Xcode import of the last language fails
+    counter.failing_language = 'French'
+    with pytest.raises(RuntimeError):
+        run(resume=False)
+    assert [c for c in counter.calls if c[0] == 'import'] == [('import', 'Spanish'), ('import', 'French')]
+
+    # the resumed run only runs the failed step, then every step is completed and nothing runs again
+    counter.failing_language = None
+    run(resume=True)
+    assert counter.calls == [('xcode_import', 'French')]
+    run(resume=True)
+    assert counter.calls == []
+
+    # an edited source file of the project exports the languages again
+    with io.open(os.path.join(os.path.dirname(xcodeproj_path), 'App', 'ViewController.swift'), 'w',
+                 encoding='utf-8') as source_file:
+        source_file.write(u'let title = "Hello again"')
+    run(resume=True)
+    assert counter.calls[0] == ('export', None)
@@ -0,0 +1,87 @@
+import io
+
+from lxml import etree
+
+from models.ios_xliff_file import IosXliffFile, XLIFF_NAMESPACE, update_target_element
+
+XLIFF_CONTENT = u'''<?xml version="1.0" encoding="UTF-8"?>
+<!-- exported by xcodebuild -->
+<?xml-stylesheet type="text/xsl" href="xliff.xsl"?>
+<xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" version="1.2">
+  <file original="App/en.lproj/Localizable.strings" source-language="en" target-language="es" datatype="plaintext">
+    <header>
+      <tool tool-id="com.apple.dt.xcode" tool-name="Xcode" tool-version="12.0" build-num="12A7209"/>
+    </header>
+    <body>
+      <?xcode keep?>
+      <!-- the first unit -->
+      <trans-unit id="hello" xml:space="preserve">
+        <source>Hello</source>
+        <target>Hola viejo</target>
+        <note>A greeting</note>
+      </trans-unit>
+      <trans-unit id="bye" xml:space="preserve">
+        <source>Bye &amp; %@</source>
+        <note>No comment</note>
+      </trans-unit>
+      <group id="menu">
+        <trans-unit id="removed">
+          <source>Removed</source>
+          <target>Quitado</target>
+        </trans-unit>
+        <trans-unit id="kept">
+          <source>Kept</source>
+          <target>Mantenido</target>
+        </trans-unit>
+      </group>
+    </body>
+  </file>
+</xliff>
+<!-- the end -->
+'''
+
+TARGET_TEXTS = {u'hello': u'Hola', u'bye': u'Adiós & %@', u'removed': u''}
+
+
+def canonical_xml(file_path):
+    return etree.tostring(etree.parse(file_path), method='c14n', with_comments=True)
+
+
+def test_update_source_xml_matches_the_tree_writer(tmp_path):
+    streamed_path = str(tmp_path / 'streamed.xliff')
+    reference_path = str(tmp_path / 'reference.xliff')
+    for file_path in (streamed_path, reference_path):
+        with io.open(file_path, 'w', encoding='utf-8') as xliff_file:
+            xliff_file.write(XLIFF_CONTENT)
+
+    xliff_file = IosXliffFile(streamed_path)
+    for t_unit in xliff_file.translation_units:
+        t_unit.target_text = TARGET_TEXTS.get(t_unit.identifier, t_unit.target_text)
+    xliff_file.update_source_xml()
+
+    # the previous implementation: the whole tree is parsed, updated and written back
+    xliff_tree = etree.parse(reference_path)
+    t_units_by_id = {u.identifier: u for u in xliff_file.translation_units}
+    for trans_unit_element in xliff_tree.iter(XLIFF_NAMESPACE + 'trans-unit'):
+        update_target_element(trans_unit_element, t_units_by_id[trans_unit_element.get('id')])
+    xliff_tree.write(reference_path, encoding='utf-8', pretty_print=True, xml_declaration=True)
+
+    assert canonical_xml(streamed_path) == canonical_xml(reference_path)
+
+    updated_targets = {u.identifier: u.target_text for u in IosXliffFile(streamed_path).translation_units}
+    assert updated_targets == {u'hello': u'Hola', u'bye': u'Adiós & %@', u'removed': u'', u'kept': u'Mantenido'}
+
+
+def test_update_source_xml_keeps_the_nodes_around_the_root_element(tmp_path):
+    file_path = str(tmp_path / 'es.xliff')
+    with io.open(file_path, 'w', encoding='utf-8') as xliff_file:
+        xliff_file.write(XLIFF_CONTENT)
+
+    IosXliffFile(file_path).update_source_xml()
+
+    with io.open(file_path, encoding='utf-8') as xliff_file:
+        content = xliff_file.read()
+    assert content.index(u'<!-- exported by xcodebuild -->') < content.index(u'<?xml-stylesheet') < \
+        content.index(u'<xliff ')
+    assert content.rstrip().endswith(u'</xliff>\n<!-- the end -->')
+    assert u'<?xcode keep?>' in content
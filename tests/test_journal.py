@@ -0,0 +1,100 @@
+import io
+import os
+
+from utils.journal import OperationJournal, run_step
+
+CONTEXT = {'operation': '3', 'layout': 'language'}
+
+
+class FakeSheetsManager(object):
+    def __init__(self):
+        self.callbacks = []
+
+    def when_sent(self, callback):
+        self.callbacks.append(callback)
+
+
+def make_journal(tmp_path, context=CONTEXT, resume=True):
+    return OperationJournal(name=u'android|Test', context=context, resume=resume,
+                            journal_dir=str(tmp_path / 'journal'))
+
+
+def write_file(file_path, content):
+    with io.open(file_path, 'w', encoding='utf-8') as input_file:
+        input_file.write(content)
+
+
+def test_resumed_run_skips_the_completed_steps_with_unchanged_inputs(tmp_path):
+    input_paths = [str(tmp_path / 'strings.xml'), str(tmp_path / 'values.xml')]
+    for input_path in input_paths:
+        write_file(input_path, u'<resources/>')
+    journal = make_journal(tmp_path)
+    journal.complete('upload', input_paths)
+
+    resumed_journal = make_journal(tmp_path)
+    assert resumed_journal.is_completed('upload', input_paths)
+    assert not resumed_journal.is_completed('import', input_paths)
+
+    # a changed input (here the second one, ex. the development language file) runs the step again
+    write_file(input_paths[1], u'<resources>\n</resources>')
+    assert not make_journal(tmp_path).is_completed('upload', input_paths)
+
+
+def test_steps_of_another_context_or_without_resume_are_not_skipped(tmp_path):
+    input_paths = [str(tmp_path / 'strings.xml')]
+    write_file(input_paths[0], u'<resources/>')
+    make_journal(tmp_path).complete('upload', input_paths)
+
+    assert not make_journal(tmp_path, context=dict(CONTEXT, operation='1')).is_completed('upload', input_paths)
+    assert not make_journal(tmp_path, resume=False).is_completed('upload', input_paths)
+
+
+def test_clear_removes_the_journal(tmp_path):
+    input_paths = [str(tmp_path / 'strings.xml')]
+    write_file(input_paths[0], u'<resources/>')
+    journal = make_journal(tmp_path)
+    journal.complete('upload', input_paths)
+    assert os.path.isfile(journal.journal_path)
+
+    journal.clear()
+
+    assert not os.path.isfile(journal.journal_path)
+    assert not make_journal(tmp_path).is_completed('upload', input_paths)
+
+
+def test_run_step_records_the_spreadsheet_steps_once_sent(tmp_path):
+    input_paths = [str(tmp_path / 'strings.xml')]
+    write_file(input_paths[0], u'<resources/>')
+    journal = make_journal(tmp_path)
+    gsheets_manager = FakeSheetsManager()
+    actions = []
+
+    assert run_step(journal, 'upload', input_paths, lambda: actions.append('upload'), gsheets_manager=gsheets_manager)
+    assert not journal.is_completed('upload', input_paths)
+    gsheets_manager.callbacks[0]()
+    assert journal.is_completed('upload', input_paths)
+
+    assert not run_step(journal, 'upload', input_paths, lambda: actions.append('upload again'))
+    assert run_step(None, 'upload', input_paths, lambda: actions.append('dry run'))
+    assert actions == ['upload', 'dry run']
+
+
+def test_steps_stay_completed_when_the_run_rewrites_their_inputs(tmp_path):
+    input_paths = [str(tmp_path / 'es.xliff')]
+    write_file(input_paths[0], u'<xliff/>')
+    journal = make_journal(tmp_path, resume=False)
+    gsheets_manager = FakeSheetsManager()
+
+    # the import rewrites the file before the changes of the sync are sent
+    run_step(journal, 'sync', input_paths, lambda: None, gsheets_manager=gsheets_manager)
+    run_step(journal, 'import', input_paths, lambda: write_file(input_paths[0], u'<xliff>\n</xliff>'),
+             rewrites_inputs=True)
+    gsheets_manager.callbacks[0]()
+
+    resumed_journal = make_journal(tmp_path)
+    assert resumed_journal.is_completed('sync', input_paths)
+    assert resumed_journal.is_completed('import', input_paths)
+
+    # a change made outside the run is not followed
+    write_file(input_paths[0], u'<xliff>\n\n</xliff>')
+    assert not make_journal(tmp_path).is_completed('sync', input_paths)
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from contextlib import closing
+
+import pytest
+
+from utils.leases import LeaseStore, DirectoryLeaseStore, SqliteLeaseStore, LanguageLeases, open_lease_store
+
+
+@pytest.fixture(params=['directory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SqliteLeaseStore(str(tmp_path / 'leases.db'))
+    return DirectoryLeaseStore(str(tmp_path / 'leases'))
+
+
+def test_lease_store_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseStore()
+
+
+def test_open_lease_store_picks_the_store_from_the_path(tmp_path):
+    assert isinstance(open_lease_store(str(tmp_path / 'leases.sqlite')), SqliteLeaseStore)
+    assert isinstance(open_lease_store(str(tmp_path / 'leases')), DirectoryLeaseStore)
+
+
+def test_a_lease_belongs_to_its_owner_until_it_expires(store):
+    assert store.acquire('es', 'worker-1', ttl=60)
+    assert store.acquire('es', 'worker-1', ttl=60)
+    assert not store.acquire('es', 'worker-2', ttl=60)
+    assert not store.renew('es', 'worker-2', ttl=60)
+    assert store.renew('es', 'worker-1', ttl=-1)
+    assert store.acquire('es', 'worker-2', ttl=60)
+    assert not store.renew('es', 'worker-1', ttl=60)
+
+
+def test_a_completed_lease_is_never_acquired_again(store):
+    assert store.acquire('es', 'worker-1', ttl=60)
+    assert store.complete('es', 'worker-1')
+    assert store.is_completed('es')
+    assert not store.acquire('es', 'worker-1', ttl=60)
+    assert not store.acquire('es', 'worker-2', ttl=60)
+
+
+def test_only_the_owner_of_a_valid_lease_completes_it(store):
+    assert not store.complete('es', 'worker-1')
+
+    assert store.acquire('es', 'worker-1', ttl=60)
+    assert not store.complete('es', 'worker-2')
+
+    assert store.acquire('fr', 'worker-1', ttl=-1)
+    assert not store.complete('fr', 'worker-1')
+    assert store.acquire('fr', 'worker-2', ttl=60)
+    assert not store.complete('fr', 'worker-1')
+    assert not store.is_completed('fr')
+
+
+def test_a_released_lease_is_free_right_away(store):
+    assert store.acquire('es', 'worker-1', ttl=60)
+    store.release('es', 'worker-2')
+    assert not store.acquire('es', 'worker-2', ttl=60)
+    store.release('es', 'worker-1')
+    assert store.acquire('es', 'worker-2', ttl=60)
+
+
+def test_a_stale_lock_file_is_broken(tmp_path):
+    store = DirectoryLeaseStore(str(tmp_path), stale_lock_timeout=1)
+    lock_path = str(tmp_path / 'leases.lock')
+    open(lock_path, 'w').close()
+    os.utime(lock_path, (time.time() - 10, time.time() - 10))
+
+    assert store.acquire('es', 'worker-1', ttl=60)
+    assert not os.path.exists(lock_path)
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.broken')] == []
+
+
+def test_workers_share_the_languages(store):
+    languages = ['es', 'fr', 'de', 'it', 'pt', 'nl']
+    claimed_languages = {'worker-1': [], 'worker-2': []}
+
+    def run_worker(worker_id):
+        leases = LanguageLeases(store, run_id='run', platform='android', worker_id=worker_id, poll_interval=0.01)
+        for language in leases.claim(languages):
+            claimed_languages[worker_id].append(language)
+            time.sleep(0.01)
+
+    second_worker = threading.Thread(target=run_worker, args=('worker-2',))
+    second_worker.start()
+    run_worker('worker-1')
+    second_worker.join()
+
+    assert sorted(claimed_languages['worker-1'] + claimed_languages['worker-2']) == sorted(languages)
+    leases = LanguageLeases(store, run_id='run', platform='android')
+    assert all(store.is_completed(leases.lease_name(language)) for language in languages)
+
+
+def test_a_failed_language_is_released(store):
+    leases = LanguageLeases(store, run_id='run', platform='ios', worker_id='worker-1')
+    with closing(leases.claim(['es'])) as claims:
+        assert next(claims) == 'es'
+
+    assert not store.is_completed(leases.lease_name('es'))
+    assert store.acquire(leases.lease_name('es'), 'worker-2', ttl=60)
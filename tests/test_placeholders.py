@@ -0,0 +1,53 @@
+import pytest
+
+from utils.placeholders import PlaceholderCheck, find_placeholder_mismatches, placeholder_signature
+
+
+@pytest.mark.parametrize('source_text, target_text', [
+    (u'%s of %d', u'%2$d de %1$s'),
+    (u'%1$s and %1$s', u'%1$s y %1$s'),
+    (u'%.2f km', u'%5.1f km'),
+    (u'%@ has %ld items', u'%1$@ a %2$ld éléments'),
+    (u'100%% done, %d left', u'%d restantes, 100%%'),
+    (u'%d %<s', u'%1$d %1$s'),
+    (u'%#@files@', u'%#@files@'),
+    (u'No placeholders', u'Sin marcadores'),
+])
+def test_same_signature(source_text, target_text):
+    assert placeholder_signature(source_text) == placeholder_signature(target_text)
+
+
+@pytest.mark.parametrize('source_text, target_text', [
+    (u'%s of %d', u'%s de %s'),
+    (u'%d items', u'elementos'),
+    (u'%d items', u'%d %d elementos'),
+    (u'%d items', u'%ld elementos'),
+    (u'%1$s and %2$s', u'%2$s y %2$s'),
+    # the arguments are swapped without their positions
+    (u'%@ has %ld items', u'%ld éléments pour %@'),
+    (u'%#@files@', u'%#@folders@'),
+    (u'100%% done', u'%d listo'),
+])
+def test_different_signature(source_text, target_text):
+    assert placeholder_signature(source_text) != placeholder_signature(target_text)
+
+
+def test_signature_of_the_text_without_placeholders_is_empty():
+    assert placeholder_signature(u'100%') == ()
+    assert placeholder_signature(u'100%%') == ()
+    assert placeholder_signature(42) == ()
+
+
+TRANSLATIONS = [(u'same', u'%s of %d', u'%2$d de %1$s'),
+                (u'missing', u'%d items', u'elementos'),
+                (u'added', u'Hello', u'Hola %s'),
+                (u'plain', u'Hello', u'Hola')]
+
+
+def test_find_placeholder_mismatches_blocks_the_mismatches():
+    assert find_placeholder_mismatches(TRANSLATIONS, 'strings.xml', PlaceholderCheck.BLOCK) == {u'missing', u'added'}
+
+
+@pytest.mark.parametrize('placeholder_check', [PlaceholderCheck.WARN, PlaceholderCheck.OFF])
+def test_find_placeholder_mismatches_blocks_nothing_unless_blocking(placeholder_check):
+    assert find_placeholder_mismatches(TRANSLATIONS, 'strings.xml', placeholder_check) == set()
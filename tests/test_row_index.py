@@ -0,0 +1,45 @@
+from cloud_managers.change_set import ChangeSet
+from cloud_managers.row_index import RowIndex, RowIndexCache
+from tests.conftest import FakeWorksheet, make_snapshot
+
+
+def test_row_number_of_the_keys():
+    row_index = RowIndex(worksheet=FakeWorksheet(), keys=['a', 'b'], key_column=3)
+
+    assert row_index.row_number('b') == 3
+    assert row_index.row_number('c') is None
+    assert row_index.row_numbers_by_key() == {'a': 2, 'b': 3}
+
+
+def test_mirror_follows_the_snapshot():
+    snapshot = make_snapshot(['b', 'd', 'f', 'h'])
+    row_index = RowIndex(worksheet=snapshot.worksheet, keys=snapshot.column('KEY'), key_column=3)
+    row_index.row_number('b')
+
+    change_set = ChangeSet(worksheet=snapshot.worksheet, snapshot=snapshot)
+    change_set.update_cell(row=2, col=1, value='B2')
+    change_set.update_cell(row=5, col=3, value='h2')
+    change_set.deletions = [3, 3]
+    change_set.new_rows = [['A', '', 'a'], ['E', '', 'e'], ['Z', '', 'z'], ['X']]
+
+    row_placement = change_set.row_placement()
+    row_index.mirror(change_set, row_placement)
+    snapshot.mirror(change_set, row_placement)
+
+    assert row_index.keys == snapshot.column('KEY')
+    assert row_index.row_numbers_by_key() == snapshot.row_numbers_by_key('KEY')
+    assert row_index.row_number('d') is None
+
+
+def test_cache_entry_is_valid_until_the_spreadsheet_is_modified(tmp_path):
+    cache = RowIndexCache(cache_dir=str(tmp_path / 'row_index'))
+    worksheet = FakeWorksheet()
+
+    assert cache.load(worksheet, 'KEY', modified_time='t1') is None
+    cache.save(worksheet, 'KEY', modified_time='t1', keys=['a', u'ñ', 3])
+    cache.save(worksheet, 'KEY', modified_time='t2', keys=['a', u'ñ', 3, 'b'])
+
+    assert cache.load(worksheet, 'KEY', modified_time='t2') == ['a', u'ñ', 3, 'b']
+    assert cache.load(worksheet, 'KEY', modified_time='t1') is None
+    assert cache.load(FakeWorksheet(worksheet_id=4), 'KEY', modified_time='t2') is None
+    assert cache.load(worksheet, 'SOURCE', modified_time='t2') is None
@@ -0,0 +1,58 @@
+from cloud_managers.change_set import ChangeSet
+from cloud_managers.sharding import ShardBy, ShardedSnapshot, ShardedWorksheet, shard_index, split_change_set
+from tests.conftest import FakeWorksheet, make_snapshot
+from utils.gs_header_types import AndroidHeaderValues
+
+HEADER = ['Source: English', 'Target: Spanish', AndroidHeaderValues.STRING_ID]
+
+
+def make_sharded_snapshot(keys_by_shard):
+    shards = [FakeWorksheet(worksheet_id=idx) for idx in range(len(keys_by_shard))]
+    worksheet = ShardedWorksheet(shards=shards, header_values=HEADER)
+    shard_snapshots = [make_snapshot(keys, header=HEADER, worksheet=shard)
+                       for shard, keys in zip(shards, keys_by_shard)]
+    return ShardedSnapshot(worksheet=worksheet, shard_snapshots=shard_snapshots)
+
+
+def test_locate_skips_the_empty_shards():
+    snapshot = make_sharded_snapshot([['a', 'b'], [], ['c']])
+
+    assert [snapshot.locate(row_number) for row_number in (2, 3, 4)] == [(0, 2), (0, 3), (2, 2)]
+    assert snapshot.column(AndroidHeaderValues.STRING_ID) == ['a', 'b', 'c']
+
+
+def test_split_change_set_sends_every_change_to_its_shard():
+    snapshot = make_sharded_snapshot([['a', 'b'], ['c', 'd'], []])
+    change_set = ChangeSet(worksheet=snapshot.worksheet, snapshot=snapshot)
+    change_set.update_cell(row=3, col=2, value='B')
+    change_set.update_cell(row=5, col=2, value='D')
+    change_set.deletions = [4, 4]
+    new_rows = [['E', '', 'e'], ['F', '', 'f'], ['G', '', 'g']]
+    change_set.new_rows = list(new_rows)
+
+    shard_change_sets = {c.worksheet.id: c for c in split_change_set(change_set)}
+
+    assert [(c.row, c.col, c.value) for c in shard_change_sets[0].cell_updates] == [(3, 2, 'B')]
+    assert [(c.row, c.col, c.value) for c in shard_change_sets[1].cell_updates] == [(3, 2, 'D')]
+    assert shard_change_sets[1].deletions == [2]
+    assert all(c.snapshot is snapshot.shard_snapshots[idx] for idx, c in shard_change_sets.items())
+    # the new rows go to the shard of their key
+    for row in new_rows:
+        assert row in shard_change_sets[shard_index(row[2], 3)].new_rows
+    assert sum(len(c.new_rows) for c in shard_change_sets.values()) == len(new_rows)
+
+
+def test_split_change_set_skips_the_shards_without_changes():
+    snapshot = make_sharded_snapshot([['a'], ['b']])
+    change_set = ChangeSet(worksheet=snapshot.worksheet, snapshot=snapshot)
+    change_set.update_cell(row=3, col=2, value='B')
+
+    assert [c.worksheet.id for c in split_change_set(change_set)] == [1]
+
+
+def test_shard_by_path_keeps_the_rows_of_a_module_together():
+    worksheet = ShardedWorksheet(shards=[FakeWorksheet(worksheet_id=idx) for idx in range(4)], header_values=HEADER,
+                                 shard_by=ShardBy.PATH)
+
+    assert len(set(worksheet.shard_of(['X', '', key], shard_key='app') for key in 'abcdefgh')) == 1
+    assert worksheet.shard_of(['X', '', 'a']) == shard_index('a', 4)
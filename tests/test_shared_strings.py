@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from models.shared_strings import normalize_source_text
+from utils.utils import unescape_android_string
+
+
+def test_unescape_android_string():
+    assert unescape_android_string(u"Don\\'t say \\\"hi\\\"\\nto \\@me\\?") == u'Don\'t say "hi"\nto @me?'
+    assert unescape_android_string(u'a \\\\ b &lt;br&gt;') == u'a \\ b <br>'
+
+
+def test_normalize_source_text_matches_the_texts_of_both_platforms():
+    assert normalize_source_text(u"Don\\'t  wait\\nhere ") == normalize_source_text(u"Don't wait\nhere")
+    assert normalize_source_text(u'Caf\u00e9') == normalize_source_text(u'Cafe\u0301')
+    assert normalize_source_text(None) == u''
+
+
+def test_normalize_source_text_keeps_the_placeholders():
+    assert normalize_source_text(u'Hello %s') != normalize_source_text(u'Hello %@')
@@ -0,0 +1,119 @@
+import time
+from os import stat
+
+from typing import Callable, Dict, List, Tuple
+
+from utils.logger import logger
+
+
+class FileWatcher(object):
+    """
+    Polls the modification time and size of a set of files and reports the changed files in debounced batches
+    (a batch is reported only after the files stopped changing for `debounce_seconds`).
+    """
+
+    def __init__(self, list_files, poll_interval=1.0, debounce_seconds=2.0):
+        # type: (Callable[[], List[str]], float, float) -> FileWatcher
+        """
+        :param list_files: a function that returns the paths of the files to watch (called on every poll, so new
+                           files are detected too)
+        :param float poll_interval: seconds between two polls
+        :param float debounce_seconds: quiet period required before reporting a batch of changes
+        """
+        self.list_files = list_files
+        self.poll_interval = poll_interval  # type: float
+        self.debounce_seconds = debounce_seconds  # type: float
+        self._state = self.__file_states()  # type: Dict[str, Tuple[float, int]]
+
+    def __file_states(self):
+        # type: () -> Dict[str, Tuple[float, int]]
+        file_states = {}
+        for file_path in self.list_files():
+            try:
+                file_stat = stat(file_path)
+            except OSError:
+                continue
+            file_states[file_path] = (file_stat.st_mtime, file_stat.st_size)
+        return file_states
+
+    def reset(self, file_paths=None):
+        # type: (List[str]) -> None
+        """
+        Accepts the current state of the files (ex. after the tool wrote them), so they are not reported as changed
+        :param file_paths: the files to accept (all the files by default), the changes of the other files are still
+                           reported by the next poll
+        """
+        current_state = self.__file_states()
+        if file_paths is None:
+            self._state = current_state
+            return
+
+        for file_path in file_paths:
+            if file_path in current_state:
+                self._state[file_path] = current_state[file_path]
+            else:
+                self._state.pop(file_path, None)
+
+    def poll(self):
+        # type: () -> List[str]
+        """
+        :return: the files that were added, changed or removed since the previous poll
+        """
+        current_state = self.__file_states()
+        changed_files = [p for p in set(current_state) | set(self._state) if current_state.get(p) != self._state.get(p)]
+        self._state = current_state
+        return sorted(changed_files)
+
+    def wait_for_changes(self, timeout):
+        # type: (float) -> List[str]
+        """
+        Blocks until a debounced batch of changes is available, or until the timeout expires
+        :param float timeout: maximum number of seconds to wait for the first change
+        :return: the changed files (empty if nothing changed before the timeout)
+        """
+        deadline = time.time() + timeout
+        changed_files = set()
+        last_change_time = None
+
+        while True:
+            new_changes = self.poll()
+            if len(new_changes) > 0:
+                changed_files.update(new_changes)
+                last_change_time = time.time()
+
+            if last_change_time is not None and time.time() - last_change_time >= self.debounce_seconds:
+                return sorted(changed_files)
+            if last_change_time is None and time.time() >= deadline:
+                return []
+
+            time.sleep(self.poll_interval)
+
+
+def run_watch_loop(watcher, push_changes, pull_changes, pull_interval):
+    # type: (FileWatcher, Callable[[List[str]], None], Callable[[], List[str]], float) -> None
+    """
+    Runs until interrupted (Ctrl+C): pushes the debounced local changes as they happen and pulls the remote changes
+    every `pull_interval` seconds. The files written by a pull are not reported as local changes, the files changed
+    by the developer while the pull ran are pushed with the next batch.
+    :param FileWatcher watcher: the watcher of the local files
+    :param push_changes: called with the changed file paths
+    :param pull_changes: called on the pull timer, returns the paths of the files it wrote
+    :param float pull_interval: seconds between two pulls
+    """
+    logger.info('WATCHING FOR CHANGES (PRESS CTRL+C TO STOP)', color='y')
+    next_pull_time = time.time() + pull_interval
+
+    try:
+        while True:
+            changed_files = watcher.wait_for_changes(timeout=max(0.0, next_pull_time - time.time()))
+            if len(changed_files) > 0:
+                logger.info('DETECTED {} CHANGED FILES'.format(len(changed_files)), color='y')
+                push_changes(changed_files)
+
+            if time.time() >= next_pull_time:
+                watcher.reset(pull_changes())
+                next_pull_time = time.time() + pull_interval
+
+            logger.flush()
+    except KeyboardInterrupt:
+        logger.info('STOPPED WATCHING', color='y')
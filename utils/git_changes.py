@@ -0,0 +1,102 @@
+import io
+import os
+import subprocess
+from sys import exit
+
+from typing import Any, Callable, Dict, List, Set
+
+from utils.logger import logger
+
+
+def decode_file_content(data):
+    # type: (bytes) -> str
+    """
+    :return: the text of a resource file (the '.strings' files can be UTF-16, with a byte order mark)
+    """
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16')
+    return data.decode('utf-8-sig')
+
+
+class GitChanges(object):
+    """
+    The resource files changed in the local repository since a git reference (ex. the last synced commit), compared
+    with the working tree (the uncommitted and the untracked files count as changed). Used by the --since mode, that
+    uploads only the strings added or changed since the reference instead of every string of every file.
+    """
+
+    def __init__(self, since_ref, search_paths):
+        # type: (str, List[str]) -> GitChanges
+        """
+        :param str since_ref: a commit, branch or tag of the repository that contains the search paths
+        :param List[str] search_paths: the folders of the resource files (ex. the 'res' folders)
+        """
+        self.since_ref = since_ref  # type: str
+        search_path = os.path.abspath(search_paths[0])
+        search_dir = search_path if os.path.isdir(search_path) else os.path.dirname(search_path)
+
+        try:
+            self.repository_path = self.__git(['rev-parse', '--show-toplevel'], cwd=search_dir).strip()
+            self.__git(['rev-parse', '--verify', '--quiet', u'{}^{{commit}}'.format(since_ref)])
+        except (subprocess.CalledProcessError, OSError):
+            logger.error(u'{} IS NOT A COMMIT OF THE GIT REPOSITORY OF {}'.format(since_ref, search_dir))
+            exit(1)
+
+        pathspecs = [os.path.abspath(p) for p in search_paths]
+        changed_paths = self.__git(['diff', '--name-only', '-z', since_ref, '--'] + pathspecs).split('\0')
+        changed_paths += self.__git(['ls-files', '--others', '--exclude-standard', '-z', '--'] + pathspecs).split('\0')
+        self.changed_paths = set(os.path.normpath(os.path.join(self.repository_path, p))
+                                 for p in changed_paths if p != '')  # type: Set[str]
+        self._changed_units = {}  # type: Dict[str, Set[str]]
+
+        logger.info(u'{} FILES CHANGED SINCE {}'.format(len(self.changed_paths), since_ref), color='y',
+                    event='git_changes', since=since_ref, count=len(self.changed_paths))
+
+    def __git(self, git_args, cwd=None):
+        # type: (List[str], str) -> str
+        git_output = subprocess.check_output(['git'] + git_args, cwd=cwd or self.repository_path,
+                                             stderr=subprocess.PIPE)
+        return git_output.decode('utf-8')
+
+    def is_changed(self, file_path):
+        # type: (str) -> bool
+        return os.path.normpath(os.path.abspath(file_path)) in self.changed_paths
+
+    def previous_content(self, file_path):
+        # type: (str) -> bytes
+        """
+        :return: the content of the file at the reference, or None if the file did not exist
+        """
+        relative_path = os.path.relpath(os.path.abspath(file_path), self.repository_path).replace(os.sep, '/')
+        try:
+            return subprocess.check_output(['git', 'show', u'{}:{}'.format(self.since_ref, relative_path)],
+                                           cwd=self.repository_path, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError:
+            return None
+
+    def changed_units(self, file_path, parse_units):
+        # type: (str, Callable[[str], Dict[str, Any]]) -> Set[str]
+        """
+        Compares the current and the previous version of a file, unit by unit (the result is cached by file)
+        :param str file_path: a resource file
+        :param parse_units: returns the units of a file content (text), by identifier
+        :return: the identifiers of the units added or changed since the reference (empty if the file did not change)
+        """
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        if file_path in self._changed_units:
+            return self._changed_units[file_path]
+
+        changed_identifiers = set()  # type: Set[str]
+        if file_path in self.changed_paths and os.path.isfile(file_path):
+            with io.open(file_path, 'rb') as resource_file:
+                current_units = parse_units(decode_file_content(resource_file.read()))
+            previous_data = self.previous_content(file_path)
+            previous_units = parse_units(decode_file_content(previous_data)) if previous_data is not None else {}
+            changed_identifiers = set(identifier for identifier, value in current_units.items()
+                                      if previous_units.get(identifier) != value)
+            logger.debug(u'{} UNITS CHANGED IN {} SINCE {}'.format(len(changed_identifiers), file_path,
+                                                                  self.since_ref), color='y',
+                         event='changed_units', file=file_path, count=len(changed_identifiers))
+
+        self._changed_units[file_path] = changed_identifiers
+        return changed_identifiers
@@ -11,3 +11,9 @@ class AndroidHeaderValues(object):
     SOURCE_LANGUAGE = 'Source: {}'
     TARGET_LANGUAGE = 'Target: {}'
     STRING_ID = 'String ID'
+
+
+class SharedHeaderValues(object):
+    SOURCE_LANGUAGE = 'Source: {}'
+    TARGET_LANGUAGE = 'Target: {}'
+    PLATFORMS = 'Platforms'
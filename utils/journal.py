@@ -0,0 +1,215 @@
+import io
+import os
+import json
+import hashlib
+import threading
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from utils.logger import logger
+from utils.utils import TOOL_VERSION
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.gslocalization', 'journal')
+
+
+class OperationJournal(object):
+    """
+    On-disk record of the steps completed by a run (upload, import, Xcode import, ...), one JSON file per project and
+    platform. Every step is identified by its name and its main file, and is stored with the state (modification
+    time and size) of its input files when it completed. A resumed run skips the steps whose inputs are unchanged.
+    The journal is removed when a run completes, so only the runs that failed can be resumed.
+    """
+
+    def __init__(self, name, context, resume=False, journal_dir=DEFAULT_JOURNAL_DIR):
+        # type: (str, Dict[str, Any], bool, str) -> OperationJournal
+        """
+        :param str name: identifies the project and the platform (ex. the project name and 'android')
+        :param dict context: the options of the run that change the result of the steps (ex. the operation, the
+                             layout); the steps of a run with a different context are never skipped
+        :param bool resume: if True, the steps recorded by the previous run are loaded, else they are discarded
+        :param str journal_dir: the folder of the journal files
+        """
+        name_hash = hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
+        self.journal_path = os.path.join(journal_dir, '{}.json'.format(name_hash))  # type: str
+        self.context = dict(context, tool_version=TOOL_VERSION)  # type: Dict[str, Any]
+        self._steps = {}  # type: Dict[str, List[List[Any]]]
+        # the state of the files rewritten by this run (ex. by the import), by their state before the rewrite
+        self._rewrites = {}  # type: Dict[Tuple[Any, ...], List[Any]]
+        # the steps can be completed by the thread that loads the next files too
+        self._lock = threading.Lock()
+
+        if resume:
+            self.__load()
+            if len(self._steps) > 0:
+                logger.info(u'RESUMING: {} STEPS COMPLETED BY THE PREVIOUS RUN'.format(len(self._steps)), color='y')
+
+    def __load(self):
+        # type: () -> None
+        if not os.path.isfile(self.journal_path):
+            return
+        try:
+            with io.open(self.journal_path, 'r', encoding='utf-8') as journal_file:
+                journal_data = json.load(journal_file)
+        except (IOError, OSError, ValueError):
+            # an unreadable journal is the same as no journal
+            return
+        if journal_data.get('context') == self.context:
+            self._steps = journal_data.get('steps', {})
+
+    def __save(self):
+        # type: () -> None
+        journal_dir = os.path.dirname(self.journal_path)
+        if not os.path.isdir(journal_dir):
+            try:
+                os.makedirs(journal_dir)
+            except OSError:
+                if not os.path.isdir(journal_dir):
+                    raise
+
+        # write to a temporary file first, so a failure while saving never leaves a partial journal
+        temp_path = u'{}.{}.tmp'.format(self.journal_path, os.getpid())
+        with io.open(temp_path, 'w', encoding='utf-8') as journal_file:
+            journal_file.write(u'{}'.format(json.dumps({'context': self.context, 'steps': self._steps},
+                                                       ensure_ascii=False)))
+
+        try:
+            os.replace(temp_path, self.journal_path)
+        except AttributeError:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            os.rename(temp_path, self.journal_path)
+
+    @staticmethod
+    def step_key(step, input_paths):
+        # type: (str, List[str]) -> str
+        return u'{}|{}'.format(step, os.path.abspath(input_paths[0]))
+
+    @staticmethod
+    def fingerprint(input_paths):
+        # type: (List[str]) -> List[List[Any]]
+        """
+        :return: the path, modification time and size of every input file (None for the missing files)
+        """
+        fingerprint = []
+        for input_path in input_paths:
+            try:
+                file_stat = os.stat(input_path)
+            except OSError:
+                fingerprint.append([os.path.abspath(input_path), None, None])
+                continue
+            mtime = getattr(file_stat, 'st_mtime_ns', int(file_stat.st_mtime * 1e9))
+            fingerprint.append([os.path.abspath(input_path), mtime, file_stat.st_size])
+        return fingerprint
+
+    def is_completed(self, step, input_paths):
+        # type: (str, List[str]) -> bool
+        """
+        :param str step: the name of the step (ex. 'upload')
+        :param List[str] input_paths: the files read by the step, the first one identifies the step
+        :return: True if the step was completed by the previous run and its input files have not changed since
+        """
+        recorded_fingerprint = self._steps.get(OperationJournal.step_key(step, input_paths))
+        if recorded_fingerprint is None or recorded_fingerprint != OperationJournal.fingerprint(input_paths):
+            return False
+
+        logger.info(u'SKIPPED {} OF {} (COMPLETED BY THE PREVIOUS RUN)'.format(step.upper(), input_paths[0]),
+                    color='y', event='step_skipped', step=step, file=input_paths[0])
+        return True
+
+    def complete(self, step, input_paths, fingerprint=None):
+        # type: (str, List[str], List[List[Any]]) -> None
+        """
+        Records the step as completed, with the state of its input files
+        :param fingerprint: the state of the input files when the step ran (defaults to their current state)
+        """
+        if fingerprint is None:
+            fingerprint = OperationJournal.fingerprint(input_paths)
+        with self._lock:
+            self._steps[OperationJournal.step_key(step, input_paths)] = self.__follow_rewrites(fingerprint)
+            self.__save()
+
+    def complete_when_sent(self, gsheets_manager, step, input_paths):
+        """
+        Records the step as completed once the spreadsheet changes it made are sent (see GoogleSheetsManager.when_sent),
+        with the state of its input files when it ran
+        :param GoogleSheetsManager gsheets_manager: the manager that applied the changes of the step
+        """
+        fingerprint = OperationJournal.fingerprint(input_paths)
+        gsheets_manager.when_sent(lambda: self.complete(step, input_paths, fingerprint=fingerprint))
+
+    def rewrite_inputs(self, input_paths, action):
+        # type: (List[str], Callable[[], Any]) -> Any
+        """
+        Runs an action of the run that rewrites input files of other steps (ex. the import writes the translations to
+        the file that was synced, and exported). The steps that read the previous version of the files, recorded or
+        still waiting for their changes to be sent, are not run again by a resumed run.
+        :return: the result of the action
+        """
+        states_before = OperationJournal.fingerprint(input_paths)
+        result = action()
+        states_after = OperationJournal.fingerprint(input_paths)
+
+        with self._lock:
+            for state_before, state_after in zip(states_before, states_after):
+                if state_before != state_after:
+                    self._rewrites[tuple(state_before)] = state_after
+            followed_steps = {key: self.__follow_rewrites(fingerprint) for key, fingerprint in self._steps.items()}
+            if followed_steps != self._steps:
+                self._steps = followed_steps
+                self.__save()
+        return result
+
+    def __follow_rewrites(self, fingerprint):
+        # type: (List[List[Any]]) -> List[List[Any]]
+        """
+        :return: the fingerprint with the states of the files rewritten by this run replaced by their new state
+        """
+        followed_fingerprint = []
+        for file_state in fingerprint:
+            # a file can be rewritten several times, an unchanged rewrite is never recorded (no cycle)
+            while tuple(file_state) in self._rewrites:
+                file_state = self._rewrites[tuple(file_state)]
+            followed_fingerprint.append(list(file_state))
+        return followed_fingerprint
+
+    def clear(self):
+        # type: () -> None
+        """
+        Removes the journal (called when the run completed)
+        """
+        with self._lock:
+            self._steps = {}
+            if os.path.isfile(self.journal_path):
+                os.remove(self.journal_path)
+
+
+def run_step(journal, step, input_paths, action, gsheets_manager=None, rewrites_inputs=False):
+    """
+    Runs a step of the run, unless the journal has it completed with the same input files
+    :param OperationJournal journal: the journal of the run (None in dry run mode: nothing is skipped or recorded)
+    :param str step: the name of the step (ex. 'upload')
+    :param List[str] input_paths: the files read by the step, the first one identifies the step
+    :param action: the function that runs the step
+    :param GoogleSheetsManager gsheets_manager: if the step changes spreadsheets, the step is recorded only after its
+                                                changes are sent
+    :param bool rewrites_inputs: True if the step writes its input files (ex. the import), the other steps that read
+                                 them stay completed (see OperationJournal.rewrite_inputs)
+    :return: True if the step was run, False if it was skipped
+    :rtype: bool
+    """
+    if journal is None:
+        action()
+        return True
+
+    if journal.is_completed(step, input_paths):
+        return False
+
+    if rewrites_inputs:
+        journal.rewrite_inputs(input_paths, action)
+    else:
+        action()
+    if gsheets_manager is not None:
+        journal.complete_when_sent(gsheets_manager, step, input_paths)
+    else:
+        journal.complete(step, input_paths)
+    return True
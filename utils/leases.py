@@ -0,0 +1,344 @@
+import io
+import os
+import json
+import socket
+import sqlite3
+import hashlib
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+
+from typing import Any, Dict, List, Iterator
+
+from utils.logger import logger
+
+DEFAULT_LEASE_TTL = 300
+DEFAULT_POLL_INTERVAL = 15
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+try:
+    from abc import ABC
+except ImportError:
+    ABC = ABCMeta('ABC', (object,), {})
+
+
+class LeaseStore(ABC):
+    """
+    The leases shared by the workers of a run (one lease per language). A lease belongs to a worker until it expires,
+    so the languages of a stalled worker are picked up by the others. A completed lease is never acquired again.
+    The subclasses only provide the storage, with a lock held during every read-modify-write.
+    """
+
+    @abstractmethod
+    def _locked(self):
+        """
+        :return: a context manager that holds the lock of the store (shared by all the workers)
+        """
+        pass
+
+    @abstractmethod
+    def _read(self, name):
+        # type: (str) -> Dict[str, Any]
+        """
+        :return: the record of the lease, or None if it was never acquired
+        """
+        pass
+
+    @abstractmethod
+    def _write(self, name, record):
+        # type: (str, Dict[str, Any]) -> None
+        pass
+
+    def acquire(self, name, owner, ttl):
+        # type: (str, str, float) -> bool
+        """
+        :return: True if the lease is now owned by `owner` (it was free, expired or already owned by `owner`)
+        """
+        with self._locked():
+            record = self._read(name)
+            if record is not None and (record['completed'] or
+                                       (record['owner'] != owner and record['expires_at'] > time.time())):
+                return False
+            self._write(name, {'owner': owner, 'expires_at': time.time() + ttl, 'completed': False})
+            return True
+
+    def renew(self, name, owner, ttl):
+        # type: (str, str, float) -> bool
+        """
+        :return: True if the lease was extended, False if it is no longer owned by `owner` (it expired and was
+        acquired by another worker)
+        """
+        with self._locked():
+            record = self._read(name)
+            if record is None or record['owner'] != owner or record['completed']:
+                return False
+            record['expires_at'] = time.time() + ttl
+            self._write(name, record)
+            return True
+
+    def complete(self, name, owner):
+        # type: (str, str) -> bool
+        """
+        :return: True if the lease is now completed, False if it is no longer owned by `owner` (it expired, and may
+        have been acquired by another worker), the work is then done again by the next owner
+        """
+        with self._locked():
+            record = self._read(name)
+            if record is None or record['owner'] != owner or record['completed'] or \
+                    record['expires_at'] <= time.time():
+                return False
+            self._write(name, {'owner': owner, 'expires_at': time.time(), 'completed': True})
+            return True
+
+    def release(self, name, owner):
+        # type: (str, str) -> None
+        """
+        Makes the lease available to the other workers right away (used when the work failed)
+        """
+        with self._locked():
+            record = self._read(name)
+            if record is not None and record['owner'] == owner and not record['completed']:
+                record['expires_at'] = 0
+                self._write(name, record)
+
+    def is_completed(self, name):
+        # type: (str) -> bool
+        with self._locked():
+            record = self._read(name)
+        return record is not None and record['completed']
+
+
+class DirectoryLeaseStore(LeaseStore):
+    """
+    One JSON file per lease in a (shared) directory. The read-modify-writes are serialized with a lock file, created
+    with O_EXCL; a lock file older than `stale_lock_timeout` is left by a killed worker and is broken (see
+    __break_stale_lock).
+    """
+
+    def __init__(self, directory, stale_lock_timeout=30):
+        # type: (str, float) -> DirectoryLeaseStore
+        self.directory = directory  # type: str
+        self.stale_lock_timeout = stale_lock_timeout  # type: float
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+    def __lease_path(self, name):
+        # type: (str) -> str
+        return os.path.join(self.directory, '{}.lease'.format(hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]))
+
+    @contextmanager
+    def _locked(self):
+        lock_path = os.path.join(self.directory, 'leases.lock')
+        while True:
+            try:
+                lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except OSError:
+                self.__break_stale_lock(lock_path)
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.close(lock_fd)
+            os.remove(lock_path)
+
+    def __break_stale_lock(self, lock_path):
+        # type: (str) -> None
+        """
+        Removes the lock file if it is stale. Several workers can find the same stale lock, and one of them can take a
+        new lock before the others remove the stale one, so the lock is not removed by path: it is first renamed to a
+        name of this worker (only one worker can rename it) and checked again under this name. If it turns out to be
+        a new lock, it is put back (os.link fails if yet another lock was taken meanwhile).
+        """
+        try:
+            if time.time() - os.path.getmtime(lock_path) <= self.stale_lock_timeout:
+                return
+            broken_path = u'{}.{}.{}.broken'.format(lock_path, default_worker_id(), threading.current_thread().ident)
+            os.rename(lock_path, broken_path)
+        except OSError:
+            # the lock was released, or broken by another worker
+            return
+
+        try:
+            if time.time() - os.path.getmtime(broken_path) <= self.stale_lock_timeout:
+                os.link(broken_path, lock_path)
+        except OSError:
+            pass
+        finally:
+            os.remove(broken_path)
+        logger.debug(u'BROKE THE STALE LOCK {}'.format(lock_path), event='stale_lock_broken', lock=lock_path)
+
+    def _read(self, name):
+        # type: (str) -> Dict[str, Any]
+        try:
+            with io.open(self.__lease_path(name), 'r', encoding='utf-8') as lease_file:
+                return json.load(lease_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, name, record):
+        # type: (str, Dict[str, Any]) -> None
+        lease_path = self.__lease_path(name)
+        temp_path = u'{}.{}.tmp'.format(lease_path, os.getpid())
+        with io.open(temp_path, 'w', encoding='utf-8') as lease_file:
+            lease_file.write(u'{}'.format(json.dumps(dict(record, name=name))))
+
+        try:
+            os.replace(temp_path, lease_path)
+        except AttributeError:
+            if os.path.exists(lease_path):
+                os.remove(lease_path)
+            os.rename(temp_path, lease_path)
+
+
+class SqliteLeaseStore(LeaseStore):
+    """
+    The leases stored in a SQLite file, every read-modify-write is an immediate (write locked) transaction
+    """
+
+    def __init__(self, database_path, timeout=30):
+        # type: (str, float) -> SqliteLeaseStore
+        self.database_path = database_path  # type: str
+        # the transactions are started explicitly (BEGIN IMMEDIATE), and the heartbeat runs on another thread
+        self.connection = sqlite3.connect(database_path, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self._lock = threading.Lock()
+        self.connection.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, '
+                                'expires_at REAL, completed INTEGER)')
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def _read(self, name):
+        # type: (str) -> Dict[str, Any]
+        row = self.connection.execute('SELECT owner, expires_at, completed FROM leases WHERE name = ?',
+                                      (name,)).fetchone()
+        if row is None:
+            return None
+        return {'owner': row[0], 'expires_at': row[1], 'completed': bool(row[2])}
+
+    def _write(self, name, record):
+        # type: (str, Dict[str, Any]) -> None
+        self.connection.execute('INSERT OR REPLACE INTO leases (name, owner, expires_at, completed) '
+                                'VALUES (?, ?, ?, ?)',
+                                (name, record['owner'], record['expires_at'], 1 if record['completed'] else 0))
+
+
+def open_lease_store(store_path):
+    # type: (str) -> LeaseStore
+    """
+    :param str store_path: a SQLite file (.db, .sqlite, .sqlite3) or a directory
+    """
+    if store_path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteLeaseStore(store_path)
+    return DirectoryLeaseStore(store_path)
+
+
+def default_worker_id():
+    # type: () -> str
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+class LanguageLeases(object):
+    """
+    Splits the languages of a run between several workers (ex. CI jobs) that share a lease store. Every worker
+    claims a language, processes its files and marks it completed, until all the languages are completed. While a
+    language is processed, its lease is renewed in the background; if the worker stalls or dies, the lease expires
+    and the language is claimed by another worker.
+    """
+
+    def __init__(self, store, run_id, platform, worker_id=None, ttl=DEFAULT_LEASE_TTL,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        # type: (LeaseStore, str, str, str, float, float) -> LanguageLeases
+        """
+        :param LeaseStore store: the store shared by the workers
+        :param str run_id: identifies the run (ex. the CI pipeline id), the leases of the other runs are ignored
+        :param str platform: 'android' or 'ios'
+        :param str worker_id: the name of this worker in the leases (host name and process id by default)
+        :param float ttl: seconds after which the lease of a worker that stopped renewing it expires
+        :param float poll_interval: seconds between two checks of the languages leased by the other workers
+        """
+        self.store = store
+        self.run_id = run_id  # type: str
+        self.platform = platform  # type: str
+        self.worker_id = worker_id if worker_id is not None else default_worker_id()  # type: str
+        self.ttl = ttl  # type: float
+        self.poll_interval = poll_interval  # type: float
+
+    def lease_name(self, language):
+        # type: (str) -> str
+        return u'{}|{}|{}'.format(self.run_id, self.platform, language)
+
+    def claim(self, languages):
+        # type: (List[str]) -> Iterator[str]
+        """
+        Yields the languages claimed by this worker, one at a time. A language is marked completed when the next one
+        is requested, and is released if the generator is closed before (use contextlib.closing, so a failed
+        language is released right away instead of when its lease expires).
+        Returns once all the languages are completed, by this worker or by the others.
+        """
+        pending_languages = list(languages)
+        while len(pending_languages) > 0:
+            claimed_language = next((language for language in pending_languages
+                                     if self.store.acquire(self.lease_name(language), self.worker_id, self.ttl)),
+                                    None)
+            if claimed_language is None:
+                pending_languages = [language for language in pending_languages
+                                     if not self.store.is_completed(self.lease_name(language))]
+                if len(pending_languages) > 0:
+                    logger.info(u'WAITING FOR {} LANGUAGES LEASED BY OTHER WORKERS ({})'.format(
+                        len(pending_languages), u', '.join(pending_languages)), color='y')
+                    time.sleep(self.poll_interval)
+                continue
+
+            logger.info(u'{} CLAIMED {}'.format(self.worker_id, claimed_language), color='g',
+                        event='language_claimed', language=claimed_language, worker=self.worker_id)
+            stop_heartbeat = self.__start_heartbeat(claimed_language)
+            completed = False
+            try:
+                yield claimed_language
+                completed = True
+            finally:
+                stop_heartbeat.set()
+                lease_name = self.lease_name(claimed_language)
+                if completed:
+                    completed = self.store.complete(lease_name, self.worker_id)
+                    if not completed:
+                        logger.warning(u'LOST THE LEASE OF {} BEFORE IT WAS COMPLETED, IT WILL BE PROCESSED '
+                                       u'AGAIN'.format(claimed_language), event='lease_lost',
+                                       language=claimed_language, worker=self.worker_id)
+                else:
+                    self.store.release(lease_name, self.worker_id)
+                    logger.warning(u'RELEASED {}'.format(claimed_language), event='language_released',
+                                   language=claimed_language, worker=self.worker_id)
+            if completed:
+                pending_languages.remove(claimed_language)
+
+    def __start_heartbeat(self, language):
+        # type: (str) -> threading.Event
+        stop_heartbeat = threading.Event()
+
+        def renew_lease():
+            while not stop_heartbeat.wait(self.ttl / 3.0):
+                if not self.store.renew(self.lease_name(language), self.worker_id, self.ttl):
+                    logger.warning(u'LOST THE LEASE OF {} (IT EXPIRED AND WAS CLAIMED BY ANOTHER WORKER)'.format(
+                        language), event='lease_lost', language=language, worker=self.worker_id)
+                    return
+
+        heartbeat = threading.Thread(target=renew_lease, name='lease-heartbeat')
+        heartbeat.daemon = True
+        heartbeat.start()
+        return stop_heartbeat
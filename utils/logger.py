@@ -0,0 +1,128 @@
+import atexit
+import io
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+from colorama import Fore
+from typing import List, Any
+
+from utils.utils import get_timestamp
+
+
+class LogLevel(object):
+    # one line for every record (added rows, deleted rows, translated units, ...)
+    DEBUG = 10
+    # one line for every file / worksheet (aggregates) and for every step of the run
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+    NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+
+
+COLORS = {
+    'r': Fore.RED, 'red': Fore.RED,
+    'g': Fore.GREEN, 'green': Fore.GREEN,
+    'y': Fore.YELLOW, 'yellow': Fore.YELLOW,
+}
+
+
+class Logger(object):
+    """
+    Leveled logger with buffered console output. The lines are written to the console in batches (when the buffer is
+    full, when a warning or an error is logged, or when the buffer is older than `flush_interval`), so large runs
+    are not slowed down by the terminal. Every message can also be written to a JSON lines file, with its fields.
+    """
+
+    def __init__(self, level=LogLevel.DEBUG, buffer_size=500, flush_interval=1.0, stream=None):
+        # type: (int, int, float, Any) -> Logger
+        self.level = level  # type: int
+        self.buffer_size = buffer_size  # type: int
+        self.flush_interval = flush_interval  # type: float
+        self.stream = stream
+        self._json_lines_file = None
+        self._buffer = []  # type: List[str]
+        self._last_flush_time = time.time()
+        self._lock = threading.Lock()
+
+    def configure(self, level=None, json_lines_path=None):
+        # type: (int, str) -> None
+        """
+        :param int level: the minimum level printed to the console (the JSON lines file receives all the levels)
+        :param str json_lines_path: if set, every message is appended to this file as a JSON object
+        """
+        if level is not None:
+            self.level = level
+        if json_lines_path is not None:
+            self.close()
+            self._json_lines_file = io.open(json_lines_path, 'a', encoding='utf-8')
+
+    def debug(self, message, color=None, **fields):
+        self.log(LogLevel.DEBUG, message, color, **fields)
+
+    def info(self, message, color=None, **fields):
+        self.log(LogLevel.INFO, message, color, **fields)
+
+    def warning(self, message, color='y', **fields):
+        self.log(LogLevel.WARNING, message, color, **fields)
+
+    def error(self, message, color='r', **fields):
+        self.log(LogLevel.ERROR, message, color, **fields)
+
+    def log(self, level, message, color=None, **fields):
+        # type: (int, str, str, Any) -> None
+        """
+        :param int level: one of the LogLevel values
+        :param str message: the text printed to the console
+        :param str color: color of the console output ('r', 'g' or 'y', white by default)
+        :param fields: extra values written only to the JSON lines file (ex. file=..., count=...)
+        """
+        if level < self.level and self._json_lines_file is None:
+            return
+
+        with self._lock:
+            if level >= self.level:
+                print_color = COLORS.get(color.lower(), Fore.WHITE) if color is not None else Fore.WHITE
+                self._buffer.append(u'{}[{}] {}'.format(print_color, get_timestamp(), message))
+
+            if self._json_lines_file is not None:
+                record = {'time': datetime.now().isoformat(), 'level': LogLevel.NAMES.get(level, str(level)),
+                          'message': u'{}'.format(message)}
+                record.update(fields)
+                self._json_lines_file.write(u'{}\n'.format(json.dumps(record, ensure_ascii=False, default=str)))
+
+            should_flush = level >= LogLevel.WARNING or len(self._buffer) >= self.buffer_size or \
+                time.time() - self._last_flush_time >= self.flush_interval
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        # type: () -> None
+        """
+        Writes the buffered lines to the console (with a single write) and flushes the JSON lines file
+        """
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._last_flush_time = time.time()
+            stream = self.stream if self.stream is not None else sys.stdout
+            if len(lines) > 0:
+                stream.write(u'\n'.join(lines) + u'\n')
+                stream.flush()
+            if self._json_lines_file is not None:
+                self._json_lines_file.flush()
+
+    def close(self):
+        # type: () -> None
+        self.flush()
+        if self._json_lines_file is not None:
+            self._json_lines_file.close()
+            self._json_lines_file = None
+
+
+# the logger used by the models, the managers and the scripts
+logger = Logger()
+atexit.register(logger.close)
@@ -0,0 +1,105 @@
+import os
+import zlib
+import glob
+import hashlib
+
+from typing import Any, Tuple
+
+from utils.utils import TOOL_VERSION
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.gslocalization', 'cache')
+
+
+class ParsedFileCache(object):
+    """
+    On-disk cache of the parsed content of localization files (one compressed pickle per file).
+    An entry is valid only if the path, modification time and size of the file and the tool version are unchanged.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        # type: (str) -> ParsedFileCache
+        self.cache_dir = cache_dir  # type: str
+
+    @staticmethod
+    def file_key(file_path, kind):
+        # type: (str, str) -> Tuple[Any, ...]
+        """
+        :param str file_path: the path of the parsed file
+        :param str kind: the parser that produced the cached data (and any parser input, ex. the source language)
+        :return: the key that must match for a cache entry to be valid
+        """
+        file_stat = os.stat(file_path)
+        mtime = getattr(file_stat, 'st_mtime_ns', int(file_stat.st_mtime * 1e9))
+        return os.path.abspath(file_path), kind, mtime, file_stat.st_size, TOOL_VERSION
+
+    def entry_path(self, file_path, kind):
+        # type: (str, str) -> str
+        """
+        :return: the path of the cache entry that is valid for the current state of the file. The name contains a
+        hash of the file key, so checking if a valid entry exists does not need to read it.
+        """
+        file_hash = hashlib.sha1(u'{}|{}'.format(os.path.abspath(file_path), kind).encode('utf-8')).hexdigest()
+        key_hash = hashlib.sha1(repr(self.file_key(file_path, kind)).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, '{}-{}.pz'.format(file_hash, key_hash))
+
+    def contains(self, file_path, kind):
+        # type: (str, str) -> bool
+        return os.path.isfile(self.entry_path(file_path, kind))
+
+    def load(self, file_path, kind):
+        # type: (str, str) -> Any
+        """
+        :return: the cached data of the file, or None if the file is not cached or it has changed since
+        """
+        entry_path = self.entry_path(file_path, kind)
+        if not os.path.isfile(entry_path):
+            return None
+
+        try:
+            with open(entry_path, 'rb') as entry_file:
+                entry_key, data = pickle.loads(zlib.decompress(entry_file.read()))
+        except Exception:
+            # corrupted or written by an incompatible version, it will be overwritten
+            return None
+
+        if entry_key != self.file_key(file_path, kind):
+            return None
+
+        return data
+
+    def save(self, file_path, kind, data):
+        # type: (str, str, Any) -> None
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+        entry_path = self.entry_path(file_path, kind)
+        entry_content = zlib.compress(pickle.dumps((self.file_key(file_path, kind), data), pickle.HIGHEST_PROTOCOL))
+
+        # remove the entries of the previous versions of the file
+        for stale_entry_path in glob.glob(entry_path.rsplit('-', 1)[0] + '-*.pz'):
+            if stale_entry_path != entry_path:
+                try:
+                    os.remove(stale_entry_path)
+                except OSError:
+                    pass
+
+        # write to a temporary file first, so a concurrent reader never sees a partial entry
+        tmp_entry_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        with open(tmp_entry_path, 'wb') as entry_file:
+            entry_file.write(entry_content)
+
+        try:
+            os.replace(tmp_entry_path, entry_path)
+        except AttributeError:
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+            os.rename(tmp_entry_path, entry_path)
@@ -0,0 +1,67 @@
+import threading
+
+from typing import Iterable, Iterator, TypeVar
+
+try:
+    from queue import Queue, Full
+except ImportError:
+    from Queue import Queue, Full
+
+T = TypeVar('T')
+
+# marks the end of the items in the queue
+_DONE = object()
+
+
+class _Failure(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def load_ahead(items, depth=1):
+    # type: (Iterable[T], int) -> Iterator[T]
+    """
+    Iterates `items` on a background thread, keeping up to `depth` items ready, so the next item is produced (ex. the
+    files of the next language are parsed) while the current one is processed (ex. synced with Google Sheets).
+    At most `depth` + 1 items are held at once. An exception raised by `items` is raised by the consumer, when it
+    reaches the failed item.
+    """
+    ready_items = Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        # the consumer may stop early, so the producer never blocks forever on a full queue
+        while not stopped.is_set():
+            try:
+                ready_items.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as producer_exception:
+            put(_Failure(producer_exception))
+            return
+        put(_DONE)
+
+    producer = threading.Thread(target=produce, name='load-ahead')
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            item = ready_items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
+            # the consumer is done with the item, it can be released
+            del item
+    finally:
+        stopped.set()
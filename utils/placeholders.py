@@ -0,0 +1,116 @@
+import re
+
+from typing import Dict, Iterable, Set, Tuple
+
+from utils.logger import logger
+
+# the printf style placeholders of both platforms: Android (%s, %1$d, %<s) and iOS (%@, %ld, %.2f, and the %#@name@
+# variables of the '.stringsdict' files). '%%' is matched too, so it is never read as the start of a placeholder.
+PLACEHOLDER_REGEX = re.compile(r'%(?:%|#@(\w+)@|(\d+\$|<)?[-+#0,(]*\d*(?:\.\d+)?(hh|h|ll|l|q|z|t|j|L)?'
+                               r'([@bBhHsScCdDiuUoOxXeEfFgGaAtT]))')
+
+PlaceholderSignature = Tuple[Tuple[str, str], ...]
+
+
+class PlaceholderCheck(object):
+    # the translations whose placeholders differ from the source text are not imported (the local files keep their
+    # previous translation)
+    BLOCK = 'block'
+    # the translations are imported, the mismatches are reported
+    WARN = 'warn'
+    # the placeholders are not compared
+    OFF = 'off'
+
+
+# the signatures of the source texts, extracted once per run (the same source texts are imported for every language)
+_source_signatures = {}  # type: Dict[str, PlaceholderSignature]
+
+
+def placeholder_signature(text):
+    # type: (str) -> PlaceholderSignature
+    """
+    :return: the placeholders of a text, as sorted (argument, conversion) pairs. The positional placeholders keep
+    their argument number, the others are numbered in order, so '%s of %d' and '%2$d de %1$s' have the same
+    signature. The flags, the width and the precision are ignored.
+    """
+    text = u'{}'.format(text)
+    if '%' not in text:
+        return ()
+
+    placeholders = []
+    next_argument = 1
+    last_argument = None
+    for match in PLACEHOLDER_REGEX.finditer(text):
+        variable_name, argument_index, length_modifier, conversion = match.groups()
+        if variable_name is not None:
+            placeholders.append((variable_name, '#@'))
+            continue
+        if conversion is None:
+            # %%
+            continue
+
+        if argument_index is None:
+            argument = str(next_argument)
+            next_argument += 1
+        elif argument_index == '<':
+            # the argument of the previous placeholder (Java)
+            argument = last_argument if last_argument is not None else str(next_argument)
+        else:
+            argument = argument_index[:-1]
+        last_argument = argument
+        placeholders.append((argument, (length_modifier or '') + conversion))
+
+    return tuple(sorted(placeholders))
+
+
+def source_placeholder_signature(source_text):
+    # type: (str) -> PlaceholderSignature
+    """
+    Same as placeholder_signature, cached by source text
+    """
+    signature = _source_signatures.get(source_text)
+    if signature is None:
+        signature = placeholder_signature(source_text)
+        _source_signatures[source_text] = signature
+    return signature
+
+
+def find_placeholder_mismatches(translations, file_path, placeholder_check=PlaceholderCheck.BLOCK):
+    # type: (Iterable[Tuple[str, str, str]], str, str) -> Set[str]
+    """
+    Compares the placeholders of the translations read from a worksheet with the placeholders of their source texts,
+    before they are written to the local file
+    :param translations: the identifier, the source text and the target text of every translated unit
+    :param str file_path: the local file the translations are imported in (for the messages)
+    :param str placeholder_check: one of the PlaceholderCheck values
+    :return: the identifiers of the units whose translation must not be imported (empty unless the check is BLOCK)
+    :rtype: Set[str]
+    """
+    if placeholder_check == PlaceholderCheck.OFF:
+        return set()
+
+    mismatched_identifiers = set()  # type: Set[str]
+    for identifier, source_text, target_text in translations:
+        target_text = u'{}'.format(target_text)
+        source_signature = source_placeholder_signature(source_text)
+        # most texts have no placeholders, they are compared without running the regex
+        if len(source_signature) == 0 and '%' not in target_text:
+            continue
+        if placeholder_signature(target_text) == source_signature:
+            continue
+
+        mismatched_identifiers.add(identifier)
+        logger.debug(u'PLACEHOLDERS MISMATCH: {} - {} -> {}'.format(identifier, source_text, target_text), color='r',
+                     event='placeholder_mismatch', file=file_path, identifier=identifier, source_text=source_text,
+                     target_text=target_text)
+
+    if len(mismatched_identifiers) > 0:
+        action = 'NOT IMPORTED' if placeholder_check == PlaceholderCheck.BLOCK else 'IMPORTED'
+        logger.warning(u'{} TRANSLATIONS WITH MISMATCHED PLACEHOLDERS {} IN {}'.format(len(mismatched_identifiers),
+                                                                                      action, file_path),
+                       event='placeholder_mismatches', file=file_path, count=len(mismatched_identifiers),
+                       blocked=placeholder_check == PlaceholderCheck.BLOCK)
+
+    if placeholder_check == PlaceholderCheck.BLOCK:
+        return mismatched_identifiers
+    return set()
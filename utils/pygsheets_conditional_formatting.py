@@ -2,35 +2,43 @@ import pygsheets
 from pygsheets.client import Client
 from pygsheets.worksheet import Worksheet
 
+from utils.logger import logger
+from utils.placeholders import PLACEHOLDER_REGEX
 
-def add_conditional_formatting_rule(sheets_client, worksheet, start, end, condition_type, formula, color):
+# background colors used by the highlighting pass
+BLANK_TARGET_COLOR = (0.96, 0.8, 0.8)
+PLACEHOLDER_MISMATCH_COLOR = (0.98, 0.8, 0.6)
+CHANGED_SOURCE_COLOR = (1.0, 0.95, 0.6)
+
+
+def build_conditional_formatting_rule_request(worksheet_id, start, end, condition_type, formula, color):
     """
-    Changes the cell's background color to `color` if the required conditions are met.
-    See https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets/other#ConditionType
-    for more condition types.
+    Builds an addConditionalFormatRule request that changes the cell's background color to `color` if the required
+    conditions are met.
     Args:
-        sheets_client: The Google Sheets client.
-        worksheet: The Worksheet to apply changes to.
+        worksheet_id: The id of the worksheet to apply changes to.
         start: The start range (tuple of int).
-        end: The end range (tuple of int).
+        end: The end range (tuple of int, or None for an open ended range). Any of the values can be None.
         condition_type: The type of formula.
         formula: The formula value.
         color: The background color to apply on cells meeting the criteria.
     """
-    # type: (Client, Worksheet, tuple, tuple, str, str, tuple) -> None
+    # type: (int, tuple, tuple, str, str, tuple) -> dict
+
+    grid_range = {
+        "sheetId": worksheet_id,
+        "startColumnIndex": start[0],
+        "startRowIndex": start[1]
+    }
+    if end is not None and end[0] is not None:
+        grid_range["endColumnIndex"] = end[0]
+    if end is not None and end[1] is not None:
+        grid_range["endRowIndex"] = end[1]
 
     add_formatting_rule_request = {
         "addConditionalFormatRule": {
             "rule": {
-                "ranges": [
-                    {
-                        "sheetId": worksheet.id,
-                        "startColumnIndex": start[0],
-                        "startRowIndex": start[1],
-                        "endColumnIndex": end[0],
-                        "endRowIndex": end[1]
-                    }
-                ],
+                "ranges": [grid_range],
                 "booleanRule": {
                     "condition": {
                         "type": condition_type
@@ -49,9 +57,211 @@ def add_conditional_formatting_rule(sheets_client, worksheet, start, end, condit
         }
     }
 
-    if condition_type not in ['BLANK']:
-        add_formatting_rule_request['addConditionalFormatRule']['rule']['booleanRule']['condition']['values'] = {'userEnteredValue': formula}
+    if condition_type not in ['BLANK', 'NOT_BLANK']:
+        add_formatting_rule_request['addConditionalFormatRule']['rule']['booleanRule']['condition']['values'] = [{'userEnteredValue': formula}]
         pass
 
+    return add_formatting_rule_request
+
+
+def add_conditional_formatting_rule(sheets_client, worksheet, start, end, condition_type, formula, color):
+    """
+    Changes the cell's background color to `color` if the required conditions are met.
+    See https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets/other#ConditionType
+    for more condition types.
+    Args:
+        sheets_client: The Google Sheets client.
+        worksheet: The Worksheet to apply changes to.
+        start: The start range (tuple of int).
+        end: The end range (tuple of int).
+        condition_type: The type of formula.
+        formula: The formula value.
+        color: The background color to apply on cells meeting the criteria.
+    """
+    # type: (Client, Worksheet, tuple, tuple, str, str, tuple) -> None
+
+    add_formatting_rule_request = build_conditional_formatting_rule_request(worksheet.id, start, end,
+                                                                            condition_type, formula, color)
+
     sheets_api_wrapper = sheets_client.sheet
     sheets_api_wrapper.batch_update(spreadsheet_id=worksheet.spreadsheet.id, requests=add_formatting_rule_request)
+
+
+def placeholder_count_formula(cell):
+    """
+    Builds a formula that counts the placeholders of a cell, with the regular expression used by the import (see
+    utils.placeholders.placeholder_signature, the formula gives the length of the signature): the '%%' are removed,
+    every placeholder is replaced by CHAR(1) and the CHAR(1) characters are counted.
+    Args:
+        cell: The reference of the cell (ex. $B2).
+    """
+    # type: (str) -> str
+    placeholders = 'REGEXREPLACE(REGEXREPLACE({}&"", "%%", ""), "{}", CHAR(1))'.format(
+        cell, PLACEHOLDER_REGEX.pattern.replace('"', '""'))
+    return '(LEN({0})-LEN(SUBSTITUTE({0}, CHAR(1), "")))'.format(placeholders)
+
+
+def rule_signature(rule):
+    """
+    Identifies a conditional format rule by its first range and its condition, ignoring the format (the API omits
+    the zero color components when returning the existing rules).
+    Args:
+        rule: A ConditionalFormatRule (as returned by the API or as built by this module).
+    """
+    # type: (dict) -> tuple
+    grid_range = rule.get('ranges', [{}])[0]
+    condition = rule.get('booleanRule', {}).get('condition', {})
+    formulas = tuple(v.get('userEnteredValue', '') for v in condition.get('values', []))
+    return (grid_range.get('sheetId', 0), grid_range.get('startColumnIndex', 0), grid_range.get('startRowIndex', 0),
+            grid_range.get('endColumnIndex'), grid_range.get('endRowIndex'), condition.get('type'), formulas)
+
+
+class ConditionalFormattingPass(object):
+    """
+    Gathers the highlighting rules of every worksheet touched during a run and sends them with a single batchUpdate
+    request per spreadsheet. The rules that already exist in a worksheet are not added again.
+    """
+
+    def __init__(self, sheets_client):
+        # type: (Client) -> ConditionalFormattingPass
+        self.sheets_client = sheets_client
+        self._rules = {}  # type: dict
+        self._changed_rows = {}  # type: dict
+
+    def add_translation_rules(self, worksheet, source_col, target_col):
+        """
+        Highlights the rows with a blank target and the rows whose target has a different number of placeholders
+        than the source (the placeholders of utils.placeholders, see placeholder_count_formula).
+        Args:
+            worksheet: The Worksheet to apply the rules on.
+            source_col: The 0 based index of the source column.
+            target_col: The 0 based index of the target column.
+        """
+        # type: (Worksheet, int, int) -> None
+        # a sharded worksheet gets the same rules in every shard
+        for shard in getattr(worksheet, 'shards', [worksheet]):
+            self.__add_translation_rules(shard, source_col, target_col)
+
+    def __add_translation_rules(self, worksheet, source_col, target_col):
+        # type: (Worksheet, int, int) -> None
+        source_letter = chr(ord('A') + source_col)
+        target_letter = chr(ord('A') + target_col)
+        placeholder_formula = '=AND(${}2<>"", {}<>{})'.format(target_letter,
+                                                             placeholder_count_formula('${}2'.format(source_letter)),
+                                                             placeholder_count_formula('${}2'.format(target_letter)))
+
+        rules = [
+            build_conditional_formatting_rule_request(worksheet.id, (target_col, 1), (target_col + 1, None),
+                                                      'BLANK', None, BLANK_TARGET_COLOR),
+            build_conditional_formatting_rule_request(worksheet.id, (target_col, 1), (target_col + 1, None),
+                                                      'CUSTOM_FORMULA', placeholder_formula,
+                                                      PLACEHOLDER_MISMATCH_COLOR),
+        ]
+
+        spreadsheet_rules = self._rules.setdefault(worksheet.spreadsheet.id, {})
+        for rule_request in rules:
+            rule = rule_request['addConditionalFormatRule']['rule']
+            spreadsheet_rules[rule_signature(rule)] = rule_request
+
+    def add_changed_sources(self, snapshot, key_header, keys, source_col, target_col):
+        """
+        Highlights the source cells of the rows whose source text was changed in this run, until the row is
+        translated. The row numbers are resolved when the pass is applied, from the (kept up to date) worksheet
+        snapshot.
+        Args:
+            snapshot: The WorksheetSnapshot (or the RowIndex) of the worksheet.
+            key_header: The header value of the key column.
+            keys: The keys of the changed rows.
+            source_col: The 0 based index of the source column.
+            target_col: The 0 based index of the target column.
+        """
+        if len(keys) == 0:
+            return
+        # the rows of a sharded worksheet are resolved in the snapshot of every shard
+        for shard_snapshot in getattr(snapshot, 'shard_snapshots', [snapshot]):
+            entry = self._changed_rows.setdefault((shard_snapshot.worksheet.spreadsheet.id,
+                                                   shard_snapshot.worksheet.id),
+                                                  [shard_snapshot, key_header, source_col, target_col, set()])
+            entry[4].update(keys)
+
+    def has_requests(self):
+        # type: () -> bool
+        return len(self._rules) > 0 or len(self._changed_rows) > 0
+
+    def __changed_source_requests(self, spreadsheet_id):
+        """
+        Builds one rule per worksheet, over the source cells of the changed rows. The condition of the rule checks the
+        target of the row (the rule is never matched once the row is translated), so the backgrounds set by the
+        translators are not overridden. The rule has several ranges, the target is found from the row of the cell.
+        """
+        requests = []
+        for (sh_id, _), (snapshot, key_header, source_col, target_col, keys) in self._changed_rows.items():
+            if sh_id != spreadsheet_id:
+                continue
+            row_numbers = snapshot.row_numbers_by_key(key_header)
+            changed_row_numbers = sorted(row_numbers[key] for key in keys if key in row_numbers)
+            if len(changed_row_numbers) == 0:
+                continue
+
+            # consecutive rows are merged in a single range
+            row_ranges = []
+            for row_number in changed_row_numbers:
+                if len(row_ranges) > 0 and row_ranges[-1][1] == row_number - 1:
+                    row_ranges[-1][1] = row_number
+                else:
+                    row_ranges.append([row_number, row_number])
+
+            untranslated_formula = '=INDIRECT(ADDRESS(ROW(), {}))=""'.format(target_col + 1)
+            rule_request = build_conditional_formatting_rule_request(snapshot.worksheet.id, (source_col, 0), None,
+                                                                     'CUSTOM_FORMULA', untranslated_formula,
+                                                                     CHANGED_SOURCE_COLOR)
+            rule_request['addConditionalFormatRule']['rule']['ranges'] = [{
+                "sheetId": snapshot.worksheet.id,
+                "startRowIndex": first_row_number - 1,
+                "endRowIndex": last_row_number,
+                "startColumnIndex": source_col,
+                "endColumnIndex": source_col + 1
+            } for first_row_number, last_row_number in row_ranges]
+            requests.append(rule_request)
+        return requests
+
+    def apply(self, dry_run=False):
+        """
+        Sends the gathered rules, one batchUpdate request per spreadsheet.
+        Args:
+            dry_run: If True, only prints the number of rules that would be added.
+        """
+        # type: (bool) -> None
+        spreadsheet_ids = set(self._rules.keys()) | set(sh_id for sh_id, _ in self._changed_rows.keys())
+
+        for spreadsheet_id in spreadsheet_ids:
+            requests = []
+
+            rules = self._rules.get(spreadsheet_id, {})
+            if len(rules) > 0:
+                # a single metadata request with a field mask, to find the rules that were added by previous runs
+                response = self.sheets_client.sheet.get(spreadsheet_id,
+                                                        fields='sheets(properties(sheetId),conditionalFormats)',
+                                                        includeGridData=False)
+                existing_signatures = set()
+                for sheet in response.get('sheets', []):
+                    for rule in sheet.get('conditionalFormats', []):
+                        existing_signatures.add(rule_signature(rule))
+
+                requests += [r for signature, r in rules.items() if signature not in existing_signatures]
+
+            requests += self.__changed_source_requests(spreadsheet_id)
+
+            if len(requests) == 0:
+                continue
+
+            if dry_run:
+                logger.info('DRY RUN - {} FORMATTING REQUESTS FOR SPREADSHEET {}'.format(len(requests), spreadsheet_id),
+                    color='y')
+            else:
+                self.sheets_client.sheet.batch_update(spreadsheet_id=spreadsheet_id, requests=requests)
+                logger.info('APPLIED {} FORMATTING REQUESTS TO SPREADSHEET {}'.format(len(requests), spreadsheet_id),
+                    color='g')
+
+        self._rules = {}
+        self._changed_rows = {}
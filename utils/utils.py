@@ -1,3 +1,4 @@
+import re
 import sys
 from colorama import init, Fore
 from datetime import datetime
@@ -5,6 +6,9 @@ from datetime import datetime
 # Init colorama
 init()
 
+# Version of the tool, used to invalidate the data cached by previous versions
+TOOL_VERSION = '2.0.0'
+
 
 def is_python_2():
     # type: () -> bool
@@ -18,25 +22,19 @@ def get_timestamp():
 
 def pwt(string_to_print, color):
     """
-    Prints a colored output with a timestamp
+    Prints a colored output with a timestamp (an INFO message of the buffered logger, see utils.logger)
     :param str string_to_print: the string to pring
     :param str color: color of the output (currently supports red, green and yellow ['r', 'g', 'y'])
     """
-    current_timestamp = get_timestamp()
-
-    print_color = Fore.WHITE
-    color = color.lower()
-    if color == 'red' or color == 'r':
-        print_color = Fore.RED
-    elif color == 'green' or color == 'g':
-        print_color = Fore.GREEN
-    elif color == 'yellow' or color == 'y':
-        print_color = Fore.YELLOW
-
-    print(u'{}[{}] {}'.format(print_color, current_timestamp, string_to_print))
+    from utils.logger import logger
+    logger.info(string_to_print, color=color)
 
 
 def get_input(prompt):
+    from utils.logger import logger
+    # the buffered messages must be visible before the prompt
+    logger.flush()
+
     try:
         input_ = raw_input
     except NameError:
@@ -79,10 +77,12 @@ def xcode_supports_dev_language_operations():
     return current_version >= ref_version
 
 
+# compiled once, the XML escaping calls it for every string of every written file
+STRING_PLACEHOLDER_REGEX = re.compile(r'%[\d<]*\$*[bBhHsScCdoxXeEfgGaAtT]')
+
+
 def string_has_placeholders(string):
-    import re
-    placeholders = re.findall(r'%[\d<]*\$*[bBhHsScCdoxXeEfgGaAtT]', string)
-    return len(placeholders) > 0
+    return STRING_PLACEHOLDER_REGEX.search(string) is not None
 
 
 def escape_xml_characters(xml_content):
@@ -132,3 +132,21 @@ def unescape_xml_characters(xml_content):
     output_string = re.sub(r'&amp;gt;', r'>', output_string)
 
     return output_string
+
+
+# the escape sequences of the Android string resources, and the characters they stand for (the others stand for the
+# escaped character itself: \' \" \\ \@ \?)
+ANDROID_ESCAPE_REGEX = re.compile(r'\\([nt\'"\\@?])')
+ANDROID_ESCAPED_CHARACTERS = {'n': '\n', 't': '\t'}
+
+
+def unescape_android_string(string):
+    """
+    Replaces the escaped XML characters (see unescape_xml_characters) and the escape sequences of the Android
+    string resources (\\', \\", \\n, \\t, \\\\) with their plain text correspondent
+    :param str string: the text of a <string> element
+    :return: the text as displayed by the app
+    :rtype: str
+    """
+    return ANDROID_ESCAPE_REGEX.sub(lambda match: ANDROID_ESCAPED_CHARACTERS.get(match.group(1), match.group(1)),
+                                    unescape_xml_characters(string))